@@ -1,11 +1,22 @@
+import sqlite3
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from config import Config
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on per connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 def create_app(config_override=None):
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -14,6 +25,10 @@ def create_app(config_override=None):
     if config_override:
         app.config.update(config_override)
     
+    # The archive tier is a second database alongside the main one
+    app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}),
+                                      'archive': app.config['ARCHIVE_DATABASE_URL']}
+    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
@@ -21,6 +36,9 @@ def create_app(config_override=None):
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    from app.tasks import tasks
+    tasks.init_app(app)
+    
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
@@ -32,8 +50,34 @@ def create_app(config_override=None):
     app.register_blueprint(posts_bp, url_prefix='/posts')
     app.register_blueprint(users_bp, url_prefix='/users')
     
+    from app import (archive, assets, cli, images, instrumentation, media, metrics, profiler, ratelimit,
+                     session_claims, sharding, singleflight, tags)
+    cli.init_app(app)
+    session_claims.init_app(app)
+    # Registered before the other after_request hooks so compression sees their final body
+    assets.init_app(app)
+    media.init_app(app)
+    images.init_app(app)
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)
+    ratelimit.init_app(app)
+    singleflight.init_app(app)
+    tags.init_app(app)
+    archive.init_app(app)
+    sharding.init_app(app)
+    
     # Create database tables
     with app.app_context():
         db.create_all()
     
+    from app import availability, graph
+    availability.init_app(app)
+    graph.init_app(app)
+    
+    # Periodic jobs (cron can run the equivalent `flask` commands instead)
+    if app.config['TRENDING_REFRESH_SECONDS'] and tasks.periodic(app):
+        from app.trending import refresh_scores
+        tasks.every(app, app.config['TRENDING_REFRESH_SECONDS'], refresh_scores)
+    
     return app
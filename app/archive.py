@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db
+from app.models import User, Post, Comment, Like
+
+def _archive_table(table, references=None, *extra):
+    """Copy of a hot table's columns on the archive bind.
+
+    User ids point into the hot database, so only references inside the archive
+    (comments and likes to their post) are foreign keys.
+    """
+    references = references or {}
+    columns = []
+    for column in table.columns:
+        args = [db.ForeignKey(references[column.name], ondelete='CASCADE')] if column.name in references else []
+        columns.append(db.Column(column.name, column.type, *args, primary_key=column.primary_key,
+                                 nullable=column.nullable))
+    return db.Table(table.name, *columns, *extra, bind_key='archive')
+
+archived_posts = _archive_table(Post.__table__, None,
+                                db.Index('ix_archive_post_user_created', 'user_id', 'created_at'))
+archived_comments = _archive_table(Comment.__table__, {'post_id': 'post.id'},
+                                   db.Index('ix_archive_comment_post_created', 'post_id', 'created_at', 'id'),
+                                   db.Index('ix_archive_comment_user', 'user_id'))
+archived_likes = _archive_table(Like.__table__, {'post_id': 'post.id'},
+                                db.Index('ix_archive_like_post_user', 'post_id', 'user_id'),
+                                db.Index('ix_archive_like_user', 'user_id'))
+
+def execute(statement, *args):
+    """Run a statement against the archive database inside db.session's transaction"""
+    # Flask-SQLAlchemy 3.0 routes only bare tables by bind key, not statements built on them
+    return db.session.execute(statement, *args, bind_arguments={'bind': db.engines['archive']})
+
+# Hot table, archive copy, and the column tying each row to a post
+TIERS = (
+    (Post.__table__, archived_posts, Post.__table__.c.id),
+    (Comment.__table__, archived_comments, Comment.__table__.c.post_id),
+    (Like.__table__, archived_likes, Like.__table__.c.post_id),
+)
+
+def archive_posts(older_than, batch_size=500):
+    """Move posts created before older_than, with their comments and likes, to the archive.
+
+    Each batch is committed to the archive before it is deleted from the hot
+    tables, so an interrupted run leaves rows in both places (reads prefer the
+    hot copy) and the next run replaces the archive copy. Deleting the hot post
+    also drops its tags, mentions and trending score. Returns the number of
+    posts moved.
+    """
+    post = Post.__table__
+    moved, last_id = 0, 0
+    while True:
+        rows = db.session.execute(db.select(post.c.id, post.c.user_id, post.c.created_at).where(
+            post.c.created_at < older_than, post.c.id > last_id).order_by(post.c.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        # Only a copy of the same post (left by an interrupted run) is replaced; an archived
+        # post that merely shares the id is never overwritten, and that hot post stays put
+        archived = {row.id: (row.user_id, row.created_at) for row in execute(
+            db.select(archived_posts.c.id, archived_posts.c.user_id, archived_posts.c.created_at).where(
+                archived_posts.c.id.in_([row.id for row in rows])))}
+        stale = [row.id for row in rows if archived.get(row.id) == (row.user_id, row.created_at)]
+        post_ids = [row.id for row in rows if row.id not in archived or row.id in stale]
+        if len(post_ids) < len(rows):
+            current_app.logger.warning('Not archiving posts whose ids are taken in the archive: %s',
+                                       sorted(set(archived) - set(stale)))
+        if not post_ids:
+            continue
+        batches = [(archive, [dict(row._mapping) for row in db.session.execute(
+            db.select(hot).where(key.in_(post_ids)))]) for hot, archive, key in TIERS]
+        # Comments and likes of a half-moved post go with its archived copy through the FK
+        if stale:
+            execute(archived_posts.delete().where(archived_posts.c.id.in_(stale)))
+        for archive, rows in batches:
+            if rows:
+                execute(archive.insert(), rows)
+        db.session.commit()
+        # ON DELETE CASCADE takes comments, likes, tag links and scores with the post
+        db.session.execute(post.delete().where(post.c.id.in_(post_ids)))
+        db.session.commit()
+        moved += len(post_ids)
+    return moved
+
+def archive_old_posts():
+    """Periodic job: archive posts older than ARCHIVE_AFTER_DAYS"""
+    config = current_app.config
+    return archive_posts(datetime.utcnow() - timedelta(days=config['ARCHIVE_AFTER_DAYS']),
+                         config['ARCHIVE_BATCH_SIZE'])
+
+def get_post(post_id):
+    """The archived post row, or None"""
+    return execute(db.select(archived_posts).where(archived_posts.c.id == post_id)).first()
+
+def delete_post(post_id):
+    """Remove an archived post; its comments and likes follow through the archive's foreign keys"""
+    execute(archived_posts.delete().where(archived_posts.c.id == post_id))
+    db.session.commit()
+
+def post_count(user_id):
+    return execute(db.select(db.func.count()).select_from(archived_posts).where(
+        archived_posts.c.user_id == user_id)).scalar()
+
+def purge_users(connection, user_ids, post=archived_posts, comment=archived_comments, like=archived_likes):
+    """Drop deleted users' posts, comments and likes from tables ON DELETE CASCADE cannot reach.
+
+    Comment counts of the remaining posts are settled first. Defaults to the archive tables.
+    """
+    per_post = db.select(db.func.count()).where(
+        comment.c.post_id == post.c.id, comment.c.user_id.in_(user_ids)).scalar_subquery()
+    connection.execute(post.update().where(post.c.id.in_(
+        db.select(comment.c.post_id).where(comment.c.user_id.in_(user_ids)))).values(
+        comments_count=post.c.comments_count - per_post))
+    connection.execute(comment.delete().where(comment.c.user_id.in_(user_ids)))
+    connection.execute(like.delete().where(like.c.user_id.in_(user_ids)))
+    connection.execute(post.delete().where(post.c.user_id.in_(user_ids)))
+
+@event.listens_for(User, 'after_delete')
+def _queue_archive_purge(mapper, connection, target):
+    # The archive is another database: ON DELETE CASCADE cannot reach it
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('archive_purge', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def _purge_archive(session):
+    user_ids = session.info.pop('archive_purge', None)
+    if user_ids:
+        with db.engines['archive'].begin() as connection:
+            purge_users(connection, list(user_ids))
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_archive_purge(session):
+    session.info.pop('archive_purge', None)
+
+def init_app(app):
+    from app.tasks import tasks
+    if app.config['ARCHIVE_AFTER_DAYS'] and tasks.periodic(app):
+        tasks.every(app, app.config['ARCHIVE_REFRESH_SECONDS'], archive_old_posts)
@@ -0,0 +1,232 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import urllib.request
+import zlib
+from flask import request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+SKIP_DIRS = {DIST_DIR, 'uploads'}
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.ttf')
+
+# Self-hosted copies of the CDN dependencies; versioned paths make them safe to cache forever
+VENDOR = {
+    'bootstrap.css': ('https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+                      'vendor/bootstrap-5.1.3/bootstrap.min.css'),
+    'bootstrap.js': ('https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+                     'vendor/bootstrap-5.1.3/bootstrap.bundle.min.js'),
+    'fontawesome.css': ('https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+                        'vendor/fontawesome-6.0.0/css/all.min.css'),
+    'jquery.js': ('https://code.jquery.com/jquery-3.6.0.min.js',
+                  'vendor/jquery-3.6.0/jquery.min.js'),
+}
+FONTAWESOME_WEBFONTS = [f'{name}.{ext}'
+                        for name in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility')
+                        for ext in ('woff2', 'ttf')]
+
+CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+# At-rules whose blocks hold rules with selectors rather than declarations
+CSS_GROUPING_RULES = ('@media', '@supports', '@container', '@layer', '@document', '@keyframes', '@-webkit-keyframes')
+
+def _squeeze_css(text, declarations):
+    # Closing up ':' or '>' is only safe in declarations and at-rule preludes:
+    # in a selector 'div :first-child' and 'div:first-child' match different elements
+    pattern = r'\s*([{};,:>])\s*' if declarations else r'\s*([{};,])\s*'
+    return ''.join(part if i % 2 else re.sub(pattern, r'\1', re.sub(r'\s+', ' ', part)).replace(';}', '}')
+                   for i, part in enumerate(CSS_STRING.split(text.lstrip())))
+
+def minify_css(source):
+    """Drop comments and whitespace, leaving strings and descendant combinators alone"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    out, text, blocks = [], '', []  # blocks: True for each open declaration block
+    for i, token in enumerate(CSS_STRING.split(source)):
+        if i % 2:
+            text += token
+            continue
+        for piece in re.split(r'([{}])', token):
+            if piece == '{':
+                prelude = text.rsplit(';', 1)[-1].strip()
+                out.append(_squeeze_css(text + piece, prelude.startswith('@')))
+                blocks.append(not prelude.startswith(CSS_GROUPING_RULES))
+            elif piece == '}':
+                out.append(_squeeze_css(text + piece, bool(blocks) and blocks[-1]))
+                if blocks:
+                    blocks.pop()
+            else:
+                text += piece
+                continue
+            text = ''
+    out.append(_squeeze_css(text, False))
+    return ''.join(out).strip()
+
+def minify_js(source):
+    """Drop comment-only lines and indentation without touching template literal bodies"""
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        stripped = line if in_template else line.strip()
+        if not in_template and (not stripped or stripped.startswith('//')):
+            continue
+        lines.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+def fingerprint(content):
+    return hashlib.sha256(content).hexdigest()[:12]
+
+def _write_compressed(path, content):
+    with gzip.open(path + '.gz', 'wb', compresslevel=9) as f:
+        f.write(content)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+def build(static_folder):
+    """Minify, fingerprint and precompress static assets into dist/; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+            stem, ext = os.path.splitext(logical)
+            if ext in ('.css', '.js'):
+                if not stem.endswith('.min'):
+                    minify = minify_css if ext == '.css' else minify_js
+                    content = minify(content.decode('utf-8')).encode('utf-8')
+                target = f'{stem}.{fingerprint(content)}{ext}'
+                manifest[logical] = target
+            else:
+                # Fonts and images keep their names so relative url() references still resolve
+                target = logical
+            path = os.path.join(dist, target)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+            if ext in COMPRESSIBLE:
+                _write_compressed(path, content)
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def download_vendor(static_folder):
+    """Fetch the CDN dependencies into static/vendor; returns the written paths"""
+    downloads = [(url, path) for url, path in VENDOR.values()]
+    fonts = os.path.dirname(os.path.dirname(VENDOR['fontawesome.css'][1]))
+    downloads += [(f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/webfonts/{name}',
+                   f'{fonts}/webfonts/{name}') for name in FONTAWESOME_WEBFONTS]
+    written = []
+    for url, path in downloads:
+        target = os.path.join(static_folder, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(target, 'wb') as f:
+            shutil.copyfileobj(response, f)
+        written.append(target)
+    return written
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def accepts(encoding):
+    return encoding in request.headers.get('Accept-Encoding', '').lower()
+
+def _gzip_chunks(chunks, level):
+    # Flush after every chunk so the browser still gets the page progressively
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def compress_response(response, config):
+    """Gzip a text response when the client accepts it: buffered ones in place, streamed ones per chunk"""
+    if (response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not accepts('gzip'):
+        return response
+    if response.is_streamed:
+        response.response = _gzip_chunks(response.iter_encoded(), config['COMPRESS_LEVEL'])
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def init_app(app):
+    static_folder = app.static_folder
+    manifest = load_manifest(static_folder)
+    dist_prefix = DIST_DIR + '/'
+
+    def asset_url(filename):
+        """URL of the fingerprinted build of a static file, falling back to the source"""
+        current = load_manifest(static_folder) if app.debug else manifest
+        if filename in current:
+            return url_for('static', filename=dist_prefix + current[filename])
+        return url_for('static', filename=filename)
+
+    def vendor_url(name):
+        cdn, local = VENDOR[name]
+        return asset_url(local) if app.config['ASSETS_VENDOR'] == 'local' else cdn
+
+    app.jinja_env.globals.update(asset_url=asset_url, vendor_url=vendor_url)
+
+    @app.before_request
+    def serve_precompressed():
+        if request.endpoint != 'static':
+            return None
+        filename = request.view_args.get('filename', '')
+        if not filename.startswith(dist_prefix) or '..' in filename.split('/'):
+            return None
+        path = os.path.join(static_folder, *filename.split('/'))
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepts(encoding) and os.path.isfile(path + suffix):
+                response = send_file(path + suffix, mimetype=mimetypes.guess_type(path)[0],
+                                     conditional=True, etag=True)
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+        return None
+
+    @app.after_request
+    def finish_response(response):
+        if request.endpoint == 'static':
+            if request.view_args.get('filename', '').startswith(dist_prefix):
+                response.cache_control.public = True
+                response.cache_control.max_age = app.config['ASSETS_MAX_AGE']
+                response.cache_control.immutable = True
+            return response
+        if app.config['COMPRESS_ENABLED']:
+            compress_response(response, app.config)
+        return response
@@ -0,0 +1,108 @@
+import hashlib
+import math
+import threading
+from flask import current_app, has_app_context
+from app import db
+
+class BloomFilter:
+    """Fixed-size Bloom filter; k probe positions come from double hashing one blake2b digest"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        # Bit updates are read-modify-write; a lost update would be a false negative
+        with self._lock:
+            for pos in positions:
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class NameFilters:
+    """Bloom filters over every username and email, so definitely-free values skip the database"""
+    FIELDS = ('username', 'email')
+
+    def __init__(self, min_capacity=10000, error_rate=0.01):
+        self.min_capacity = min_capacity
+        self.error_rate = error_rate
+        self.filters = {field: BloomFilter(min_capacity, error_rate) for field in self.FIELDS}
+        self._lock = threading.Lock()
+        self._journal = None
+
+    def reload(self):
+        """Rebuild from the user table, sized for twice the current row count"""
+        from app.models import User
+        # Keys added while the scan runs may miss it, so replay them into the new filters
+        with self._lock:
+            self._journal = []
+        total = db.session.query(db.func.count(User.id)).scalar() or 0
+        filters = {field: BloomFilter(max(self.min_capacity, 2 * total), self.error_rate)
+                   for field in self.FIELDS}
+        rows = db.session.query(User.username, User.email).execution_options(yield_per=10000)
+        for username, email in rows:
+            filters['username'].add(username)
+            filters['email'].add(email)
+        with self._lock:
+            for username, email in self._journal:
+                filters['username'].add(username)
+                filters['email'].add(email)
+            self._journal = None
+            self.filters = filters
+
+    def add(self, username, email):
+        with self._lock:
+            self.filters['username'].add(username)
+            self.filters['email'].add(email)
+            if self._journal is not None:
+                self._journal.append((username, email))
+
+    def might_exist(self, field, value):
+        return value in self.filters[field]
+
+def current_filters():
+    if has_app_context():
+        return current_app.extensions.get('name_filters')
+    return None
+
+def remember_user(user):
+    """Add a newly inserted or renamed user's keys; rolled-back rows just become false positives"""
+    filters = current_filters()
+    if filters is not None:
+        filters.add(user.username, user.email)
+
+def is_taken(field, value, use_filter=True):
+    """Whether a user already has this username or email; only possible Bloom hits hit the DB"""
+    from app.models import User
+    filters = current_filters()
+    if use_filter and filters is not None and not filters.might_exist(field, value):
+        return False
+    column = getattr(User, field)
+    return db.session.query(User.id).filter(column == value).first() is not None
+
+def init_app(app):
+    """Build the filters after the tables exist; call from create_app"""
+    if not app.config['NAME_FILTER_ENABLED']:
+        return
+    filters = NameFilters(app.config['NAME_FILTER_MIN_CAPACITY'], app.config['NAME_FILTER_ERROR_RATE'])
+    with app.app_context():
+        filters.reload()
+    app.extensions['name_filters'] = filters
+    from app.tasks import tasks
+    if app.config['NAME_FILTER_REFRESH_SECONDS'] and tasks.periodic(app):
+        tasks.every(app, app.config['NAME_FILTER_REFRESH_SECONDS'], filters.reload)
@@ -0,0 +1,93 @@
+import csv
+import json
+from datetime import datetime
+from app import db
+from app.models import User, Post, Comment, Like, followers
+
+# Import order matters for foreign keys: users first, then what points at them
+TABLES = {
+    'users': User.__table__,
+    'followers': followers,
+    'posts': Post.__table__,
+    'comments': Comment.__table__,
+    'likes': Like.__table__,
+}
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _converters(table):
+    converters = {}
+    for column in table.columns:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            converters[column.name] = datetime.fromisoformat
+        elif python_type in (int, float):
+            converters[column.name] = python_type
+    return converters
+
+def export_rows(name, out, fmt='ndjson', batch_size=5000):
+    """Stream every row of a table to out using a server-side cursor; returns the row count"""
+    table = TABLES[name]
+    columns = [column.name for column in table.columns]
+    result = db.session.execute(
+        db.select(table).order_by(*table.primary_key.columns).execution_options(
+            stream_results=True, yield_per=batch_size))
+    writer = csv.writer(out) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+    count = 0
+    for row in result:
+        if writer:
+            writer.writerow([_encode(value) for value in row])
+        else:
+            out.write(json.dumps({column: _encode(value) for column, value in zip(columns, row)}) + '\n')
+        count += 1
+    return count
+
+def read_rows(name, source, fmt='ndjson'):
+    """Yield row dicts with column types restored"""
+    table = TABLES[name]
+    known = set(table.columns.keys())
+    converters = _converters(table)
+    records = csv.DictReader(source) if fmt == 'csv' else (json.loads(line) for line in source if line.strip())
+    for record in records:
+        row = {}
+        for key, value in record.items():
+            if key not in known:
+                continue
+            if value is None or value == '':
+                row[key] = None
+            elif key in converters and isinstance(value, str):
+                row[key] = converters[key](value)
+            else:
+                row[key] = value
+        yield row
+
+def import_rows(name, source, fmt='ndjson', chunk_size=5000):
+    """Insert rows in chunked executemany batches, committing per chunk; returns the row count"""
+    table = TABLES[name]
+    count = 0
+    chunk = []
+    for row in read_rows(name, source, fmt):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        count += len(chunk)
+    if name == 'comments':
+        recount_comments()
+    return count
+
+def recount_comments():
+    """Rebuild Post.comments_count after bulk comment inserts bypassed the ORM listeners"""
+    post = Post.__table__
+    comment = Comment.__table__
+    db.session.execute(post.update().values(comments_count=db.select(db.func.count()).where(
+        comment.c.post_id == post.c.id).scalar_subquery()))
+    db.session.commit()
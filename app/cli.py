@@ -0,0 +1,141 @@
+import os
+import click
+from flask.cli import AppGroup
+
+trending_cli = AppGroup('trending', help='Maintain the precomputed explore ranking.')
+
+@trending_cli.command('refresh')
+def refresh_trending():
+    """Recompute engagement scores for recent posts."""
+    from app.trending import refresh_scores
+    count = refresh_scores()
+    click.echo(f'Scored {count} posts.')
+
+suggestions_cli = AppGroup('suggestions', help='Maintain precomputed follow suggestions.')
+
+@suggestions_cli.command('refresh')
+def refresh_suggestions():
+    """Recompute friends-of-friends suggestions for every user."""
+    from app.suggestions import refresh_suggestions
+    count = refresh_suggestions()
+    click.echo(f'Stored {count} suggestions.')
+
+profile_cli = AppGroup('profile', help='Inspect stacks captured by the request profiler.')
+
+@profile_cli.command('flamegraph')
+@click.option('--endpoint', help='Only aggregate profiles of this endpoint, e.g. main.index.')
+@click.option('--dir', 'directory', help='Profile directory (default: PROFILER_DIR).')
+@click.option('--collapsed', is_flag=True, help='Write merged collapsed stacks instead of SVG.')
+@click.option('-o', '--output', default='flamegraph.svg', show_default=True)
+def flamegraph(endpoint, directory, collapsed, output):
+    """Aggregate captured profiles into one flame graph."""
+    from flask import current_app
+    from app.profiler import profile_files, read_collapsed, render_flamegraph, write_collapsed
+    paths = profile_files(directory or current_app.config['PROFILER_DIR'], endpoint)
+    if not paths:
+        raise click.ClickException('No profiles found.')
+    stacks = read_collapsed(paths)
+    if collapsed:
+        write_collapsed(stacks, os.path.abspath(output))
+    else:
+        with open(output, 'w') as f:
+            f.write(render_flamegraph(stacks, title=endpoint or 'all endpoints'))
+    click.echo(f'Merged {len(paths)} profiles ({sum(stacks.values())} samples) into {output}.')
+
+data_cli = AppGroup('data', help='Bulk import and export of users, posts and the social graph.')
+TABLE_CHOICES = click.Choice(['users', 'followers', 'posts', 'comments', 'likes'])
+FORMAT_OPTION = click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default='ndjson',
+                             show_default=True)
+
+@data_cli.command('export')
+@click.argument('table', type=TABLE_CHOICES)
+@FORMAT_OPTION
+@click.option('-o', '--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+def export_data(table, fmt, output):
+    """Stream a table out as NDJSON or CSV."""
+    from app.bulk import export_rows
+    count = export_rows(table, output, fmt)
+    click.echo(f'Exported {count} {table}.', err=True)
+
+@data_cli.command('import')
+@click.argument('table', type=TABLE_CHOICES)
+@click.argument('source', type=click.File('r'))
+@FORMAT_OPTION
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per executemany batch.')
+def import_data(table, source, fmt, chunk_size):
+    """Bulk insert NDJSON or CSV rows into a table.
+    
+    Import users, followers, posts, comments and likes in that order.
+    """
+    from app.bulk import import_rows
+    count = import_rows(table, source, fmt, chunk_size)
+    click.echo(f'Imported {count} {table}.')
+
+tags_cli = AppGroup('tags', help='Maintain the hashtag and mention index.')
+
+@tags_cli.command('backfill')
+@click.option('--batch-size', default=1000, show_default=True, help='Posts parsed and committed per batch.')
+def backfill_tags(batch_size):
+    """Parse every existing post into the tag and mention tables (safe to rerun)."""
+    from app.tags import backfill
+    posts, tags, mentions = backfill(batch_size)
+    click.echo(f'Indexed {posts} posts: {tags} tag and {mentions} mention links.')
+
+archive_cli = AppGroup('archive', help='Move old posts to the archive database.')
+
+@archive_cli.command('run')
+@click.option('--days', type=int, help='Archive posts older than this (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, help='Posts moved per transaction (default: ARCHIVE_BATCH_SIZE).')
+@click.option('--vacuum', is_flag=True, help='VACUUM the main database afterwards to return freed pages.')
+def run_archive(days, batch_size, vacuum):
+    """Move posts, with their comments and likes, out of the hot tables."""
+    from datetime import datetime, timedelta
+    from flask import current_app
+    from app import db
+    from app.archive import archive_posts
+    days = days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    if not days:
+        raise click.UsageError('Pass --days or set ARCHIVE_AFTER_DAYS.')
+    moved = archive_posts(datetime.utcnow() - timedelta(days=days),
+                          batch_size or current_app.config['ARCHIVE_BATCH_SIZE'])
+    if vacuum:
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM')
+    click.echo(f'Archived {moved} posts older than {days} days.')
+
+db_cli = AppGroup('db', help='Maintain the database schema.')
+
+@db_cli.command('upgrade')
+def upgrade_db():
+    """Bring an existing database up to the current models (safe to rerun)."""
+    from app.schema import upgrade
+    rebuilt = upgrade()
+    click.echo(f'Rebuilt {", ".join(rebuilt)}.' if rebuilt else 'Schema is up to date.')
+
+assets_cli = AppGroup('assets', help='Build and self-host static assets.')
+
+@assets_cli.command('build')
+def build_assets():
+    """Minify, fingerprint and precompress static files into static/dist."""
+    from flask import current_app
+    from app.assets import build, brotli
+    manifest = build(current_app.static_folder)
+    click.echo(f'Built {len(manifest)} assets' + ('' if brotli else ' (gzip only; install brotli for .br)') + '.')
+
+@assets_cli.command('vendor')
+def vendor_assets():
+    """Download Bootstrap, Font Awesome and jQuery for ASSETS_VENDOR=local."""
+    from flask import current_app
+    from app.assets import download_vendor
+    paths = download_vendor(current_app.static_folder)
+    click.echo(f'Downloaded {len(paths)} files; run `flask assets build` to fingerprint them.')
+
+def init_app(app):
+    app.cli.add_command(trending_cli)
+    app.cli.add_command(suggestions_cli)
+    app.cli.add_command(profile_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(tags_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(db_cli)
@@ -0,0 +1,80 @@
+import threading
+
+class Subscription:
+    """A listener interested in a fixed set of post ids.
+    
+    Updates are coalesced per post: a slow reader only ever holds the latest
+    payload for each post rather than an ever-growing backlog.
+    """
+    
+    def __init__(self, bus, post_ids):
+        self.bus = bus
+        self.post_ids = frozenset(post_ids)
+        self.closed = False
+        self._pending = {}
+        self._condition = threading.Condition()
+    
+    def deliver(self, post_id, payload):
+        with self._condition:
+            self._pending[post_id] = payload
+            self._condition.notify()
+    
+    def wait(self, timeout):
+        """Block until updates arrive or timeout passes; return the pending payloads"""
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout)
+            updates = list(self._pending.values())
+            self._pending.clear()
+        return updates
+    
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """In-process publish/subscribe bus for per-post count updates.
+    
+    Only threading primitives are used, so under a gevent or eventlet worker
+    (where they are monkey-patched) an idle subscriber costs a parked greenlet
+    instead of a whole sync worker.
+    """
+    
+    def __init__(self):
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def subscribe(self, post_ids, limit=None):
+        """Register interest in post_ids; returns None when limit subscriptions exist"""
+        with self._lock:
+            if limit is not None and self._count >= limit:
+                return None
+            subscription = Subscription(self, post_ids)
+            for post_id in subscription.post_ids:
+                self._subscribers.setdefault(post_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            for post_id in subscription.post_ids:
+                listeners = self._subscribers.get(post_id)
+                if listeners is not None:
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del self._subscribers[post_id]
+            self._count -= 1
+    
+    def publish(self, post_id, payload):
+        with self._lock:
+            listeners = list(self._subscribers.get(post_id, ()))
+        for subscription in listeners:
+            subscription.deliver(post_id, payload)
+    
+    def subscriber_count(self):
+        return self._count
+
+bus = EventBus()
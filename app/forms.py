@@ -2,7 +2,7 @@ from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from app.models import User
+from app.availability import is_taken
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=20)])
@@ -10,7 +10,18 @@ class LoginForm(FlaskForm):
     remember_me = BooleanField('Remember Me')
     submit = SubmitField('Sign In')
 
-class RegistrationForm(FlaskForm):
+USERNAME_TAKEN = 'Username already taken. Please choose a different one.'
+EMAIL_TAKEN = 'Email already registered. Please choose a different one.'
+
+class UniqueUserFieldsMixin:
+    def report_taken(self):
+        """Flag fields another request claimed between validation and commit"""
+        for field, message in ((self.username, USERNAME_TAKEN), (self.email, EMAIL_TAKEN)):
+            unchanged = field.data == getattr(self, f'original_{field.name}', None)
+            if not unchanged and is_taken(field.name, field.data, use_filter=False):
+                field.errors.append(message)
+
+class RegistrationForm(UniqueUserFieldsMixin, FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=20)])
     email = StringField('Email', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
@@ -19,16 +30,14 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Register')
     
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('Username already taken. Please choose a different one.')
+        if is_taken('username', username.data):
+            raise ValidationError(USERNAME_TAKEN)
     
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('Email already registered. Please choose a different one.')
+        if is_taken('email', email.data):
+            raise ValidationError(EMAIL_TAKEN)
 
-class EditProfileForm(FlaskForm):
+class EditProfileForm(UniqueUserFieldsMixin, FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=20)])
     email = StringField('Email', validators=[DataRequired(), Email()])
     bio = TextAreaField('Bio', validators=[Length(max=200)])
@@ -42,15 +51,13 @@ class EditProfileForm(FlaskForm):
     
     def validate_username(self, username):
         if username.data != self.original_username:
-            user = User.query.filter_by(username=username.data).first()
-            if user:
-                raise ValidationError('Username already taken. Please choose a different one.')
+            if is_taken('username', username.data):
+                raise ValidationError(USERNAME_TAKEN)
     
     def validate_email(self, email):
         if email.data != self.original_email:
-            user = User.query.filter_by(email=email.data).first()
-            if user:
-                raise ValidationError('Email already registered. Please choose a different one.')
+            if is_taken('email', email.data):
+                raise ValidationError(EMAIL_TAKEN)
 
 class PostForm(FlaskForm):
     content = TextAreaField('What\'s on your mind?', validators=[DataRequired(), Length(min=1, max=500)])
@@ -0,0 +1,283 @@
+import threading
+from array import array
+from bisect import bisect_left
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db
+
+class CSR:
+    """Compressed sparse rows: the sorted neighbours of node u are targets[offsets[u]:offsets[u + 1]]"""
+    __slots__ = ('offsets', 'targets')
+
+    def __init__(self, offsets=None, targets=None):
+        self.offsets = offsets if offsets is not None else array('q', [0])
+        self.targets = targets if targets is not None else array('i')
+
+    @property
+    def size(self):
+        return len(self.offsets) - 1
+
+    def degree(self, u):
+        if 0 <= u < self.size:
+            return self.offsets[u + 1] - self.offsets[u]
+        return 0
+
+    def contains(self, u, v):
+        if not 0 <= u < self.size:
+            return False
+        lo, hi = self.offsets[u], self.offsets[u + 1]
+        i = bisect_left(self.targets, v, lo, hi)
+        return i < hi and self.targets[i] == v
+
+    def neighbors(self, u):
+        if not 0 <= u < self.size:
+            return self.targets[0:0]
+        return self.targets[self.offsets[u]:self.offsets[u + 1]]
+
+    def transpose(self):
+        """The reversed graph; walking sources in order keeps every row sorted"""
+        size = self.size
+        counts = array('q', bytes(8 * (size + 1)))
+        for v in self.targets:
+            counts[v + 1] += 1
+        for u in range(size):
+            counts[u + 1] += counts[u]
+        cursor = array('q', counts)
+        targets = array('i', bytes(4 * len(self.targets)))
+        offsets, sources = self.offsets, self.targets
+        for u in range(size):
+            for i in range(offsets[u], offsets[u + 1]):
+                v = sources[i]
+                targets[cursor[v]] = u
+                cursor[v] += 1
+        return CSR(counts, targets)
+
+    def nbytes(self):
+        return self.offsets.itemsize * len(self.offsets) + self.targets.itemsize * len(self.targets)
+
+def load_csr(connection, batch_size=100000):
+    """Build the follower -> followed CSR from the followers table in one ordered scan.
+
+    The node count comes from the scan itself: a separate max(User.id) query
+    could miss a user who signed up and followed someone in between.
+    """
+    from app.models import followers
+    offsets = array('q', [0])
+    targets = array('i')
+    top = 0
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+        db.select(followers.c.follower_id, followers.c.followed_id).order_by(
+            followers.c.follower_id, followers.c.followed_id))
+    for follower_id, followed_id in result:
+        # Rows come in follower order: every node up to this one starts where the edges are now
+        while len(offsets) <= follower_id:
+            offsets.append(len(targets))
+        targets.append(followed_id)
+        if followed_id > top:
+            top = followed_id
+    size = max(len(offsets), top + 1)
+    while len(offsets) <= size:
+        offsets.append(len(targets))
+    return CSR(offsets, targets)
+
+class GraphSnapshot:
+    """CSR arrays plus the overlay of changes committed since they were built.
+
+    Never modified once published: writers derive the next snapshot and swap
+    FollowGraph's single reference, so a reader holding one sees one graph.
+    """
+    __slots__ = ('out', 'into', 'added_out', 'added_in', 'removed', 'out_delta', 'in_delta')
+
+    def __init__(self, out, into, added_out=None, added_in=None, removed=None, out_delta=None, in_delta=None):
+        self.out = out
+        self.into = into
+        self.added_out = added_out if added_out is not None else {}
+        self.added_in = added_in if added_in is not None else {}
+        self.removed = removed if removed is not None else set()
+        self.out_delta = out_delta if out_delta is not None else {}
+        self.in_delta = in_delta if in_delta is not None else {}
+
+    def is_following(self, follower_id, followed_id):
+        if followed_id in self.added_out.get(follower_id, ()):
+            return True
+        if (follower_id, followed_id) in self.removed:
+            return False
+        return self.out.contains(follower_id, followed_id)
+
+    def follower_count(self, user_id):
+        return self.into.degree(user_id) + self.in_delta.get(user_id, 0)
+
+    def following_count(self, user_id):
+        return self.out.degree(user_id) + self.out_delta.get(user_id, 0)
+
+    def following(self, user_id):
+        removed = self.removed
+        current = [v for v in self.out.neighbors(user_id) if (user_id, v) not in removed]
+        return sorted(current + list(self.added_out.get(user_id, ())))
+
+    def followers(self, user_id):
+        removed = self.removed
+        current = [u for u in self.into.neighbors(user_id) if (u, user_id) not in removed]
+        return sorted(current + list(self.added_in.get(user_id, ())))
+
+    def edge_count(self):
+        return len(self.out.targets) + sum(self.out_delta.values())
+
+    def nbytes(self):
+        """Approximate size of the CSR arrays (the overlay is bounded by the reload interval)"""
+        return self.out.nbytes() + self.into.nbytes()
+
+    def with_changes(self, changes):
+        """A new snapshot with committed (op, follower_id, followed_id) changes applied.
+
+        The overlay containers are copied and the sets in them replaced rather
+        than updated, so this snapshot stays as it was for its readers.
+        """
+        following = GraphSnapshot(self.out, self.into, dict(self.added_out), dict(self.added_in),
+                                  set(self.removed), dict(self.out_delta), dict(self.in_delta))
+        for change in changes:
+            following._apply(*change)
+        return following
+
+    def _apply(self, op, a, b):
+        if op == 'follow':
+            self._follow(a, b)
+        elif op == 'unfollow':
+            self._unfollow(a, b)
+        elif op == 'drop':
+            for v in self.following(a):
+                self._unfollow(a, v)
+            for u in self.followers(a):
+                self._unfollow(u, a)
+
+    # Both operations are idempotent so journal replays after a reload are harmless
+    def _follow(self, a, b):
+        if self.is_following(a, b):
+            return
+        if (a, b) in self.removed:
+            self.removed.discard((a, b))
+        else:
+            self.added_out[a] = self.added_out.get(a, frozenset()) | {b}
+            self.added_in[b] = self.added_in.get(b, frozenset()) | {a}
+        self.out_delta[a] = self.out_delta.get(a, 0) + 1
+        self.in_delta[b] = self.in_delta.get(b, 0) + 1
+
+    def _unfollow(self, a, b):
+        if not self.is_following(a, b):
+            return
+        if b in self.added_out.get(a, ()):
+            self.added_out[a] = self.added_out[a] - {b}
+            self.added_in[b] = self.added_in[b] - {a}
+        else:
+            self.removed.add((a, b))
+        self.out_delta[a] = self.out_delta.get(a, 0) - 1
+        self.in_delta[b] = self.in_delta.get(b, 0) - 1
+
+class FollowGraph:
+    """Per-process follower index: an immutable GraphSnapshot behind a single reference.
+
+    Reads never take the lock; follow/unfollow from committed transactions
+    publish a snapshot with a larger overlay, and reload() folds it back into
+    fresh CSR arrays.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._journal = None
+        self._snapshot = GraphSnapshot(CSR(), CSR())
+
+    def reload(self, connection=None):
+        """Rebuild the CSR arrays from the database, replaying changes committed meanwhile"""
+        with self._lock:
+            self._journal = []
+        try:
+            if connection is None:
+                with db.engine.connect() as connection:
+                    out = load_csr(connection)
+            else:
+                out = load_csr(connection)
+            into = out.transpose()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._snapshot = GraphSnapshot(out, into).with_changes(journal)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def is_following(self, follower_id, followed_id):
+        return self._snapshot.is_following(follower_id, followed_id)
+
+    def follower_count(self, user_id):
+        return self._snapshot.follower_count(user_id)
+
+    def following_count(self, user_id):
+        return self._snapshot.following_count(user_id)
+
+    def following(self, user_id):
+        return self._snapshot.following(user_id)
+
+    def followers(self, user_id):
+        return self._snapshot.followers(user_id)
+
+    def edge_count(self):
+        return self._snapshot.edge_count()
+
+    def nbytes(self):
+        return self._snapshot.nbytes()
+
+    def apply(self, changes):
+        """Apply committed (op, follower_id, followed_id) changes"""
+        with self._lock:
+            self._snapshot = self._snapshot.with_changes(changes)
+            if self._journal is not None:
+                self._journal.extend(changes)
+
+def current_graph():
+    """The app's follower index, or None when GRAPH_INDEX is off"""
+    if has_app_context():
+        return current_app.extensions.get('follow_graph')
+    return None
+
+def record_change(target, op, value=None):
+    """Queue a follow graph change on the object's session until it commits"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('graph_changes', []).append((op, target, value))
+
+@event.listens_for(db.session, 'after_flush')
+def _resolve_changes(session, flush_context):
+    # Primary keys exist now, and objects are still loaded (they expire at commit)
+    pending = session.info.pop('graph_changes', None)
+    if pending:
+        resolved = session.info.setdefault('graph_resolved', [])
+        resolved.extend((op, target.id, value.id if value is not None else None)
+                        for op, target, value in pending)
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('graph_resolved', None)
+    graph = current_graph()
+    if changes and graph is not None:
+        graph.apply(changes)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('graph_changes', None)
+    session.info.pop('graph_resolved', None)
+
+def init_app(app):
+    """Load the follower index after the tables exist; call from create_app"""
+    if not app.config['GRAPH_INDEX']:
+        return
+    graph = FollowGraph()
+    with app.app_context():
+        graph.reload()
+    app.extensions['follow_graph'] = graph
+    from app.tasks import tasks
+    if app.config['GRAPH_REFRESH_SECONDS'] and tasks.periodic(app):
+        tasks.every(app, app.config['GRAPH_REFRESH_SECONDS'], graph.reload)
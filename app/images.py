@@ -0,0 +1,81 @@
+import os
+import threading
+from PIL import Image
+
+class ImageRejected(ValueError):
+    """An upload that is not a usable image or cannot be processed right now"""
+
+class MemoryBudget:
+    """Byte-counting semaphore bounding how much decoded pixel data a worker holds at once"""
+
+    def __init__(self, limit=256 * 1024 * 1024):
+        self.limit = limit
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount, timeout=None):
+        """Reserve amount bytes; returns the reservation to release, or None on timeout"""
+        # A single image larger than the whole budget may run alone rather than never
+        amount = min(amount, self.limit)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_use + amount <= self.limit, timeout):
+                return None
+            self.in_use += amount
+            return amount
+
+    def release(self, amount):
+        with self._cond:
+            self.in_use -= amount
+            self._cond.notify_all()
+
+budget = MemoryBudget()
+
+def decoded_size(img):
+    """Bytes the decoded raster of an opened image will take"""
+    bytes_per_band = 4 if img.mode in ('I', 'F', 'I;16') else 1
+    width, height = img.size
+    return width * height * len(img.getbands()) * bytes_per_band
+
+def save_thumbnail(upload, path, size, max_pixels, timeout=10):
+    """Decode an uploaded image at reduced scale and write a thumbnail to path.
+
+    The upload is read from its (disk-spooled) stream. Header dimensions are
+    checked against max_pixels before any pixel data is decoded, JPEGs are
+    decoded with libjpeg DCT scaling straight to roughly 2x the target size,
+    and the decoded bytes are reserved against the worker memory budget.
+    """
+    stream = getattr(upload, 'stream', upload)
+    try:
+        img = Image.open(stream)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageRejected('That file is not an image we can read.') from e
+    with img:
+        width, height = img.size
+        if width * height > max_pixels:
+            raise ImageRejected(f'Images may be at most {max_pixels // 1_000_000} megapixels.')
+        # Ask libjpeg for the smallest DCT scale that still covers twice the thumbnail box
+        # (what thumbnail() resamples from); other formats ignore draft() and decode in full
+        scale = min(size[0] / width, size[1] / height, 1.0) * 2
+        img.draft('RGB' if img.mode == 'CMYK' else img.mode,
+                  (max(1, int(width * scale)), max(1, int(height * scale))))
+        reserved = budget.acquire(decoded_size(img), timeout)
+        if reserved is None:
+            raise ImageRejected('The server is busy processing images, please try again.')
+        tmp_path = f'{path}.part'
+        try:
+            img.thumbnail(size)
+            fmt = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+            out = img.convert('RGB') if fmt == 'JPEG' and img.mode not in ('RGB', 'L') else img
+            # Write beside the target and rename so readers never see a partial file
+            out.save(tmp_path, format=fmt)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise ImageRejected('That image could not be processed.') from e
+        finally:
+            budget.release(reserved)
+    return path
+
+def init_app(app):
+    budget.limit = app.config['IMAGE_MEMORY_BUDGET']
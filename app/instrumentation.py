@@ -0,0 +1,123 @@
+import json
+import logging
+import random
+import time
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from flask_login import current_user
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.instrumentation')
+
+class RequestStats:
+    """Query and template timings collected for one sampled request"""
+    __slots__ = ('start', 'queries', 'db_time', 'slowest_sql', 'slowest_time',
+                 'template_time', '_template_start')
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_sql = None
+        self.slowest_time = 0.0
+        self.template_time = 0.0
+        self._template_start = None
+    
+    def record_query(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_sql = statement
+    
+    def as_dict(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'slowest_ms': round(self.slowest_time * 1000, 3),
+            'slowest_sql': self.slowest_sql,
+        }
+
+def current_stats():
+    """Stats for the current request, or None when it was not sampled"""
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    starts = conn.info.get('query_start')
+    if stats is not None and starts:
+        stats.record_query(statement, time.perf_counter() - starts.pop())
+
+def _before_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats._template_start = time.perf_counter()
+
+def _after_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats._template_start is not None:
+        stats.template_time += time.perf_counter() - stats._template_start
+        stats._template_start = None
+
+def server_timing(data):
+    return ', '.join([
+        f'db;dur={data["db_ms"]};desc="{data["queries"]} queries"',
+        f'tpl;dur={data["template_ms"]}',
+        f'total;dur={data["total_ms"]}',
+    ])
+
+def debug_panel(data):
+    slowest = escape(data['slowest_sql'] or '')
+    return (
+        '<div id="request-stats" style="position:fixed;bottom:0;right:0;z-index:9999;'
+        'background:#212529;color:#f8f9fa;font:12px monospace;padding:6px 10px;opacity:.85" '
+        f'title="{slowest}">{data["queries"]} queries &middot; db {data["db_ms"]} ms &middot; '
+        f'template {data["template_ms"]} ms &middot; total {data["total_ms"]} ms</div>'
+    )
+
+def show_debug_panel(app):
+    """The panel carries the slowest SQL statement, so only debug mode and ADMINS see it"""
+    if not app.config['INSTRUMENTATION_DEBUG_PANEL']:
+        return False
+    return app.debug or (current_user.is_authenticated and current_user.username in app.config['ADMINS'])
+
+def init_app(app):
+    """Record per-request SQL and template timings for a sample of requests"""
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    
+    @app.before_request
+    def start_request_stats():
+        if random.random() < app.config['INSTRUMENTATION_SAMPLE_RATE']:
+            g.request_stats = RequestStats()
+    
+    @app.after_request
+    def report_request_stats(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        line = {'event': 'request', 'method': request.method, 'path': request.path,
+                'endpoint': request.endpoint, 'status': response.status_code}
+        if response.is_streamed:
+            # The headers go out before the body renders (and runs its queries): log once it is sent
+            response.call_on_close(lambda: logger.info(json.dumps({**line, **stats.as_dict()})))
+            return response
+        data = stats.as_dict()
+        response.headers['Server-Timing'] = server_timing(data)
+        logger.info(json.dumps({**line, **data}))
+        if response.mimetype == 'text/html' and show_debug_panel(app):
+            body = response.get_data(as_text=True)
+            if '</body>' in body:
+                response.set_data(body.replace('</body>', debug_panel(data) + '</body>', 1))
+        return response
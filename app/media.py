@@ -0,0 +1,49 @@
+import mimetypes
+import os
+from flask import Response, abort, current_app, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+KINDS = ('avatars', 'posts')
+MODES = ('direct', 'x-sendfile', 'x-accel')
+
+def media_root(app=None):
+    return os.path.join((app or current_app).root_path, 'static', 'uploads')
+
+def media_url(kind, filename):
+    return url_for('media', kind=kind, filename=filename)
+
+def accel_response(kind, filename, max_age):
+    """Empty response telling nginx to serve the file (with Range and ETag) from its internal location"""
+    prefix = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/')
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = f'{prefix}/{kind}/{filename}'
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+def serve_media(kind, filename):
+    """Serve an uploaded image with Range and conditional support, or hand it to the proxy"""
+    if kind not in KINDS:
+        abort(404)
+    directory = os.path.join(media_root(), kind)
+    mode = current_app.config['MEDIA_SEND_MODE']
+    max_age = current_app.config['MEDIA_MAX_AGE']
+    if mode == 'x-accel':
+        path = safe_join(directory, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        return accel_response(kind, filename, max_age)
+    # send_file hands the open file to wsgi.file_wrapper (sendfile(2) under gunicorn)
+    # and answers If-None-Match / If-Modified-Since / Range itself
+    response = send_from_directory(directory, filename, conditional=True, max_age=max_age)
+    response.cache_control.public = True
+    return response
+
+def init_app(app):
+    mode = app.config['MEDIA_SEND_MODE']
+    if mode not in MODES:
+        raise ValueError(f'MEDIA_SEND_MODE must be one of {", ".join(MODES)}, not {mode!r}')
+    # Flask's send_file emits X-Sendfile (Apache mod_xsendfile, lighttpd) when this is set
+    app.config['USE_X_SENDFILE'] = mode == 'x-sendfile'
+    app.add_url_rule('/media/<kind>/<path:filename>', 'media', serve_media)
+    app.jinja_env.globals['media_url'] = media_url
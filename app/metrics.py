@@ -0,0 +1,215 @@
+import glob
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, abort, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class MetricsRegistry:
+    """Process-local counters and histograms with an optional file-backed store.
+    
+    Recording only touches in-memory dicts. When a directory is configured each
+    worker periodically writes its totals to its own file and a scrape merges
+    every worker's file, so pre-fork servers report one combined view.
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+    
+    def gauge(self, name, fn, **labels):
+        """Register a callable sampled at scrape/flush time"""
+        self.gauges[(name, tuple(sorted(labels.items())))] = fn
+    
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, list(labels), list(h[0]), h[1], h[2]]
+                          for (name, labels), h in self.histograms.items()]
+        gauges = []
+        for (name, labels), fn in self.gauges.items():
+            try:
+                gauges.append([name, list(labels), float(fn())])
+            except Exception:
+                continue
+        return {'pid': os.getpid(), 'time': time.time(), 'buckets': list(self.buckets),
+                'counters': counters, 'histograms': histograms, 'gauges': gauges}
+    
+    def flush(self, directory):
+        """Atomically write this worker's snapshot to directory"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+        self._last_flush = time.monotonic()
+    
+    def maybe_flush(self, directory, interval):
+        if directory and time.monotonic() - self._last_flush >= interval:
+            self.flush(directory)
+    
+    def collect(self, directory=None, gauge_max_age=60.0):
+        """Merged snapshots from every worker (or just this one without a directory)"""
+        if not directory:
+            return [self.snapshot()]
+        self.flush(directory)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # An exited worker's file is dropped (Prometheus treats the lower total as a counter
+            # reset); a live worker that stopped flushing keeps its counters but not its gauges
+            if not _alive(snapshot['pid']):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if time.time() - snapshot['time'] > gauge_max_age:
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+        return snapshots
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, owned by another user
+    return True
+
+def scrape_allowed(token):
+    """With a token configured a scrape must send it as a bearer token; otherwise it must
+    come from a loopback or private address"""
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"'.replace('\n', ' ') for k, v in pairs) + '}'
+
+def render(snapshots):
+    """Render merged snapshots in the Prometheus text exposition format"""
+    counters, histograms, gauges = {}, {}, {}
+    buckets = snapshots[0]['buckets'] if snapshots else list(DEFAULT_BUCKETS)
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)) + (('pid', snapshot['pid']),))
+            gauges[key] = value
+    
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges)):
+        for name in sorted({name for name, _ in series}):
+            lines.append(f'# TYPE {name} {kind}')
+            for (series_name, labels), value in sorted(series.items()):
+                if series_name == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# TYPE {name} histogram')
+        for (series_name, labels), (counts, total, count) in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+def init_app(app):
+    """Time every request and expose GET /metrics"""
+    from app import db
+    from app.events import bus
+    from app.tasks import tasks
+    
+    with app.app_context():
+        pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        metrics.gauge('db_pool_checked_out', pool.checkedout)
+    if hasattr(pool, 'size'):
+        metrics.gauge('db_pool_size', pool.size)
+    metrics.gauge('background_tasks_pending', tasks.pending)
+    metrics.gauge('sse_subscribers', bus.subscriber_count)
+    
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_start = time.perf_counter()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None or request.endpoint == 'metrics':
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        status = response.status_code
+        
+        def record():
+            metrics.inc('http_requests_total', endpoint=endpoint, method=method, status=status)
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                            endpoint=endpoint, status=status)
+            metrics.maybe_flush(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+        
+        # A streamed body renders after this hook; time it until the response is closed
+        if response.is_streamed:
+            response.call_on_close(record)
+        else:
+            record()
+        return response
+    
+    def export_metrics():
+        if not scrape_allowed(app.config['METRICS_TOKEN']):
+            abort(403)
+        snapshots = metrics.collect(app.config['METRICS_DIR'], 4 * app.config['METRICS_FLUSH_SECONDS'])
+        return Response(render(snapshots), mimetype='text/plain; version=0.0.4')
+    
+    if app.config['METRICS_ENABLED']:
+        app.add_url_rule('/metrics', 'metrics', export_metrics)
@@ -1,54 +1,95 @@
+import secrets
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.passwords import hash_password, verify_password, needs_rehash
+from app.graph import current_graph, record_change
+from app.availability import remember_user
 
 # Association table for followers (many-to-many relationship)
 followers = db.Table('followers',
-    db.Column('follower_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('follower_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
 )
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     bio = db.Column(db.Text)
     avatar = db.Column(db.String(200), default='default_avatar.png')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    # Changes whenever credentials or profile data change, invalidating session claims
+    security_stamp = db.Column(db.String(32), nullable=False, default=lambda: secrets.token_hex(8))
     
-    # Relationships
-    posts = db.relationship('Post', backref='author', lazy='dynamic', cascade='all, delete-orphan')
-    comments = db.relationship('Comment', backref='author', lazy='dynamic', cascade='all, delete-orphan')
-    likes = db.relationship('Like', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    # Relationships (children are removed by ON DELETE CASCADE, not loaded and deleted row by row)
+    posts = db.relationship('Post', backref='author', lazy='dynamic', cascade='all, delete-orphan',
+                            passive_deletes=True)
+    comments = db.relationship('Comment', backref='author', lazy='dynamic', cascade='all, delete-orphan',
+                               passive_deletes=True)
+    likes = db.relationship('Like', backref='user', lazy='dynamic', cascade='all, delete-orphan',
+                            passive_deletes=True)
     
     # Following relationship
     followed = db.relationship(
         'User', secondary=followers,
         primaryjoin=(followers.c.follower_id == id),
         secondaryjoin=(followers.c.followed_id == id),
-        backref=db.backref('followers', lazy='dynamic'), lazy='dynamic')
+        backref=db.backref('followers', lazy='dynamic', passive_deletes=True),
+        lazy='dynamic', passive_deletes=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
+        self.bump_security_stamp()
+    
+    def rehash_password(self, password):
+        """Re-hash the same password with the configured parameters; other sessions stay valid"""
+        self.password_hash = hash_password(password)
+    
+    def bump_security_stamp(self):
+        self.security_stamp = secrets.token_hex(8)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
     
     def is_following(self, user):
+        graph = current_graph()
+        if graph is not None and self.id is not None:
+            return graph.is_following(self.id, user.id)
+        return self._follows_in_db(user)
+    
+    def _follows_in_db(self, user):
         return self.followed.filter(followers.c.followed_id == user.id).count() > 0
     
+    # Writes check the database: the index only reflects committed transactions
     def follow(self, user):
-        if not self.is_following(user):
+        if not self._follows_in_db(user):
             self.followed.append(user)
     
     def unfollow(self, user):
-        if self.is_following(user):
+        if self._follows_in_db(user):
             self.followed.remove(user)
     
+    def follower_count(self):
+        graph = current_graph()
+        if graph is not None:
+            return graph.follower_count(self.id)
+        return self.followers.count()
+    
+    def following_count(self):
+        graph = current_graph()
+        if graph is not None:
+            return graph.following_count(self.id)
+        return self.followed.count()
+    
     def followed_posts(self):
         followed = Post.query.join(
             followers, (followers.c.followed_id == Post.user_id)).filter(
@@ -62,22 +103,56 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Posts, comments and likes use AUTOINCREMENT: archiving moves the highest ids out of these
+# tables, and plain SQLite rowids would then be handed out again to new rows
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     image = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    # Denormalized counter, kept in step by the Comment insert/delete listeners below
+    comments_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = {'sqlite_autoincrement': True}
     
     # Relationships
-    comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
-    likes = db.relationship('Like', backref='post', lazy='dynamic', cascade='all, delete-orphan')
+    comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan',
+                               passive_deletes=True)
+    likes = db.relationship('Like', backref='post', lazy='dynamic', cascade='all, delete-orphan',
+                            passive_deletes=True)
     
     def like_count(self):
         return self.likes.count()
     
     def comment_count(self):
-        return self.comments.count()
+        return self.comments_count or 0
+    
+    def comments_query(self, before=None):
+        """Newest-first comments, after the `before` comment id if given (None for a bad cursor).
+        
+        Uses keyset pagination on (created_at, id) so deep pages cost the same as
+        the first one, and eager-loads authors to avoid a query per comment.
+        """
+        query = Comment.query.options(joinedload(Comment.author)).filter(
+            Comment.post_id == self.id)
+        if before is not None:
+            cursor = db.session.get(Comment, before)
+            if cursor is None or cursor.post_id != self.id:
+                return None
+            query = query.filter(db.or_(
+                Comment.created_at < cursor.created_at,
+                db.and_(Comment.created_at == cursor.created_at, Comment.id < cursor.id)))
+        return query.order_by(Comment.created_at.desc(), Comment.id.desc())
+    
+    def comments_page(self, before=None, limit=20):
+        """Return one page of comments (newest first) and the cursor for the next page"""
+        query = self.comments_query(before)
+        if query is None:
+            return [], None
+        comments = query.limit(limit + 1).all()
+        next_cursor = comments[limit - 1].id if len(comments) > limit else None
+        return comments[:limit], next_cursor
     
     def __repr__(self):
         return f'<Post {self.id}>'
@@ -86,20 +161,117 @@ class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    
+    # Serves the keyset-paginated comment thread on post_detail
+    __table_args__ = (db.Index('ix_comment_post_created', 'post_id', 'created_at', 'id'),
+                      {'sqlite_autoincrement': True})
     
     def __repr__(self):
         return f'<Comment {self.id}>'
 
+@event.listens_for(Comment, 'after_insert')
+def _increment_comment_count(mapper, connection, target):
+    connection.execute(Post.__table__.update().where(Post.__table__.c.id == target.post_id).values(
+        comments_count=Post.__table__.c.comments_count + 1))
+
+class PostScore(db.Model):
+    """Precomputed engagement score for a recent post, refreshed by app.trending"""
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, index=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    post = db.relationship('Post')
+    
+    def __repr__(self):
+        return f'<PostScore {self.post_id} {self.score:.3f}>'
+
+class FollowSuggestion(db.Model):
+    """Precomputed "who to follow" candidate, refreshed by app.suggestions"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    suggested_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Integer, nullable=False)
+    
+    suggested = db.relationship('User', foreign_keys=[suggested_id])
+    
+    __table_args__ = (db.Index('ix_follow_suggestion_user_score', 'user_id', 'score'),)
+    
+    def __repr__(self):
+        return f'<FollowSuggestion {self.user_id}->{self.suggested_id}>'
+
+@event.listens_for(User, 'before_delete')
+def _discount_user_comments(mapper, connection, target):
+    # The user's comments go away through ON DELETE CASCADE without ORM events,
+    # so settle the counters of the posts they commented on in one statement.
+    post = Post.__table__
+    comment = Comment.__table__
+    per_post = db.select(db.func.count()).where(
+        comment.c.post_id == post.c.id, comment.c.user_id == target.id).scalar_subquery()
+    connection.execute(post.update().where(
+        post.c.id.in_(db.select(comment.c.post_id).where(comment.c.user_id == target.id))).values(
+        comments_count=post.c.comments_count - per_post))
+
+@event.listens_for(User.followed, 'append')
+def _record_follow(target, value, initiator):
+    record_change(target, 'follow', value)
+
+@event.listens_for(User.followed, 'remove')
+def _record_unfollow(target, value, initiator):
+    record_change(target, 'unfollow', value)
+
+@event.listens_for(User, 'after_delete')
+def _record_user_drop(mapper, connection, target):
+    # ON DELETE CASCADE removes the user's edges without collection events
+    record_change(target, 'drop')
+
+@event.listens_for(User, 'after_insert')
+def _remember_new_user(mapper, connection, target):
+    remember_user(target)
+
+@event.listens_for(User, 'after_update')
+def _remember_renamed_user(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.username.history.has_changes() or state.attrs.email.history.has_changes():
+        remember_user(target)
+
+@event.listens_for(Comment, 'after_delete')
+def _decrement_comment_count(mapper, connection, target):
+    connection.execute(Post.__table__.update().where(Post.__table__.c.id == target.post_id).values(
+        comments_count=Post.__table__.c.comments_count - 1))
+
 class Like(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Ensure a user can only like a post once
-    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_like'),)
+    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_like'),
+                      {'sqlite_autoincrement': True})
     
     def __repr__(self):
         return f'<Like {self.id}>'
+
+class Tag(db.Model):
+    """A normalized (casefolded) hashtag; posts link to it through post_tag"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+# Hashtags and @mentions parsed out of post content by app.tags. The primary keys lead with
+# the tag/user so a tag or mentions page is a descending range scan of one covering index;
+# the post_id indexes serve ON DELETE CASCADE when a post goes away.
+post_tag = db.Table('post_tag',
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('post_id', db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True,
+              index=True)
+)
+
+post_mention = db.Table('post_mention',
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('post_id', db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True,
+              index=True)
+)
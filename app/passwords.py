@@ -0,0 +1,53 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = None
+
+def _get_pool(workers, queue_size):
+    # Created lazily so pre-fork servers start the pool inside each worker
+    global _pool, _pool_pid, _slots
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(workers + queue_size)
+        return _pool, _slots
+
+def _run(fn, *args):
+    """Run a KDF call on the hashing pool, or inline when no workers are configured.
+    
+    The request thread blocks on the result without holding the GIL, and the
+    semaphore bounds how many hashes can be queued at once.
+    """
+    config = current_app.config
+    workers = config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return fn(*args)
+    pool, slots = _get_pool(workers, config['PASSWORD_HASH_QUEUE'])
+    with slots:
+        return pool.submit(fn, *args).result()
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+def expand_method(method):
+    """werkzeug's full spelling of a method, as it prefixes the hashes it generates"""
+    kdf, *args = method.split(':')
+    if kdf == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if kdf == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+def needs_rehash(pwhash):
+    """True when pwhash was made with different KDF parameters than configured"""
+    return pwhash.split('$', 1)[0] != expand_method(current_app.config['PASSWORD_HASH_METHOD'])
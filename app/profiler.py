@@ -0,0 +1,188 @@
+import glob
+import importlib
+import itertools
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from html import escape
+from flask import g, request
+from flask_login import current_user
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:  # optional: only the gevent worker needs greenlet-aware sampling
+    gevent_monkey = None
+
+def _original(module, name):
+    """A stdlib function as it was before gevent monkey-patched it"""
+    if gevent_monkey is not None:
+        return gevent_monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+def current_target():
+    """(OS thread id, greenlet or None) identifying the code running this request"""
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        import greenlet
+        return _original('_thread', 'get_ident')(), greenlet.getcurrent()
+    return threading.get_ident(), None
+
+class StackSampler:
+    """Statistical sampler that records one thread's stack every `interval` seconds.
+    
+    It runs on its own OS thread and only reads sys._current_frames(), so the
+    profiled request pays nothing beyond the GIL switches of the sampler. Under
+    gevent a request is a greenlet sharing its OS thread with others: its frame
+    is the thread's while it runs and its own gr_frame while it is switched out.
+    The sampler thread uses the unpatched primitives so it runs while the
+    request holds the hub.
+    """
+    
+    def __init__(self, thread_id, interval=0.005, greenlet=None):
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = False
+        self._done = _original('_thread', 'allocate_lock')()
+    
+    def start(self):
+        # Like Thread.start, return once the sampler runs: a short request could
+        # otherwise finish before the new thread is first scheduled
+        started = _original('_thread', 'allocate_lock')()
+        started.acquire()
+        self._done.acquire()
+        _original('_thread', 'start_new_thread')(self._run, (started,))
+        started.acquire()
+        return self
+    
+    def stop(self):
+        self._stopped = True
+        self._done.acquire()
+        self._done.release()
+        return self.stacks
+    
+    def _frame(self):
+        if self.greenlet is not None and self.greenlet.gr_frame is not None:
+            return self.greenlet.gr_frame
+        return sys._current_frames().get(self.thread_id)
+    
+    def _run(self, started):
+        sleep = _original('time', 'sleep')
+        started.release()
+        try:
+            self._sample(sleep)
+        finally:
+            self._done.release()
+    
+    def _sample(self, sleep):
+        while True:
+            sleep(self.interval)
+            if self._stopped:
+                return
+            frame = self._frame()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+def write_collapsed(stacks, path):
+    """Write stacks in the collapsed format understood by flamegraph.pl and speedscope"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+def read_collapsed(paths):
+    stacks = Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[stack] += int(count)
+    return stacks
+
+def render_flamegraph(stacks, title='Flame graph', width=1200, row_height=16):
+    """Render aggregated collapsed stacks as a self-contained SVG flame graph"""
+    root = {'children': {}, 'count': 0}
+    for stack, count in stacks.items():
+        root['count'] += count
+        node = root
+        for frame in stack.split(';'):
+            node = node['children'].setdefault(frame, {'children': {}, 'count': 0})
+            node['count'] += count
+    
+    rects = []
+    def layout(node, x, depth):
+        for name, child in sorted(node['children'].items()):
+            w = child['count'] / root['count'] * width
+            if w >= 0.5:
+                rects.append((x, depth, w, name, child['count']))
+                layout(child, x, depth + 1)
+            x += w
+    if root['count']:
+        layout(root, 0.0, 0)
+    
+    max_depth = max((r[1] for r in rects), default=0) + 1
+    height = (max_depth + 2) * row_height
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="{row_height - 4}">{escape(title)} ({root["count"]} samples)</text>',
+    ]
+    for x, depth, w, name, count in rects:
+        y = height - (depth + 1) * row_height
+        hue = 20 + zlib.crc32(name.encode()) % 40
+        label = escape(name[:int(w / 7)]) if w > 21 else ''
+        parts.append(
+            f'<g><title>{escape(name)} ({count} samples, {count / root["count"]:.1%})</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},90%,60%)"/>'
+            f'<text x="{x + 3:.1f}" y="{y + row_height - 5}">{label}</text></g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def profile_files(directory, endpoint=None):
+    pattern = f'{endpoint}-*.collapsed' if endpoint else '*.collapsed'
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+def init_app(app):
+    """Opt-in request profiling.
+    
+    A request is profiled when PROFILER_ENABLED is set and either its endpoint
+    is listed in PROFILER_ENDPOINTS, it is the 1-in-PROFILER_SAMPLE_EVERY
+    request, or an account named in ADMINS asks for it with ?profile=1.
+    """
+    counter = itertools.count(1)
+    
+    def should_profile():
+        config = app.config
+        if not config['PROFILER_ENABLED']:
+            return False
+        if request.args.get('profile') == '1':
+            return current_user.is_authenticated and current_user.username in config['ADMINS']
+        if request.endpoint in config['PROFILER_ENDPOINTS']:
+            return True
+        every = config['PROFILER_SAMPLE_EVERY']
+        return bool(every) and next(counter) % every == 0
+    
+    @app.before_request
+    def start_profiler():
+        if should_profile():
+            thread_id, greenlet = current_target()
+            g.profiler = StackSampler(thread_id, app.config['PROFILER_INTERVAL'], greenlet).start()
+    
+    @app.teardown_request
+    def stop_profiler(exc):
+        sampler = g.pop('profiler', None)
+        if sampler is None:
+            return
+        stacks = sampler.stop()
+        if stacks:
+            name = f'{request.endpoint or "unmatched"}-{time.strftime("%Y%m%d%H%M%S")}-{os.getpid()}-{threading.get_ident()}.collapsed'
+            write_collapsed(stacks, os.path.join(app.config['PROFILER_DIR'], name))
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import time
+from flask import Response, g, jsonify, request
+from flask_login import current_user
+from app.metrics import metrics
+from app.tasks import tasks
+
+UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_budget(budget):
+    """Turn '30/minute' into (capacity, tokens refilled per second)"""
+    count, _, unit = budget.partition('/')
+    capacity = int(count)
+    return capacity, capacity / UNITS[unit.strip().rstrip('s')]
+
+def refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+class MemoryBackend:
+    """Token buckets held in this process.
+    
+    Each bucket remembers when it will be full again; full buckets are the same
+    as missing ones, so a periodic sweep drops them and one-off visitors do not
+    accumulate.
+    """
+    
+    def __init__(self, sweep_interval=60.0):
+        self.sweep_interval = sweep_interval
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept = 0.0
+    
+    def consume(self, key, capacity, rate, now=None):
+        """Take one token; return 0 when allowed, else seconds until one is available"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._swept >= self.sweep_interval:
+                self._sweep(now)
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = refill(tokens, updated, capacity, rate, now)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return wait
+    
+    def _sweep(self, now):
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._swept = now
+    
+    def __len__(self):
+        return len(self._buckets)
+
+class SQLiteBackend:
+    """Token buckets in a small SQLite file shared by every worker on the host"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS bucket '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+    
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+    
+    def consume(self, key, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = refill(row[0], row[1], capacity, rate, now) if row else capacity
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                               (key, tokens, now))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+class LoadShedder:
+    """Rejects write requests early while the write path is saturated.
+    
+    Tracks an exponentially weighted average of write latency (dominated by
+    waiting on SQLite's single writer) and the number of writes in flight plus
+    queued background tasks. The average decays while writes are being shed so
+    the app recovers on its own once the storm passes.
+    """
+    
+    def __init__(self, latency_ms, max_queue, half_life=5.0):
+        self.latency_ms = latency_ms
+        self.max_queue = max_queue
+        self.half_life = half_life
+        self.average_ms = 0.0
+        self.inflight = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def current_latency(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.average_ms * 0.5 ** ((now - self._updated) / self.half_life)
+    
+    def overloaded(self):
+        queue = self.inflight + tasks.pending()
+        return queue >= self.max_queue or self.current_latency() >= self.latency_ms
+    
+    def begin(self):
+        with self._lock:
+            self.inflight += 1
+    
+    def end(self, duration_ms):
+        with self._lock:
+            self.inflight -= 1
+            now = time.monotonic()
+            self.average_ms = 0.8 * self.current_latency(now) + 0.2 * duration_ms
+            self._updated = now
+
+def _reject(status, message, retry_after):
+    headers = {'Retry-After': str(max(1, int(retry_after + 0.999)))}
+    if request.is_json:
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers.extend(headers)
+        return response
+    return Response(message, status=status, headers=headers, mimetype='text/plain')
+
+def init_app(app):
+    """Apply per-endpoint token buckets and load shedding to write requests, and budgets to a few reads"""
+    config = app.config
+    if config['RATELIMIT_BACKEND'] == 'sqlite':
+        backend = SQLiteBackend(config['RATELIMIT_STORAGE_PATH'])
+    else:
+        backend = MemoryBackend()
+    budgets = {endpoint: parse_budget(budget) for endpoint, budget in config['RATELIMITS'].items()}
+    read_budgets = {endpoint: parse_budget(budget) for endpoint, budget in config['READ_RATELIMITS'].items()}
+    shedder = LoadShedder(config['SHED_LATENCY_MS'], config['SHED_MAX_QUEUE'])
+    app.extensions['ratelimit'] = backend
+    app.extensions['load_shedder'] = shedder
+    
+    def throttle(key, budget):
+        wait = backend.consume(f'{request.endpoint}:{key}', *budget)
+        if wait:
+            metrics.inc('ratelimit_rejections_total', endpoint=request.endpoint)
+            return _reject(429, 'Too many requests, slow down.', wait)
+        return None
+    
+    @app.before_request
+    def limit_writes():
+        if not config['RATELIMIT_ENABLED']:
+            return None
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            budget = read_budgets.get(request.endpoint)
+            # Always per IP: more accounts must not buy more lookups
+            return throttle(f'ip:{request.remote_addr}', budget) if budget is not None else None
+        if shedder.overloaded() and request.endpoint not in config['SHED_EXEMPT']:
+            metrics.inc('load_shed_total', endpoint=request.endpoint)
+            return _reject(503, 'Server busy, please retry shortly.', config['SHED_RETRY_AFTER'])
+        budget = budgets.get(request.endpoint)
+        if budget is not None:
+            who = f'user:{current_user.id}' if current_user.is_authenticated else f'ip:{request.remote_addr}'
+            rejected = throttle(who, budget)
+            if rejected is not None:
+                return rejected
+        shedder.begin()
+        g.write_started = time.perf_counter()
+        return None
+    
+    @app.teardown_request
+    def finish_write(exc):
+        started = g.pop('write_started', None)
+        if started is not None:
+            shedder.end((time.perf_counter() - started) * 1000.0)
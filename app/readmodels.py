@@ -0,0 +1,347 @@
+from functools import partial
+from flask_sqlalchemy.pagination import Pagination
+from app import archive, db, sharding
+from app.archive import archived_posts, archived_comments, archived_likes
+from app.models import User, Post, Like, PostScore, followers, post_tag, post_mention
+
+class AuthorView:
+    """The author fields a feed card reads; shared by all of a user's posts on a page"""
+    __slots__ = ('id', 'username', 'avatar')
+
+    def __init__(self, id, username, avatar):
+        self.id = id
+        self.username = username
+        self.avatar = avatar
+
+class PostView:
+    """Untracked snapshot of a post as rendered in a feed, with its counts precomputed"""
+    __slots__ = ('id', 'content', 'image', 'created_at', 'author', 'likes', 'comments', 'liked', 'archived')
+
+    def __init__(self, id, content, image, created_at, author, likes=0, comments=0, liked=False, archived=False):
+        self.id = id
+        self.content = content
+        self.image = image
+        self.created_at = created_at
+        self.author = author
+        self.likes = likes
+        self.comments = comments
+        self.liked = liked
+        self.archived = archived  # read-only: likes and comments are closed
+
+    # Same accessors as Post so templates and JS payloads need not care which they got
+    def like_count(self):
+        return self.likes
+
+    def comment_count(self):
+        return self.comments
+
+class ProfileView:
+    """A user's profile header: identity plus the three counts shown beside it"""
+    __slots__ = ('id', 'username', 'avatar', 'bio', 'created_at', 'posts', 'followers', 'following')
+
+    def __init__(self, id, username, avatar, bio, created_at, posts=0, followers=0, following=0):
+        self.id = id
+        self.username = username
+        self.avatar = avatar
+        self.bio = bio
+        self.created_at = created_at
+        self.posts = posts
+        self.followers = followers
+        self.following = following
+
+    def post_count(self):
+        return self.posts
+
+    def follower_count(self):
+        return self.followers
+
+    def following_count(self):
+        return self.following
+
+class CommentView:
+    __slots__ = ('id', 'content', 'created_at', 'author')
+
+    def __init__(self, id, content, created_at, author):
+        self.id = id
+        self.content = content
+        self.created_at = created_at
+        self.author = author
+
+class PostDetail:
+    """Everything on a post page that is the same for every viewer"""
+    __slots__ = ('post', 'comments', 'next_cursor')
+
+    def __init__(self, post, comments, next_cursor):
+        self.post = post
+        self.comments = comments
+        self.next_cursor = next_cursor
+
+def post_rows():
+    """Column query for exactly what a feed card renders"""
+    return db.session.query(
+        Post.id, Post.content, Post.image, Post.created_at, Post.comments_count,
+        User.id, User.username, User.avatar).join(User, User.id == Post.user_id)
+
+def recent_rows():
+    return post_rows().order_by(Post.created_at.desc())
+
+def feed_rows(user_id):
+    """The user's own posts plus those of everyone they follow, newest first"""
+    followed = db.select(followers.c.followed_id).where(followers.c.follower_id == user_id)
+    return post_rows().filter(db.or_(Post.user_id == user_id, Post.user_id.in_(followed))).order_by(
+        Post.created_at.desc())
+
+def user_rows(user_id):
+    return post_rows().filter(Post.user_id == user_id).order_by(Post.created_at.desc())
+
+def trending_rows():
+    return post_rows().join(PostScore, PostScore.post_id == Post.id).order_by(
+        PostScore.score.desc(), Post.id.desc())
+
+def tag_rows(tag_id):
+    return post_rows().join(post_tag, post_tag.c.post_id == Post.id).filter(post_tag.c.tag_id == tag_id)
+
+def mention_rows(user_id):
+    return post_rows().join(post_mention, post_mention.c.post_id == Post.id).filter(
+        post_mention.c.user_id == user_id)
+
+def keyset_views(query, key, before, limit, viewer_id=None):
+    """One page of a row query, newest first by the post id column `key`, below the `before` cursor.
+
+    Returns the PostViews and the cursor for the next page (None on the last one).
+    """
+    if before is not None:
+        query = query.filter(key < before)
+    rows = query.order_by(key.desc()).limit(limit + 1).all()
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return build_views(rows[:limit], viewer_id), next_cursor
+
+def newest_post_id():
+    """Highest post id; a single probe of the primary-key index (one per shard when sharded)"""
+    if sharding.enabled():
+        return sharding.newest_post_id()
+    return db.session.query(db.func.max(Post.id)).scalar() or 0
+
+def count_since(query, since, limit):
+    """How many rows of a feed query are newer than post id `since`, counting at most `limit`"""
+    ids = query.filter(Post.id > since).with_entities(Post.id).order_by(None).limit(limit).subquery()
+    return db.session.query(db.func.count()).select_from(ids).scalar()
+
+def build_views(rows, viewer_id=None):
+    """Turn feed rows into PostViews with two extra queries for the whole page"""
+    post_ids = [row[0] for row in rows]
+    if not post_ids:
+        return []
+    likes = dict(db.session.query(Like.post_id, db.func.count()).filter(
+        Like.post_id.in_(post_ids)).group_by(Like.post_id))
+    liked = set()
+    if viewer_id is not None:
+        liked = {post_id for post_id, in db.session.query(Like.post_id).filter(
+            Like.user_id == viewer_id, Like.post_id.in_(post_ids))}
+    authors = {}
+    views = []
+    for post_id, content, image, created_at, comments, author_id, username, avatar in rows:
+        author = authors.get(author_id)
+        if author is None:
+            author = authors[author_id] = AuthorView(author_id, username, avatar)
+        views.append(PostView(post_id, content, image, created_at, author,
+                              likes.get(post_id, 0), comments or 0, post_id in liked))
+    return views
+
+def author_views(user_ids):
+    """AuthorViews by id for users of the main database (deleted users are simply absent)"""
+    if not user_ids:
+        return {}
+    return {user_id: AuthorView(user_id, username, avatar) for user_id, username, avatar in db.session.query(
+        User.id, User.username, User.avatar).filter(User.id.in_(user_ids))}
+
+def row_views(rows, likes, liked, archived=False):
+    """PostViews for post table rows outside the main database; authors are looked up in it"""
+    authors = author_views({row.user_id for row in rows})
+    return [PostView(row.id, row.content, row.image, row.created_at, authors[row.user_id], likes.get(row.id, 0),
+                     row.comments_count or 0, row.id in liked, archived)
+            for row in rows if row.user_id in authors]
+
+def build_archived_views(rows, viewer_id=None):
+    """PostViews for archive post rows"""
+    post_ids = [row.id for row in rows]
+    if not post_ids:
+        return []
+    likes = dict(archive.execute(db.select(archived_likes.c.post_id, db.func.count()).where(
+        archived_likes.c.post_id.in_(post_ids)).group_by(archived_likes.c.post_id)).all())
+    liked = set()
+    if viewer_id is not None:
+        liked = set(archive.execute(db.select(archived_likes.c.post_id).where(
+            archived_likes.c.user_id == viewer_id, archived_likes.c.post_id.in_(post_ids))).scalars())
+    return row_views(rows, likes, liked, archived=True)
+
+def build_sharded_views(rows, viewer_id=None):
+    """PostViews for shard post rows, with one like query (two for a viewer) per shard involved"""
+    if not rows:
+        return []
+    likes, liked = sharding.like_counts([row.id for row in rows], viewer_id)
+    return row_views(rows, likes, liked)
+
+def feed_owners(user_id):
+    """The user and everyone they follow: whose posts their sharded home feed merges"""
+    return [user_id] + db.session.execute(db.select(followers.c.followed_id).where(
+        followers.c.follower_id == user_id)).scalars().all()
+
+class ShardedPagination(Pagination):
+    """Posts by some users (everyone for None) merged across shards, newest first.
+
+    Page n takes the newest n * per_page posts from each shard involved, so deep
+    pages cost more; the feed is rarely read far back.
+    """
+
+    def _query_items(self):
+        user_ids, viewer_id = self._query_args['user_ids'], self._query_args['viewer_id']
+        rows = sharding.newest_posts(user_ids, self._query_offset + self.per_page)
+        return build_sharded_views(rows[self._query_offset:], viewer_id)
+
+    def _query_count(self):
+        return sharding.count_posts(self._query_args['user_ids'])
+
+def sharded_feed(user_ids, page, per_page, viewer_id=None):
+    return ShardedPagination(page=page, per_page=per_page, error_out=False, user_ids=user_ids,
+                             viewer_id=viewer_id)
+
+class TieredPagination(Pagination):
+    """A user's posts as PostViews: the hot ones, then the archived ones, which are all older"""
+
+    def _query_items(self):
+        user_id, viewer_id = self._query_args['user_id'], self._query_args['viewer_id']
+        hot = user_rows(user_id)
+        self._hot_total = hot.order_by(None).count()
+        offset = self._query_offset
+        views = []
+        if offset < self._hot_total:
+            views = build_views(hot.limit(self.per_page).offset(offset).all(), viewer_id)
+        if len(views) < self.per_page:
+            rows = archive.execute(db.select(archived_posts).where(archived_posts.c.user_id == user_id).order_by(
+                archived_posts.c.created_at.desc(), archived_posts.c.id.desc()).limit(
+                self.per_page - len(views)).offset(max(0, offset - self._hot_total))).all()
+            views += build_archived_views(rows, viewer_id)
+        return views
+
+    def _query_count(self):
+        return self._hot_total + archive.post_count(self._query_args['user_id'])
+
+def profile_posts(user_id, page, per_page, viewer_id=None):
+    if sharding.enabled():
+        return sharded_feed([user_id], page, per_page, viewer_id)
+    return TieredPagination(page=page, per_page=per_page, error_out=False, user_id=user_id, viewer_id=viewer_id)
+
+def paginate_views(query, page, per_page, viewer_id=None):
+    """Paginate a row query and swap its items for PostViews"""
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination.items = build_views(pagination.items, viewer_id)
+    return pagination
+
+def user_post_counts(user_ids):
+    """Post count by user id across the hot tables, the archive and the shards"""
+    counts = dict.fromkeys(user_ids, 0)
+    if not counts:
+        return counts
+    for execute, table in ((db.session.execute, Post.__table__), (archive.execute, archived_posts)):
+        for user_id, count in execute(db.select(table.c.user_id, db.func.count()).where(
+                table.c.user_id.in_(counts)).group_by(table.c.user_id)):
+            counts[user_id] += count
+    if sharding.enabled():
+        for user_id, count in sharding.user_post_counts(list(counts)).items():
+            counts[user_id] += count
+    return counts
+
+def profile_views(users):
+    """Snapshot several Users with their post, follower and following counts"""
+    posts = user_post_counts([user.id for user in users])
+    return [ProfileView(user.id, user.username, user.avatar, user.bio, user.created_at,
+                        posts[user.id], user.follower_count(), user.following_count())
+            for user in users]
+
+def profile_view(user):
+    """Snapshot a User with its post, follower and following counts"""
+    return profile_views([user])[0]
+
+def viewer_liked(post_id, viewer_id):
+    """Whether viewer_id has liked the (hot or sharded) post"""
+    if sharding.enabled():
+        return post_id in sharding.like_counts([post_id], viewer_id)[1]
+    return Like.query.filter(Like.user_id == viewer_id, Like.post_id == post_id).first() is not None
+
+def profile_summary(username):
+    """The profile header for username, or None if there is no such user"""
+    user = User.query.filter_by(username=username).first()
+    return None if user is None else profile_view(user)
+
+def post_page(post_id, comments_per_page):
+    """A post with its author's profile header and first page of comments, or None"""
+    if sharding.enabled():
+        return sharded_post_page(post_id, comments_per_page)
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return archived_post_page(post_id, comments_per_page)
+    author = profile_view(post.author)
+    comments, next_cursor = post.comments_page(limit=comments_per_page)
+    authors = {author.id: author}
+    comment_views = []
+    for comment in comments:
+        commenter = authors.get(comment.user_id)
+        if commenter is None:
+            commenter = authors[comment.user_id] = AuthorView(
+                comment.author.id, comment.author.username, comment.author.avatar)
+        comment_views.append(CommentView(comment.id, comment.content, comment.created_at, commenter))
+    view = PostView(post.id, post.content, post.image, post.created_at, author,
+                    post.like_count(), post.comment_count())
+    return PostDetail(view, comment_views, next_cursor)
+
+def table_comments_page(comment, execute, post_id, before=None, limit=20):
+    """One page of a post's comments from a comment table outside the main database, and the next cursor"""
+    query = db.select(comment).where(comment.c.post_id == post_id)
+    if before is not None:
+        cursor = execute(db.select(comment.c.post_id, comment.c.created_at, comment.c.id).where(
+            comment.c.id == before)).first()
+        if cursor is None or cursor.post_id != post_id:
+            return [], None
+        query = query.where(db.or_(
+            comment.c.created_at < cursor.created_at,
+            db.and_(comment.c.created_at == cursor.created_at, comment.c.id < cursor.id)))
+    rows = execute(query.order_by(comment.c.created_at.desc(), comment.c.id.desc()).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    authors = author_views({row.user_id for row in rows[:limit]})
+    return [CommentView(row.id, row.content, row.created_at, authors[row.user_id])
+            for row in rows[:limit] if row.user_id in authors], next_cursor
+
+def archived_comments_page(post_id, before=None, limit=20):
+    """One page of an archived post's comments, newest first, and the next cursor"""
+    return table_comments_page(archived_comments, archive.execute, post_id, before, limit)
+
+def sharded_comments_page(post_id, before=None, limit=20):
+    """One page of comments from the post's shard, newest first, and the next cursor"""
+    execute = partial(sharding.execute, sharding.shard_of(post_id))
+    return table_comments_page(sharding.comments, execute, post_id, before, limit)
+
+def archived_post_page(post_id, comments_per_page):
+    """post_page for a post that has moved to the archive, or None"""
+    row = archive.get_post(post_id)
+    user = db.session.get(User, row.user_id) if row is not None else None
+    if user is None:
+        return None
+    likes = archive.execute(db.select(db.func.count()).select_from(archived_likes).where(
+        archived_likes.c.post_id == post_id)).scalar()
+    comments, next_cursor = archived_comments_page(post_id, limit=comments_per_page)
+    view = PostView(row.id, row.content, row.image, row.created_at, profile_view(user), likes,
+                    row.comments_count or 0, archived=True)
+    return PostDetail(view, comments, next_cursor)
+
+def sharded_post_page(post_id, comments_per_page):
+    """post_page when posts live on shards, or None"""
+    row = sharding.get_post(post_id)
+    user = db.session.get(User, row.user_id) if row is not None else None
+    if user is None:
+        return None
+    likes = sharding.like_counts([post_id])[0].get(post_id, 0)
+    comments, next_cursor = sharded_comments_page(post_id, limit=comments_per_page)
+    view = PostView(row.id, row.content, row.image, row.created_at, profile_view(user), likes,
+                    row.comments_count or 0)
+    return PostDetail(view, comments, next_cursor)
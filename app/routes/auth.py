@@ -1,15 +1,31 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
+from sqlalchemy.exc import IntegrityError
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
 from app import db, login_manager
 from app.models import User
 from app.forms import LoginForm, RegistrationForm
+from app.session_claims import user_from_claim, issue_claim, drop_claim
+from app.availability import is_taken
 
 auth_bp = Blueprint('auth', __name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    stateless = current_app.config['SESSION_CLAIMS']
+    if stateless and request.method in ('GET', 'HEAD', 'OPTIONS'):
+        # Serve current_user from the signed cookie claim without a DB lookup. Writes load
+        # the row, so an account deleted since the claim was issued cannot write as itself.
+        user = user_from_claim(user_id)
+        if user is not None:
+            return user
+    user = db.session.get(User, int(user_id))
+    if stateless:
+        if user is None:
+            drop_claim()
+        else:
+            issue_claim(user)
+    return user
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -20,6 +36,10 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
+            # Transparently move old hashes to the configured KDF parameters
+            if user.password_needs_rehash():
+                user.rehash_password(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             flash('Logged in successfully!', 'success')
@@ -38,9 +58,15 @@ def register():
         user = User(username=form.username.data, email=form.email.data)
         user.set_password(form.password.data)
         db.session.add(user)
-        db.session.commit()
-        flash('Registration successful! You can now log in.', 'success')
-        return redirect(url_for('auth.login'))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race for the name (or another worker's filter had not seen it yet)
+            db.session.rollback()
+            form.report_taken()
+        else:
+            flash('Registration successful! You can now log in.', 'success')
+            return redirect(url_for('auth.login'))
     
     return render_template('auth/register.html', title='Register', form=form)
 
@@ -50,3 +76,12 @@ def logout():
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('main.index'))
+
+@auth_bp.route('/available')
+def available():
+    """As-you-type check: ?username=... or ?email=..."""
+    for field in ('username', 'email'):
+        value = request.args.get(field, '').strip()
+        if value:
+            return jsonify({'field': field, 'value': value, 'available': not is_taken(field, value)})
+    return jsonify({'error': 'Pass a username or email to check.'}), 400
@@ -1,29 +1,127 @@
-from flask import Blueprint, render_template, request, current_app
+from flask import Blueprint, render_template, request, current_app, jsonify, abort, url_for
 from flask_login import login_required, current_user
-from app.models import User, Post
+from app import sharding
+from app.models import User, Post, Tag, post_tag
 from app.forms import SearchForm
+from app.trending import has_scores
+from app.readmodels import (paginate_views, build_views, build_sharded_views, keyset_views, feed_rows, recent_rows,
+                            trending_rows, tag_rows, newest_post_id, count_since, feed_owners, sharded_feed,
+                            profile_view, profile_views)
+from app.tags import normalize_tag
+from app.suggestions import suggestions_for
+from app.streaming import stream_page, Deferred
 
 main_bp = Blueprint('main', __name__)
 
+def home_feed():
+    """The rows the home page lists for the current visitor, and whose likes to mark"""
+    if current_user.is_authenticated:
+        return feed_rows(current_user.id), current_user.id
+    return recent_rows(), None
+
+def home_owners():
+    """Sharded counterpart of home_feed: whose posts the home page merges (None for everyone)"""
+    return feed_owners(current_user.id) if current_user.is_authenticated else None
+
 @main_bp.route('/')
 @main_bp.route('/index')
 def index():
     page = request.args.get('page', 1, type=int)
-    if current_user.is_authenticated:
-        posts = current_user.followed_posts().paginate(
-            page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False)
+    per_page = current_app.config['POSTS_PER_PAGE']
+    if sharding.enabled():
+        viewer_id = current_user.id if current_user.is_authenticated else None
+        posts = sharded_feed(home_owners(), page, per_page, viewer_id)
     else:
-        posts = Post.query.order_by(Post.created_at.desc()).paginate(
-            page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False)
+        query, viewer_id = home_feed()
+        posts = paginate_views(query, page, per_page, viewer_id)
+    suggestions = suggestions_for(current_user) if viewer_id is not None else []
+    # Post counts include archived and sharded posts, which current_user.posts cannot see
+    profile = profile_view(current_user) if viewer_id is not None else None
+    # Only the first page polls for new posts; the cursor is the newest post it shows
+    since = max((post.id for post in posts.items), default=0) if page == 1 else None
     
-    return render_template('index.html', title='Home', posts=posts)
+    return render_template('index.html', title='Home', posts=posts, suggestions=suggestions, since=since,
+                           profile=profile)
+
+@main_bp.route('/feed/new')
+def new_posts():
+    """Number of feed posts newer than ?since=<post id>, capped at FEED_NEW_MAX"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        abort(400)
+    count = 0
+    # Nothing has been posted anywhere since the cursor: skip the feed query entirely
+    if newest_post_id() > since:
+        if sharding.enabled():
+            count = sharding.count_posts(home_owners(), since, current_app.config['FEED_NEW_MAX'])
+        else:
+            query, _ = home_feed()
+            count = count_since(query, since, current_app.config['FEED_NEW_MAX'])
+    response = jsonify({'count': count, 'more': count >= current_app.config['FEED_NEW_MAX']})
+    response.cache_control.no_store = True
+    return response
+
+@main_bp.route('/feed/since')
+def feed_since():
+    """Rendered cards for the feed posts newer than ?since=<post id>, and the new cursor"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        abort(400)
+    limit = current_app.config['FEED_NEW_MAX']
+    if sharding.enabled():
+        viewer_id = current_user.id if current_user.is_authenticated else None
+        views = build_sharded_views(sharding.newest_posts(home_owners(), limit, since), viewer_id)
+    else:
+        query, viewer_id = home_feed()
+        views = build_views(query.filter(Post.id > since).limit(limit).all(), viewer_id)
+    return jsonify({
+        'html': render_template('_posts.html', posts=views),
+        'since': max((post.id for post in views), default=since),
+        'more': len(views) >= limit
+    })
 
 @main_bp.route('/explore')
 def explore():
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.created_at.desc()).paginate(
-        page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False)
-    return render_template('explore.html', title='Explore', posts=posts)
+    sort = request.args.get('sort', 'trending')
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    per_page = current_app.config['POSTS_PER_PAGE']
+    # Fall back to recency until the scorer has produced a ranking (it never does for sharded posts)
+    if sharding.enabled():
+        sort = 'recent'
+        posts = sharded_feed(None, page, per_page, viewer_id)
+    else:
+        if sort == 'trending' and has_scores():
+            query = trending_rows()
+        else:
+            sort = 'recent'
+            query = recent_rows()
+        posts = paginate_views(query, page, per_page, viewer_id)
+    return render_template('explore.html', title='Explore', posts=posts, sort=sort)
+
+@main_bp.route('/tags/<tag>')
+def tag_feed(tag):
+    """Posts carrying #tag, newest first, paged by a post id cursor rather than an offset"""
+    name = normalize_tag(tag)
+    if name is None:
+        abort(404)
+    before = request.args.get('before', type=int)
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    tag_id = Tag.query.with_entities(Tag.id).filter_by(name=name).scalar()
+    posts, next_cursor = [], None
+    if tag_id is not None:
+        posts, next_cursor = keyset_views(tag_rows(tag_id), post_tag.c.post_id, before,
+                                          current_app.config['POSTS_PER_PAGE'], viewer_id)
+    next_url = url_for('main.tag_feed', tag=name, before=next_cursor) if next_cursor else None
+    return render_template('listing.html', title=f'#{name}', heading=f'#{name}', posts=posts,
+                           next_url=next_url, first_page=before is None)
+
+def profile_results(query, page, per_page):
+    """A page of users whose name contains query, as profile views with their post counts"""
+    pagination = User.query.filter(User.username.contains(query)).paginate(
+        page=page, per_page=per_page, error_out=False)
+    pagination.items = profile_views(pagination.items)
+    return pagination
 
 @main_bp.route('/search')
 def search():
@@ -33,8 +131,7 @@ def search():
     if request.args.get('query'):
         query = request.args.get('query')
         page = request.args.get('page', 1, type=int)
-        users = User.query.filter(
-            User.username.contains(query)).paginate(
-                page=page, per_page=current_app.config['USERS_PER_PAGE'], error_out=False)
+        per_page = current_app.config['USERS_PER_PAGE']
+        users = Deferred(lambda: profile_results(query, page, per_page))
     
-    return render_template('search.html', title='Search', form=form, users=users)
+    return stream_page('search.html', title='Search', form=form, users=users)
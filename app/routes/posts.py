@@ -1,14 +1,40 @@
 import os
+import json
 import secrets
-from PIL import Image
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
+import time
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify, Response, abort
 from flask_login import login_required, current_user
 from app import db
 from app.models import Post, Comment, Like
+from app.tasks import tasks, remove_file
+from app.events import bus
+from app.images import save_thumbnail, ImageRejected
+from app.streaming import stream_page
+from app.singleflight import coalesce, forget
+from app import archive, sharding
+from app.readmodels import post_page, archived_comments_page, sharded_comments_page, viewer_liked
+from app.tags import index_post
 from app.forms import PostForm, CommentForm
 
 posts_bp = Blueprint('posts', __name__)
 
+def post_counts(post_ids):
+    """Current like and comment counts for several posts in two queries (per shard when sharded)"""
+    if sharding.enabled():
+        likes, comments = sharding.post_counts(post_ids)
+    else:
+        likes = dict(db.session.query(Like.post_id, db.func.count()).filter(
+            Like.post_id.in_(post_ids)).group_by(Like.post_id))
+        comments = dict(db.session.query(Post.id, Post.comments_count).filter(Post.id.in_(post_ids)))
+    return [{'post_id': post_id, 'like_count': likes.get(post_id, 0), 'comment_count': comments[post_id]}
+            for post_id in post_ids if post_id in comments]
+
+def publish_counts(post_id):
+    """Push a post's current counts to live streams and return them"""
+    counts = post_counts([post_id])[0]
+    bus.publish(post_id, counts)
+    return counts
+
 def save_picture(form_picture, folder):
     """Save uploaded picture with a random name"""
     random_hex = secrets.token_hex(8)
@@ -20,10 +46,7 @@ def save_picture(form_picture, folder):
     os.makedirs(os.path.dirname(picture_path), exist_ok=True)
     
     # Resize image
-    output_size = (800, 800)
-    img = Image.open(form_picture)
-    img.thumbnail(output_size)
-    img.save(picture_path)
+    save_thumbnail(form_picture, picture_path, (800, 800), current_app.config['IMAGE_MAX_PIXELS'])
     
     return picture_fn
 
@@ -34,11 +57,23 @@ def create_post():
     if form.validate_on_submit():
         image_file = None
         if form.image.data:
-            image_file = save_picture(form.image.data, 'posts')
+            try:
+                image_file = save_picture(form.image.data, 'posts')
+            except ImageRejected as e:
+                flash(str(e), 'danger')
+                return render_template('posts/create_post.html', title='Create Post', form=form)
         
-        post = Post(content=form.content.data, image=image_file, author=current_user)
-        db.session.add(post)
+        if sharding.enabled():
+            # Tag and mention links reference main-database posts, so sharded posts are not indexed
+            sharding.create_post(current_user.id, form.content.data, image_file)
+        else:
+            post = Post(content=form.content.data, image=image_file, user_id=current_user.id)
+            db.session.add(post)
+            db.session.flush()
+            # Parsed once here so tag and mention pages never scan post content
+            index_post(post)
         db.session.commit()
+        forget(f'profile:{current_user.username}')
         flash('Your post has been created!', 'success')
         return redirect(url_for('main.index'))
     
@@ -46,45 +81,120 @@ def create_post():
 
 @posts_bp.route('/<int:id>')
 def post_detail(id):
-    post = Post.query.get_or_404(id)
-    comments = Comment.query.filter_by(post_id=id).order_by(Comment.created_at.desc()).all()
+    # Concurrent views of a hot post share one lookup, count and comment query
+    per_page = current_app.config['COMMENTS_PER_PAGE']
+    detail = coalesce(f'post:{id}', lambda: post_page(id, per_page))
+    if detail is None:
+        abort(404)
+    # The coalesced detail is shared by every viewer, so the like state is looked up per request
+    liked = (current_user.is_authenticated and not detail.post.archived
+             and viewer_liked(id, current_user.id))
     form = CommentForm()
-    return render_template('posts/post_detail.html', title='Post', post=post, comments=comments, form=form)
+    return stream_page('posts/post_detail.html', title='Post', post=detail.post, comments=detail.comments,
+                       next_cursor=detail.next_cursor, form=form, liked=liked)
+
+@posts_bp.route('/<int:id>/comments')
+def more_comments(id):
+    """Return the next page of comments as an HTML fragment plus the following cursor"""
+    before = request.args.get('before', type=int)
+    limit = current_app.config['COMMENTS_PER_PAGE']
+    post = None if sharding.enabled() else db.session.get(Post, id)
+    if post is not None:
+        comments, next_cursor = post.comments_page(before=before, limit=limit)
+    elif sharding.enabled() and sharding.get_post(id) is not None:
+        comments, next_cursor = sharded_comments_page(id, before, limit)
+    elif not sharding.enabled() and archive.get_post(id) is not None:
+        comments, next_cursor = archived_comments_page(id, before, limit)
+    else:
+        abort(404)
+    return jsonify({
+        'html': render_template('posts/_comments.html', comments=comments),
+        'next_cursor': next_cursor
+    })
+
+@posts_bp.route('/stream')
+def stream_counts():
+    """Server-Sent Events stream of like/comment counts for the posts on screen"""
+    config = current_app.config
+    try:
+        post_ids = [int(i) for i in request.args.get('ids', '').split(',') if i]
+    except ValueError:
+        abort(400)
+    if not post_ids or len(post_ids) > config['SSE_MAX_POSTS']:
+        abort(400)
+    
+    snapshot = post_counts(post_ids)
+    subscription = bus.subscribe(post_ids, limit=config['SSE_MAX_CONNECTIONS'])
+    if subscription is None:
+        return Response(status=503, headers={'Retry-After': str(config['SSE_HEARTBEAT_SECONDS'])})
+    heartbeat = config['SSE_HEARTBEAT_SECONDS']
+    deadline = time.monotonic() + config['SSE_MAX_SECONDS']
+    
+    def events():
+        # The generator never touches the database, so no app context is held open
+        try:
+            yield f'retry: {heartbeat * 1000}\n\n'
+            for payload in snapshot:
+                yield f'event: counts\ndata: {json.dumps(payload)}\n\n'
+            while time.monotonic() < deadline:
+                updates = subscription.wait(heartbeat)
+                if not updates:
+                    yield ': keep-alive\n\n'
+                for payload in updates:
+                    yield f'event: counts\ndata: {json.dumps(payload)}\n\n'
+        finally:
+            subscription.close()
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @posts_bp.route('/<int:id>/comment', methods=['POST'])
 @login_required
 def add_comment(id):
-    post = Post.query.get_or_404(id)
+    post = sharding.get_post(id) if sharding.enabled() else db.session.get(Post, id)
+    if post is None:
+        abort(404)
     form = CommentForm()
     if form.validate_on_submit():
-        comment = Comment(content=form.content.data, author=current_user, post=post)
-        db.session.add(comment)
+        if sharding.enabled():
+            sharding.add_comment(id, current_user.id, form.content.data)
+        else:
+            db.session.add(Comment(content=form.content.data, user_id=current_user.id, post=post))
         db.session.commit()
+        forget(f'post:{id}')
+        publish_counts(id)
         flash('Your comment has been added!', 'success')
     return redirect(url_for('posts.post_detail', id=id))
 
 @posts_bp.route('/<int:id>/like', methods=['POST'])
 @login_required
 def toggle_like(id):
-    post = Post.query.get_or_404(id)
-    like = Like.query.filter_by(user_id=current_user.id, post_id=id).first()
-    
-    if like:
-        # Unlike the post
-        db.session.delete(like)
-        liked = False
+    if sharding.enabled():
+        if sharding.get_post(id) is None:
+            abort(404)
+        liked = sharding.toggle_like(id, current_user.id)
     else:
-        # Like the post
-        like = Like(user_id=current_user.id, post_id=id)
-        db.session.add(like)
-        liked = True
+        Post.query.get_or_404(id)
+        like = Like.query.filter_by(user_id=current_user.id, post_id=id).first()
+        
+        if like:
+            # Unlike the post
+            db.session.delete(like)
+            liked = False
+        else:
+            # Like the post
+            like = Like(user_id=current_user.id, post_id=id)
+            db.session.add(like)
+            liked = True
     
     db.session.commit()
+    forget(f'post:{id}')
+    counts = publish_counts(id)
     
     if request.is_json:
         return jsonify({
             'liked': liked,
-            'like_count': post.like_count()
+            'like_count': counts['like_count']
         })
     
     return redirect(request.referrer or url_for('main.index'))
@@ -92,18 +202,31 @@ def toggle_like(id):
 @posts_bp.route('/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_post(id):
-    post = Post.query.get_or_404(id)
-    if post.author != current_user:
+    if sharding.enabled():
+        post = sharding.get_post(id)
+    else:
+        post = db.session.get(Post, id) or archive.get_post(id)
+    if post is None:
+        abort(404)
+    if post.user_id != current_user.id:
         flash('You can only delete your own posts!', 'danger')
         return redirect(url_for('main.index'))
     
-    # Delete associated image file
-    if post.image:
-        image_path = os.path.join(current_app.root_path, 'static/uploads/posts', post.image)
-        if os.path.exists(image_path):
-            os.remove(image_path)
+    image = post.image
     
-    db.session.delete(post)
-    db.session.commit()
+    # Comments and likes are removed by the database through ON DELETE CASCADE
+    if isinstance(post, Post):
+        db.session.delete(post)
+        db.session.commit()
+    elif sharding.enabled():
+        sharding.delete_post(id)
+        db.session.commit()
+    else:
+        archive.delete_post(id)
+    forget(f'post:{id}', f'profile:{current_user.username}')
+    
+    # Delete associated image file once the row is gone
+    if image:
+        tasks.submit(remove_file, os.path.join(current_app.root_path, 'static/uploads/posts', image))
     flash('Your post has been deleted!', 'success')
     return redirect(url_for('main.index'))
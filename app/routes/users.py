@@ -1,10 +1,17 @@
 import os
 import secrets
-from PIL import Image
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify, abort
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from app import db
-from app.models import User, Post
+from app.models import User, Post, post_mention
+from app.tasks import tasks, remove_file
+from app.images import save_thumbnail, ImageRejected
+from app.streaming import stream_page, Deferred
+from app.suggestions import suggestions_for
+from app.readmodels import keyset_views, mention_rows, profile_posts, profile_summary
+from app.singleflight import coalesce, forget
+from app.session_claims import issue_claim
 from app.forms import EditProfileForm
 
 users_bp = Blueprint('users', __name__)
@@ -20,20 +27,36 @@ def save_avatar(form_picture):
     os.makedirs(os.path.dirname(picture_path), exist_ok=True)
     
     # Resize image to square
-    output_size = (200, 200)
-    img = Image.open(form_picture)
-    img.thumbnail(output_size)
-    img.save(picture_path)
+    save_thumbnail(form_picture, picture_path, (200, 200), current_app.config['IMAGE_MAX_PIXELS'])
     
     return picture_fn
 
 @users_bp.route('/<username>')
 def profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
+    # The header (user lookup and counts) is shared by concurrent viewers of the same profile
+    user = coalesce(f'profile:{username}', lambda: profile_summary(username))
+    if user is None:
+        abort(404)
     page = request.args.get('page', 1, type=int)
-    posts = user.posts.order_by(Post.created_at.desc()).paginate(
-        page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False)
-    return render_template('users/profile.html', user=user, posts=posts)
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    per_page = current_app.config['POSTS_PER_PAGE']
+    # Deferred queries run while the page streams, after <head> and the layout are sent
+    # Older pages continue into the archive tier once the user's hot posts run out
+    posts = Deferred(lambda: profile_posts(user.id, page, per_page, viewer_id))
+    suggestions = Deferred(lambda: suggestions_for(current_user)) if viewer_id is not None else []
+    return stream_page('users/profile.html', user=user, posts=posts, suggestions=suggestions)
+
+@users_bp.route('/<username>/mentions')
+def mentions(username):
+    """Posts that @mention the user, newest first, paged by a post id cursor"""
+    user = User.query.filter_by(username=username).first_or_404()
+    before = request.args.get('before', type=int)
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    posts, next_cursor = keyset_views(mention_rows(user.id), post_mention.c.post_id, before,
+                                      current_app.config['POSTS_PER_PAGE'], viewer_id)
+    next_url = url_for('users.mentions', username=username, before=next_cursor) if next_cursor else None
+    return render_template('listing.html', title=f'Mentions of @{username}', heading=f'Mentioning @{username}',
+                           posts=posts, next_url=next_url, first_page=before is None)
 
 @users_bp.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
@@ -42,19 +65,33 @@ def edit_profile():
     if form.validate_on_submit():
         # Handle avatar upload
         if form.avatar.data:
+            try:
+                avatar_file = save_avatar(form.avatar.data)
+            except ImageRejected as e:
+                flash(str(e), 'danger')
+                return render_template('users/edit_profile.html', title='Edit Profile', form=form)
+            
             # Delete old avatar if it's not the default
             if current_user.avatar != 'default_avatar.png':
                 old_avatar_path = os.path.join(current_app.root_path, 'static/uploads/avatars', current_user.avatar)
-                if os.path.exists(old_avatar_path):
-                    os.remove(old_avatar_path)
+                tasks.submit(remove_file, old_avatar_path)
             
-            avatar_file = save_avatar(form.avatar.data)
             current_user.avatar = avatar_file
         
+        old_username = current_user.username
         current_user.username = form.username.data
         current_user.email = form.email.data
         current_user.bio = form.bio.data
-        db.session.commit()
+        current_user.bump_security_stamp()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            form.report_taken()
+            return render_template('users/edit_profile.html', title='Edit Profile', form=form)
+        forget(f'profile:{old_username}', f'profile:{current_user.username}')
+        if current_app.config['SESSION_CLAIMS']:
+            issue_claim(db.session.get(User, current_user.id))
         flash('Your profile has been updated!', 'success')
         return redirect(url_for('users.profile', username=current_user.username))
     
@@ -79,11 +116,12 @@ def follow(username):
     
     current_user.follow(user)
     db.session.commit()
+    forget(f'profile:{username}', f'profile:{current_user.username}')
     
     if request.is_json:
         return jsonify({
             'following': True,
-            'follower_count': user.followers.count()
+            'follower_count': user.follower_count()
         })
     
     flash(f'You are now following {username}!', 'success')
@@ -103,11 +141,12 @@ def unfollow(username):
     
     current_user.unfollow(user)
     db.session.commit()
+    forget(f'profile:{username}', f'profile:{current_user.username}')
     
     if request.is_json:
         return jsonify({
             'following': False,
-            'follower_count': user.followers.count()
+            'follower_count': user.follower_count()
         })
     
     flash(f'You are no longer following {username}.', 'info')
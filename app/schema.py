@@ -0,0 +1,108 @@
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app import db
+
+# Values for NOT NULL columns added since a table was created, as SQL over the old row
+FILL = {
+    'security_stamp': 'lower(hex(randomblob(8)))',
+}
+
+def _declared_type(column, dialect):
+    return column.type.compile(dialect=dialect)
+
+def _needs_rebuild(connection, table, dialect):
+    """Whether an existing table differs from its model in ways ALTER TABLE cannot fix in SQLite"""
+    columns = {row[1]: row[2] for row in connection.execute(f'PRAGMA table_info("{table.name}")')}
+    if not columns:
+        return False  # db.create_all makes missing tables
+    for column in table.columns:
+        if columns.get(column.name) != _declared_type(column, dialect):
+            return True
+    foreign_keys = {(row[3], row[2], row[6]) for row in connection.execute(f'PRAGMA foreign_key_list("{table.name}")')}
+    wanted = {(fk.parent.name, fk.column.table.name, (fk.ondelete or 'NO ACTION').upper())
+              for fk in table.foreign_keys}
+    if foreign_keys != wanted:
+        return True
+    sql = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                             (table.name,)).fetchone()[0]
+    return table.dialect_options['sqlite']['autoincrement'] != ('AUTOINCREMENT' in sql)
+
+def _rebuild(connection, table, dialect):
+    """SQLite's documented table rebuild: create the new shape, copy the rows, swap the tables"""
+    name = dialect.identifier_preparer.format_table(table)
+    old_columns = {row[1] for row in connection.execute(f'PRAGMA table_info({name})')}
+    create = str(CreateTable(table).compile(dialect=dialect)).replace(
+        f'CREATE TABLE {name} (', f'CREATE TABLE "_new_{table.name}" (', 1)
+    connection.execute(create)
+    targets, sources = [], []
+    for column in table.columns:
+        if column.name in old_columns:
+            targets.append(f'"{column.name}"')
+            sources.append(f'"{column.name}"')
+        elif column.name in FILL:
+            targets.append(f'"{column.name}"')
+            sources.append(FILL[column.name])
+    connection.execute(f'INSERT INTO "_new_{table.name}" ({", ".join(targets)}) '
+                       f'SELECT {", ".join(sources)} FROM {name}')
+    connection.execute(f'DROP TABLE {name}')
+    connection.execute(f'ALTER TABLE "_new_{table.name}" RENAME TO {name}')
+    return old_columns
+
+def _reserve_archived_ids(connection):
+    """Start AUTOINCREMENT sequences above ids that already moved to the archive"""
+    from app.archive import TIERS, execute
+    for hot, archived, _ in TIERS:
+        top = execute(db.select(db.func.max(archived.c.id))).scalar()
+        if not top:
+            continue
+        if connection.execute('SELECT 1 FROM sqlite_sequence WHERE name = ?', (hot.name,)).fetchone():
+            connection.execute('UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?', (top, hot.name))
+        else:
+            connection.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (hot.name, top))
+
+def upgrade():
+    """Bring an existing SQLite database up to the current models; returns the rebuilt table names.
+
+    db.create_all only creates missing tables. Tables whose columns, ON DELETE
+    actions or AUTOINCREMENT differ from the models are rebuilt with their rows,
+    missing indexes are created, and post comment counts are recounted when the
+    column is new. Safe to rerun.
+    """
+    from app.bulk import recount_comments
+    engine = db.engine
+    dialect = engine.dialect
+    if dialect.name != 'sqlite':
+        raise RuntimeError('Schema upgrades are only implemented for SQLite')
+    raw = engine.raw_connection()
+    connection = raw.driver_connection
+    isolation_level = connection.isolation_level
+    rebuilt, counted = [], True
+    try:
+        # Foreign keys must be off while tables are swapped, and the pragma only applies outside a transaction
+        connection.isolation_level = None
+        connection.execute('PRAGMA foreign_keys=OFF')
+        connection.execute('BEGIN')
+        try:
+            for table in db.metadata.sorted_tables:
+                if _needs_rebuild(connection, table, dialect):
+                    old_columns = _rebuild(connection, table, dialect)
+                    rebuilt.append(table.name)
+                    if table.name == 'post':
+                        counted = 'comments_count' in old_columns
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    connection.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)))
+            if connection.execute('PRAGMA foreign_key_check').fetchone() is not None:
+                raise RuntimeError('Rows reference missing parents; fix them and rerun the upgrade')
+            _reserve_archived_ids(connection)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.execute('PRAGMA foreign_keys=ON')
+    finally:
+        connection.isolation_level = isolation_level
+        raw.close()
+    if not counted:
+        recount_comments()
+    return rebuilt
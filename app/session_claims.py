@@ -0,0 +1,83 @@
+import time
+from flask import abort, current_app, redirect, request, session
+from flask_login import UserMixin, logout_user, user_logged_in, user_logged_out
+from app import db
+
+CLAIM_KEY = '_claim'
+CLAIM_VERSION = 1
+
+class ClaimUser(UserMixin):
+    """current_user served from the signed session claim.
+    
+    Holds only what the layout needs (id, username, avatar). Any other attribute
+    or method loads the full User row on first use and delegates to it, so views
+    that need the entity still work and pages like explore skip the lookup.
+    """
+    __slots__ = ('id', 'username', 'avatar', 'security_stamp', '_entity')
+    
+    def __init__(self, id, username, avatar, security_stamp):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'username', username)
+        object.__setattr__(self, 'avatar', avatar)
+        object.__setattr__(self, 'security_stamp', security_stamp)
+        object.__setattr__(self, '_entity', None)
+    
+    def entity(self):
+        """The backing User row, loaded once per request"""
+        if self._entity is None:
+            from app.models import User
+            user = db.session.get(User, self.id)
+            if user is None:
+                # Deleted since the claim was issued: sign out and load the page again anonymously
+                logout_user()
+                abort(redirect(request.url))
+            if user.security_stamp != self.security_stamp:
+                issue_claim(user)
+            object.__setattr__(self, '_entity', user)
+        return self._entity
+    
+    def __getattr__(self, name):
+        return getattr(self.entity(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self.entity(), name, value)
+        if name in ('username', 'avatar', 'security_stamp'):
+            object.__setattr__(self, name, value)
+    
+    def __repr__(self):
+        return f'<ClaimUser {self.username}>'
+
+def issue_claim(user):
+    """Store a compact claim for user in the (signed) session cookie"""
+    session[CLAIM_KEY] = [CLAIM_VERSION, user.id, user.username, user.avatar,
+                          user.security_stamp, int(time.time())]
+
+def drop_claim():
+    session.pop(CLAIM_KEY, None)
+
+def user_from_claim(user_id):
+    """Build a ClaimUser from a fresh, well-formed claim for user_id, else None.
+    
+    Claims older than SESSION_CLAIM_MAX_AGE are ignored so the caller reloads
+    the row and reissues the claim, which picks up a bumped security stamp.
+    """
+    claim = session.get(CLAIM_KEY)
+    if not isinstance(claim, list) or len(claim) != 6 or claim[0] != CLAIM_VERSION:
+        return None
+    _, claim_id, username, avatar, stamp, issued_at = claim
+    if str(claim_id) != str(user_id):
+        return None
+    if time.time() - issued_at > current_app.config['SESSION_CLAIM_MAX_AGE']:
+        return None
+    return ClaimUser(claim_id, username, avatar, stamp)
+
+def _on_login(sender, user, **extra):
+    if sender.config['SESSION_CLAIMS']:
+        issue_claim(user)
+
+def _on_logout(sender, user, **extra):
+    drop_claim()
+
+def init_app(app):
+    user_logged_in.connect(_on_login, app)
+    user_logged_out.connect(_on_logout, app)
@@ -0,0 +1,356 @@
+import atexit
+import heapq
+import itertools
+import os
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from app import db
+from app.archive import purge_users
+from app.models import User, Post, Comment, Like
+
+# Snowflake ids: milliseconds since EPOCH_MS, then the shard, the writing process and a
+# per-millisecond sequence. 53 bits in all, so ids survive JavaScript's Number (data-post-id,
+# the feed cursors) and any id can be routed to its shard without a lookup.
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+SHARD_BITS = 5
+NODE_BITS = 4
+SEQUENCE_BITS = 3
+MAX_SHARDS = 1 << SHARD_BITS
+MAX_NODES = 1 << NODE_BITS
+
+class Snowflake:
+    """Time-ordered ids generated in-process; unique while no two writers share a node id"""
+
+    def __init__(self, node, clock=time.time):
+        if not 0 <= node < MAX_NODES:
+            raise ValueError(f'Snowflake node id must be between 0 and {MAX_NODES - 1}')
+        self.node = node
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last = -1
+        self._sequence = 0
+
+    def _now(self):
+        return int(self._clock() * 1000) - EPOCH_MS
+    
+    def set_node(self, node):
+        with self._lock:
+            self.node = node
+
+    def next_id(self, shard):
+        with self._lock:
+            # A clock stepping back keeps counting in the last millisecond handed out
+            now = max(self._now(), self._last)
+            if now == self._last:
+                self._sequence = (self._sequence + 1) & ((1 << SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    # This millisecond's sequence is used up: wait for the next one
+                    while now <= self._last:
+                        time.sleep(0.0001)
+                        now = self._now()
+            else:
+                self._sequence = 0
+            self._last = now
+            return ((now << SHARD_BITS | shard) << NODE_BITS | self.node) << SEQUENCE_BITS | self._sequence
+
+# Without SNOWFLAKE_NODE_ID each process leases a node id from the main database, so
+# workers on one host or many never share one. A lease lapses unless renewed.
+node_leases = db.Table('snowflake_node_lease', db.metadata,
+                       db.Column('node', db.Integer, primary_key=True, autoincrement=False),
+                       db.Column('owner', db.String(80), nullable=False),
+                       db.Column('expires_at', db.Float, nullable=False))
+
+class NodeLease:
+    """A Snowflake node id held in the main database while this process keeps renewing it"""
+    
+    def __init__(self, engine, duration):
+        self.engine = engine
+        self.duration = duration
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}'
+        self.node = None
+    
+    def acquire(self, now=None):
+        """Take the lowest free or lapsed node id"""
+        now = time.time() if now is None else now
+        values = {'owner': self.owner, 'expires_at': now + self.duration}
+        for node in range(MAX_NODES):
+            try:
+                with self.engine.begin() as connection:
+                    taken = connection.execute(node_leases.update().where(
+                        node_leases.c.node == node, node_leases.c.expires_at < now).values(**values)).rowcount
+                    if not taken:
+                        connection.execute(node_leases.insert().values(node=node, **values))
+            except IntegrityError:
+                continue  # held by a live process
+            self.node = node
+            return node
+        raise RuntimeError(f'All {MAX_NODES} Snowflake node ids are leased; set SNOWFLAKE_NODE_ID '
+                           'or wait for stale leases to lapse')
+    
+    def renew(self, now=None):
+        """Extend the lease; False when it lapsed and was taken by another process"""
+        now = time.time() if now is None else now
+        with self.engine.begin() as connection:
+            return bool(connection.execute(node_leases.update().where(
+                node_leases.c.node == self.node, node_leases.c.owner == self.owner).values(
+                expires_at=now + self.duration)).rowcount)
+    
+    def release(self):
+        with self.engine.begin() as connection:
+            connection.execute(node_leases.delete().where(
+                node_leases.c.node == self.node, node_leases.c.owner == self.owner))
+
+def shard_of(id):
+    """The shard a Snowflake id was generated for"""
+    return (id >> (NODE_BITS + SEQUENCE_BITS)) & (MAX_SHARDS - 1)
+
+def _shard_table(table, references=None, *extra):
+    """Copy of a main-database table for the shard databases.
+
+    Ids come from Snowflake rather than the database, and user ids point into the
+    main database, so only references inside a shard are foreign keys.
+    """
+    references = references or {}
+    columns = []
+    for column in table.columns:
+        args = [db.ForeignKey(references[column.name], ondelete='CASCADE')] if column.name in references else []
+        columns.append(db.Column(column.name, column.type, *args, primary_key=column.primary_key,
+                                 nullable=column.nullable, autoincrement=False))
+    return db.Table(table.name, shard_metadata, *columns, *extra)
+
+# Every shard holds the same tables; they are created on each shard engine by init_app
+shard_metadata = db.MetaData()
+posts = _shard_table(Post.__table__, None,
+                     db.Index('ix_shard_post_user_created', 'user_id', 'created_at'),
+                     db.Index('ix_shard_post_created', 'created_at'))
+# A post's comments and likes live on the post's shard, whoever wrote them
+comments = _shard_table(Comment.__table__, {'post_id': 'post.id'},
+                        db.Index('ix_shard_comment_post_created', 'post_id', 'created_at', 'id'),
+                        db.Index('ix_shard_comment_user', 'user_id'))
+likes = _shard_table(Like.__table__, {'post_id': 'post.id'},
+                     db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_like'),
+                     db.Index('ix_shard_like_post', 'post_id'))
+
+class ShardRouter:
+    """Maps users and ids to shard engines.
+
+    A post lives on its author's shard (user id modulo the shard count, so the count
+    is fixed once posts exist) and its id records that shard.
+    """
+
+    def __init__(self, engines, node):
+        self.engines = engines
+        self.ids = Snowflake(node)
+
+    def __len__(self):
+        return len(self.engines)
+
+    def for_user(self, user_id):
+        return user_id % len(self.engines)
+
+    def for_id(self, id):
+        """The shard holding the row with this id, or None if no shard could"""
+        shard = shard_of(id)
+        return shard if shard < len(self.engines) else None
+
+    def new_id(self, shard):
+        return self.ids.next_id(shard)
+
+    def scopes(self, user_ids=None):
+        """(shard, user ids on it) pairs to query; None for the ids means every user"""
+        if user_ids is None:
+            return [(shard, None) for shard in range(len(self.engines))]
+        grouped = {}
+        for user_id in user_ids:
+            grouped.setdefault(self.for_user(user_id), []).append(user_id)
+        return sorted(grouped.items())
+
+def current_router():
+    if has_app_context():
+        return current_app.extensions.get('sharding')
+    return None
+
+def enabled():
+    return current_router() is not None
+
+def execute(shard, statement, *args):
+    """Run a statement against one shard inside db.session's transaction"""
+    return db.session.execute(statement, *args, bind_arguments={'bind': current_router().engines[shard]})
+
+def _scoped(statement, user_ids):
+    return statement if user_ids is None else statement.where(posts.c.user_id.in_(user_ids))
+
+def newest_posts(user_ids=None, limit=10, since=None):
+    """The newest `limit` posts by these users (everyone for None), optionally after post id `since`.
+
+    Each shard returns its own newest `limit` and a k-way merge on (created_at, id)
+    keeps the overall newest, so the cost grows with the limit, not the data.
+    """
+    streams = []
+    for shard, owners in current_router().scopes(user_ids):
+        query = _scoped(db.select(posts), owners)
+        if since is not None:
+            query = query.where(posts.c.id > since)
+        streams.append(execute(shard, query.order_by(posts.c.created_at.desc(), posts.c.id.desc()).limit(
+            limit)).all())
+    merged = heapq.merge(*streams, key=lambda row: (row.created_at, row.id), reverse=True)
+    return list(itertools.islice(merged, limit))
+
+def count_posts(user_ids=None, since=None, limit=None):
+    """How many posts these users have (after post id `since`), counting at most `limit`"""
+    total = 0
+    for shard, owners in current_router().scopes(user_ids):
+        query = _scoped(db.select(posts.c.id), owners)
+        if since is not None:
+            query = query.where(posts.c.id > since)
+        if limit is not None:
+            query = query.limit(limit - total)
+        total += execute(shard, db.select(db.func.count()).select_from(query.subquery())).scalar()
+        if limit is not None and total >= limit:
+            break
+    return total
+
+def user_post_counts(user_ids):
+    """Post count by user id, for the users with any posts"""
+    counts = {}
+    for shard, owners in current_router().scopes(user_ids):
+        counts.update(execute(shard, db.select(posts.c.user_id, db.func.count()).where(
+            posts.c.user_id.in_(owners)).group_by(posts.c.user_id)).all())
+    return counts
+
+def newest_post_id():
+    """Highest post id on any shard"""
+    return max((execute(shard, db.select(db.func.max(posts.c.id))).scalar() or 0
+                for shard, _ in current_router().scopes()), default=0)
+
+def get_post(post_id):
+    """The post row, or None"""
+    shard = current_router().for_id(post_id)
+    if shard is None:
+        return None
+    return execute(shard, db.select(posts).where(posts.c.id == post_id)).first()
+
+def create_post(user_id, content, image=None):
+    """Insert a post on its author's shard and return its id; the caller commits"""
+    router = current_router()
+    shard = router.for_user(user_id)
+    post_id = router.new_id(shard)
+    execute(shard, posts.insert().values(id=post_id, content=content, image=image, user_id=user_id,
+                                         created_at=datetime.utcnow(), comments_count=0))
+    return post_id
+
+def add_comment(post_id, user_id, content):
+    shard = shard_of(post_id)
+    execute(shard, comments.insert().values(id=current_router().new_id(shard), content=content,
+                                            user_id=user_id, post_id=post_id, created_at=datetime.utcnow()))
+    execute(shard, posts.update().where(posts.c.id == post_id).values(comments_count=posts.c.comments_count + 1))
+
+def toggle_like(post_id, user_id):
+    """Like the post, or unlike it if already liked; returns whether it is now liked"""
+    shard = shard_of(post_id)
+    if execute(shard, likes.delete().where(likes.c.post_id == post_id, likes.c.user_id == user_id)).rowcount:
+        return False
+    execute(shard, likes.insert().values(id=current_router().new_id(shard), user_id=user_id, post_id=post_id,
+                                         created_at=datetime.utcnow()))
+    return True
+
+def delete_post(post_id):
+    """Remove a post; its comments and likes follow through the shard's foreign keys"""
+    execute(shard_of(post_id), posts.delete().where(posts.c.id == post_id))
+
+def _by_shard(post_ids):
+    router = current_router()
+    grouped = {}
+    for post_id in post_ids:
+        shard = router.for_id(post_id)
+        if shard is not None:
+            grouped.setdefault(shard, []).append(post_id)
+    return grouped
+
+def like_counts(post_ids, viewer_id=None):
+    """Like counts by post id, and which of the posts viewer_id has liked"""
+    counts, liked = {}, set()
+    for shard, ids in _by_shard(post_ids).items():
+        counts.update(execute(shard, db.select(likes.c.post_id, db.func.count()).where(
+            likes.c.post_id.in_(ids)).group_by(likes.c.post_id)).all())
+        if viewer_id is not None:
+            liked.update(execute(shard, db.select(likes.c.post_id).where(
+                likes.c.user_id == viewer_id, likes.c.post_id.in_(ids))).scalars())
+    return counts, liked
+
+def post_counts(post_ids):
+    """Like counts and comment counts by post id, for the posts that exist"""
+    comment_counts = {}
+    for shard, ids in _by_shard(post_ids).items():
+        comment_counts.update(execute(shard, db.select(posts.c.id, posts.c.comments_count).where(
+            posts.c.id.in_(ids))).all())
+    return like_counts(post_ids)[0], comment_counts
+
+@event.listens_for(User, 'after_delete')
+def _queue_shard_purge(mapper, connection, target):
+    # The shards are other databases: ON DELETE CASCADE cannot reach them
+    session = object_session(target)
+    if session is not None and enabled():
+        session.info.setdefault('shard_purge', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def _purge_shards(session):
+    user_ids = session.info.pop('shard_purge', None)
+    if user_ids:
+        # The user's comments and likes may be on any shard
+        for engine in current_router().engines:
+            with engine.begin() as connection:
+                purge_users(connection, list(user_ids), posts, comments, likes)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_shard_purge(session):
+    session.info.pop('shard_purge', None)
+
+def shard_url(app, shard):
+    """SHARD_DATABASE_URL for one shard; relative SQLite paths are under the instance folder, as for binds"""
+    url = make_url(app.config['SHARD_DATABASE_URL'].format(shard))
+    if url.get_backend_name() == 'sqlite' and url.database and not os.path.isabs(url.database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+def init_app(app):
+    count = app.config['SHARD_COUNT']
+    if not count:
+        return
+    if count > MAX_SHARDS:
+        raise ValueError(f'SHARD_COUNT must be at most {MAX_SHARDS}')
+    node = app.config['SNOWFLAKE_NODE_ID']
+    lease = None
+    if node is None:
+        with app.app_context():
+            node_leases.create(db.engine, checkfirst=True)
+            lease = NodeLease(db.engine, app.config['SNOWFLAKE_LEASE_SECONDS'])
+        node = lease.acquire()
+    # Not Flask-SQLAlchemy binds: a bind key registers tables for every app's create_all
+    engines = [create_engine(shard_url(app, shard)) for shard in range(count)]
+    for engine in engines:
+        shard_metadata.create_all(engine)
+    router = app.extensions['sharding'] = ShardRouter(engines, int(node))
+    if lease is None:
+        return
+    app.extensions['snowflake_lease'] = lease
+    atexit.register(lease.release)
+    
+    def renew_lease():
+        if not lease.renew():
+            # This process stalled past its lease and the node may be in use elsewhere: move
+            app.logger.warning('Snowflake node %s lease lapsed; leasing a new node id', lease.node)
+            router.ids.set_node(lease.acquire())
+    
+    if not app.testing:
+        from app.tasks import tasks
+        tasks.every(app, app.config['SNOWFLAKE_LEASE_SECONDS'] / 3, renew_lease)
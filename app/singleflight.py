@@ -0,0 +1,204 @@
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from flask import current_app, has_app_context
+from app.metrics import metrics
+
+MISSING = object()
+
+class _Call:
+    __slots__ = ('started', 'done', 'value', 'error')
+
+    def __init__(self, started):
+        self.started = started
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SharedFlights:
+    """Leases and published results in a small SQLite file shared by every worker on the host.
+
+    Values are pickled; only this app writes the file, as with the rate limiter's store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS flight (key TEXT PRIMARY KEY, owner TEXT, '
+                               'lease REAL, value BLOB, stored REAL)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def fetch(self, key, newer_than):
+        """The value published for key at or after newer_than, else MISSING"""
+        row = self._connect().execute('SELECT value FROM flight WHERE key = ? AND stored >= ?',
+                                      (key, newer_than)).fetchone()
+        return MISSING if row is None else pickle.loads(row[0])
+
+    def claim(self, key, owner, lease, newer_than=None, now=None):
+        """Take the lease on key unless another worker holds an unexpired one.
+
+        Returns (claimed, value): a value published at or after newer_than wins over a
+        new lease, since its leader may have published between our fetch and this claim.
+        """
+        now = time.time() if now is None else now
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT lease, value, stored FROM flight WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[2] is not None and newer_than is not None and row[2] >= newer_than:
+                connection.execute('COMMIT')
+                return False, pickle.loads(row[1])
+            claimed = row is None or row[0] is None or row[0] < now
+            if claimed:
+                connection.execute('INSERT INTO flight (key, owner, lease) VALUES (?, ?, ?) '
+                                   'ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, '
+                                   'lease = excluded.lease', (key, owner, now + lease))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return claimed, MISSING
+
+    def publish(self, key, owner, value, max_age, now=None):
+        """Store value for key, then drop rows no reader can use: results older than
+        max_age and released leases, unless a live lease is on them"""
+        now = time.time() if now is None else now
+        connection = self._connect()
+        connection.execute('UPDATE flight SET value = ?, stored = ?, owner = NULL, lease = NULL '
+                           'WHERE key = ? AND owner = ?', (pickle.dumps(value), now, key, owner))
+        connection.execute('DELETE FROM flight WHERE (lease IS NULL OR lease < ?) AND (stored IS NULL OR stored < ?)',
+                           (now, now - max_age))
+
+    def release(self, key, owner):
+        self._connect().execute('UPDATE flight SET owner = NULL, lease = NULL WHERE key = ? AND owner = ?',
+                                (key, owner))
+
+    def forget(self, key):
+        self._connect().execute('DELETE FROM flight WHERE key = ?', (key,))
+
+class SingleFlight:
+    """Collapses concurrent identical reads into one computation whose result all callers share.
+
+    A caller joins an in-flight call for the same key only if it started at most
+    max_age seconds ago, so a shared result is never older than that bound; a
+    finished call is not kept. With a SharedFlights store, the first worker to
+    claim a key computes it and the others wait for the published value, which
+    is likewise accepted for max_age seconds. Results are handed to several
+    requests (and, when shared, pickled), so fn must return plain data, not ORM
+    instances bound to the leader's session.
+    """
+
+    def __init__(self, max_age=1.0, lease=5.0, shared=None, poll_interval=0.02):
+        self.max_age = max_age
+        self.lease = lease
+        self.shared = shared
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None or now - call.started > self.max_age
+            if leader:
+                call = self._calls[key] = _Call(now)
+        if not leader:
+            # A leader stuck past its lease should not hold its followers hostage
+            if call.done.wait(self.lease):
+                metrics.inc('singleflight_shared_total', source='worker')
+                if call.error is not None:
+                    raise call.error
+                return call.value
+            return fn()
+        try:
+            call.value = self._run(key, fn)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn):
+        if self.shared is None:
+            return fn()
+        owner = secrets.token_hex(8)
+        try:
+            deadline = time.time() + self.lease
+            while True:
+                value = self.shared.fetch(key, time.time() - self.max_age)
+                if value is MISSING and time.time() < deadline:
+                    claimed, value = self.shared.claim(key, owner, self.lease, time.time() - self.max_age)
+                    if claimed:
+                        break
+                if value is not MISSING:
+                    metrics.inc('singleflight_shared_total', source='host')
+                    return value
+                if time.time() >= deadline:
+                    break
+                time.sleep(self.poll_interval)
+        except sqlite3.Error:
+            # The shared store is an optimisation; a locked or broken file just means no coalescing
+            return fn()
+        try:
+            value = fn()
+        except Exception:
+            self._quietly(self.shared.release, key, owner)
+            raise
+        self._quietly(self.shared.publish, key, owner, value, self.max_age)
+        return value
+
+    @staticmethod
+    def _quietly(operation, *args):
+        try:
+            operation(*args)
+        except sqlite3.Error:
+            pass
+
+    def forget(self, key):
+        """Drop any in-flight or published result so the next read recomputes it"""
+        with self._lock:
+            self._calls.pop(key, None)
+        if self.shared is not None:
+            self._quietly(self.shared.forget, key)
+
+def current_flights():
+    if has_app_context():
+        return current_app.extensions.get('singleflight')
+    return None
+
+def coalesce(key, fn):
+    """Run fn through the app's single-flight group, or directly when coalescing is off"""
+    flights = current_flights()
+    return fn() if flights is None else flights.do(key, fn)
+
+def forget(*keys):
+    """Call after a write that must be visible on the next read of these keys"""
+    flights = current_flights()
+    if flights is not None:
+        for key in keys:
+            flights.forget(key)
+
+def init_app(app):
+    config = app.config
+    if not config['SINGLEFLIGHT_ENABLED']:
+        return
+    shared = SharedFlights(config['SINGLEFLIGHT_SHARED_PATH']) if config['SINGLEFLIGHT_SHARED_PATH'] else None
+    app.extensions['singleflight'] = SingleFlight(config['SINGLEFLIGHT_MAX_AGE'],
+                                                  config['SINGLEFLIGHT_LEASE_SECONDS'], shared)
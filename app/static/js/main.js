@@ -1,8 +1,8 @@
 // SocialConnect JavaScript functionality
 
 $(document).ready(function() {
-    // Like/unlike functionality
-    $('.like-btn').click(function(e) {
+    // Like/unlike functionality (delegated, so cards loaded later work too)
+    $(document).on('click', '.like-btn', function(e) {
         e.preventDefault();
         const button = $(this);
         const postId = button.data('post-id');
@@ -73,6 +73,98 @@ $(document).ready(function() {
         });
     });
     
+    // Load older comments on the post detail page
+    $('.load-more-comments').click(function(e) {
+        e.preventDefault();
+        const button = $(this);
+        button.prop('disabled', true);
+        
+        $.getJSON(button.data('url'), {before: button.data('cursor')}, function(data) {
+            $('.comment-list').append(data.html);
+            if (data.next_cursor) {
+                button.data('cursor', data.next_cursor);
+            } else {
+                button.remove();
+            }
+        }).fail(function() {
+            alert('Error loading comments. Please try again.');
+        }).always(function() {
+            button.prop('disabled', false);
+        });
+    });
+    
+    // Live like/comment counts for the posts on screen
+    const postIds = [...new Set($('.like-count[data-post-id], .comment-count[data-post-id]')
+        .map(function() { return $(this).data('post-id'); }).get())];
+    if (postIds.length && window.EventSource) {
+        const source = new EventSource(`/posts/stream?ids=${postIds.slice(0, 50).join(',')}`);
+        source.addEventListener('counts', function(e) {
+            const data = JSON.parse(e.data);
+            $(`.like-count[data-post-id="${data.post_id}"]`).text(data.like_count);
+            $(`.comment-count[data-post-id="${data.post_id}"]`).text(data.comment_count);
+        });
+    }
+    
+    // "N new posts" banner on the home feed; clicking it loads only the new cards
+    const banner = $('.new-posts-banner');
+    if (banner.length) {
+        let more = false;
+        const poll = function() {
+            if (document.hidden) return;
+            $.getJSON(banner.data('count-url'), {since: banner.data('since')}, function(data) {
+                more = data.more;
+                if (data.count) {
+                    const label = data.more ? `${data.count}+ new posts` : `${data.count} new post${data.count === 1 ? '' : 's'}`;
+                    banner.find('.new-posts-count').text(label);
+                    banner.removeClass('d-none');
+                }
+            });
+        };
+        setInterval(poll, banner.data('interval') * 1000);
+        document.addEventListener('visibilitychange', poll);
+        
+        banner.click(function() {
+            if (more) {
+                window.location.reload();
+                return;
+            }
+            banner.prop('disabled', true);
+            $.getJSON(banner.data('delta-url'), {since: banner.data('since')}, function(data) {
+                $('.feed-empty').remove();
+                $('.feed-posts').prepend(data.html);
+                banner.data('since', data.since);
+                banner.addClass('d-none');
+            }).fail(function() {
+                window.location.reload();
+            }).always(function() {
+                banner.prop('disabled', false);
+            });
+        });
+    }
+    
+    // As-you-type username/email availability on the registration form
+    $('input[data-available-url]').each(function() {
+        const input = $(this);
+        const field = input.attr('name');
+        let timer = null;
+        input.on('input', function() {
+            clearTimeout(timer);
+            input.removeClass('is-valid is-invalid');
+            input.siblings('.availability-feedback').remove();
+            const value = input.val().trim();
+            if (!value) return;
+            timer = setTimeout(function() {
+                $.getJSON(input.data('available-url'), {[field]: value}, function(data) {
+                    if (data.value !== input.val().trim()) return;
+                    input.addClass(data.available ? 'is-valid' : 'is-invalid');
+                    if (!data.available) {
+                        input.after(`<div class="availability-feedback invalid-feedback">That ${field} is already taken.</div>`);
+                    }
+                });
+            }, 300);
+        });
+    });
+
     // Auto-resize textareas
     $('textarea').each(function() {
         this.style.height = 'auto';
@@ -0,0 +1,65 @@
+from flask import Response, current_app, get_flashed_messages, render_template, stream_template
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from app.session_claims import ClaimUser
+
+class Deferred:
+    """Proxy that runs fn on first attribute access or iteration, i.e. while the page streams"""
+    __slots__ = ('_fn', '_value', '_done')
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._value = None
+        self._done = False
+
+    def _get(self):
+        if not self._done:
+            self._value = self._fn()
+            self._done = True
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __bool__(self):
+        return bool(self._get())
+
+def _coalesce(chunks, chunk_size):
+    # Jinja yields many tiny strings; send the <head> at once, then fuller chunks
+    buffer, size, head_sent = [], 0, False
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if not head_sent and '</head>' in chunk:
+            head_sent = True
+        elif size < chunk_size:
+            continue
+        yield ''.join(buffer)
+        buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_page(template_name, **context):
+    """Render a page progressively when STREAM_TEMPLATES is on, else in one piece"""
+    app = current_app._get_current_object()
+    if not app.config['STREAM_TEMPLATES']:
+        return render_template(template_name, **context)
+    # The session cookie goes out with the headers, so everything that writes the
+    # session during a render (user loading, flashes, CSRF tokens) happens first
+    user = current_user._get_current_object()
+    if isinstance(user, ClaimUser):
+        # Templates reach the User row through the claim (is_following and the
+        # like), and only before the headers go out can a deleted account still
+        # redirect or a reissued claim still reach the cookie
+        user.entity()
+    get_flashed_messages(with_categories=True)
+    if app.config.get('WTF_CSRF_ENABLED', True):
+        generate_csrf()
+    chunks = stream_template(template_name, **context)
+    return Response(_coalesce(chunks, app.config['STREAM_CHUNK_SIZE']), mimetype='text/html')
@@ -0,0 +1,79 @@
+import random
+from flask import current_app
+from app import db
+from app.models import User, FollowSuggestion, followers
+
+# A prime above any user id: multiplying ids by a large salt modulo it shuffles them
+SAMPLE_MODULUS = 2 ** 31 - 1
+
+def compute_suggestions(first_id, last_id, per_user, max_fanout, salt):
+    """(user_id, suggested_id, score) friends-of-friends candidates for users first_id..last_id.
+    
+    The score is the number of people the user follows who also follow the
+    candidate, i.e. the user's row of A·A for the follow matrix A with the
+    user and everyone already followed masked out. The database computes it
+    as one join and GROUP BY per range of users. Each followed account
+    contributes at most max_fanout of its own follows, the first in an order
+    shuffled by `salt`, so celebrity accounts do not blow up the pass and, for
+    one salt, every follower sees the same sample.
+    """
+    first, second, seen = followers.alias('first'), followers.alias('second'), followers.alias('seen')
+    # A range, not an IN list, so SQLite drives the join from the batch's own follows
+    in_batch = first.c.follower_id.between(first_id, last_id)
+    friends = db.select(first.c.followed_id).where(in_batch)
+    shuffled = db.func.row_number().over(partition_by=second.c.follower_id,
+                                         order_by=(second.c.followed_id * salt) % SAMPLE_MODULUS)
+    hops = db.select(second.c.follower_id, second.c.followed_id, shuffled.label('position')).where(
+        second.c.follower_id.in_(friends)).subquery()
+    already_followed = db.exists().where(seen.c.follower_id == first.c.follower_id,
+                                         seen.c.followed_id == hops.c.followed_id)
+    candidates = db.select(first.c.follower_id.label('user_id'), hops.c.followed_id.label('suggested_id'),
+                           db.func.count().label('score')).select_from(first).join(
+        hops, hops.c.follower_id == first.c.followed_id).where(
+        in_batch, hops.c.position <= max_fanout,
+        hops.c.followed_id != first.c.follower_id, ~already_followed).group_by(
+        first.c.follower_id, hops.c.followed_id).subquery()
+    ranked = db.select(candidates, db.func.row_number().over(
+        partition_by=candidates.c.user_id,
+        order_by=(candidates.c.score.desc(), candidates.c.suggested_id)).label('position')).subquery()
+    return db.session.execute(db.select(ranked.c.user_id, ranked.c.suggested_id, ranked.c.score).where(
+        ranked.c.position <= per_user)).all()
+
+def refresh_suggestions(salt=None):
+    """Recompute every user's suggestions, SUGGESTIONS_BATCH_SIZE users at a time.
+    
+    Each batch replaces its users' rows in its own short transaction, so memory
+    is bounded by one batch and SQLite's write lock is only held while it is
+    written. This is a batch job: run `flask suggestions refresh` from cron.
+    """
+    config = current_app.config
+    salt = salt or random.randrange(SAMPLE_MODULUS // 2, SAMPLE_MODULUS)
+    table = FollowSuggestion.__table__
+    total, last_id = 0, 0
+    while True:
+        user_ids = db.session.execute(db.select(followers.c.follower_id).distinct().where(
+            followers.c.follower_id > last_id).order_by(followers.c.follower_id).limit(
+            config['SUGGESTIONS_BATCH_SIZE'])).scalars().all()
+        if not user_ids:
+            break
+        first_id, last_id = user_ids[0], user_ids[-1]
+        rows = [{'user_id': user_id, 'suggested_id': suggested_id, 'score': score}
+                for user_id, suggested_id, score in compute_suggestions(
+                    first_id, last_id, config['SUGGESTIONS_PER_USER'], config['SUGGESTIONS_MAX_FANOUT'], salt)]
+        db.session.execute(table.delete().where(table.c.user_id.between(first_id, last_id)))
+        if rows:
+            db.session.execute(table.insert(), rows)
+        db.session.commit()
+        total += len(rows)
+    # Users who no longer follow anyone were in no batch
+    db.session.execute(table.delete().where(table.c.user_id.not_in(db.select(followers.c.follower_id))))
+    db.session.commit()
+    return total
+
+def suggestions_for(user, limit=5):
+    """Stored suggestions for a user, skipping anyone followed since the last refresh"""
+    already_following = db.select(followers.c.followed_id).where(followers.c.follower_id == user.id)
+    return User.query.join(FollowSuggestion, FollowSuggestion.suggested_id == User.id).filter(
+        FollowSuggestion.user_id == user.id,
+        User.id.not_in(already_following)).order_by(
+        FollowSuggestion.score.desc(), User.id).limit(limit).all()
@@ -0,0 +1,123 @@
+import re
+from markupsafe import Markup, escape
+from flask import url_for
+from sqlalchemy.exc import IntegrityError
+from app import db, sharding
+from app.models import Post, Tag, User, post_tag, post_mention
+
+MAX_TAG_LENGTH = 64
+# A tag needs at least one letter (so "#1" stays text); neither matches inside a word, an
+# email address or a URL fragment
+TAG_RE = re.compile(r'(?<![\w&#])#(\w*[^\W\d_]\w*)')
+MENTION_RE = re.compile(r'(?<![\w@])@(\w[\w.-]*)')
+TOKEN_RE = re.compile(f'{TAG_RE.pattern}|{MENTION_RE.pattern}')
+
+def normalize_tag(name):
+    """The stored form of a tag, or None if it is not a valid one"""
+    match = TAG_RE.fullmatch(f'#{name}')
+    if match is None or len(name) > MAX_TAG_LENGTH:
+        return None
+    return name.casefold()
+
+def extract_tags(text):
+    """Distinct normalized tags in order of first appearance"""
+    names = (normalize_tag(name) for name in TAG_RE.findall(text))
+    return list(dict.fromkeys(name for name in names if name))
+
+def extract_mentions(text):
+    """Distinct @usernames in order of first appearance (trailing punctuation dropped)"""
+    return list(dict.fromkeys(name.rstrip('.-') for name in MENTION_RE.findall(text)))
+
+def tag_ids(names):
+    """Map tag names to ids, creating the missing tags"""
+    ids = dict(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(names))) if names else {}
+    for name in names:
+        if name in ids:
+            continue
+        # Another request may create the same tag first; the unique index decides who wins
+        try:
+            with db.session.begin_nested():
+                ids[name] = db.session.execute(Tag.__table__.insert().values(name=name)).inserted_primary_key[0]
+        except IntegrityError:
+            ids[name] = db.session.query(Tag.id).filter(Tag.name == name).scalar()
+    return ids
+
+def link_posts(rows):
+    """Insert post_tag and post_mention rows for (post_id, content) pairs.
+
+    Returns the number of tag and mention links written. Unknown usernames are ignored.
+    """
+    tags = [(post_id, extract_tags(content)) for post_id, content in rows]
+    mentions = [(post_id, extract_mentions(content)) for post_id, content in rows]
+    ids = tag_ids(list(dict.fromkeys(name for _, names in tags for name in names)))
+    usernames = {name for _, names in mentions for name in names}
+    users = dict(db.session.query(User.username, User.id).filter(User.username.in_(usernames))) if usernames else {}
+    tag_links = [{'tag_id': ids[name], 'post_id': post_id} for post_id, names in tags for name in names]
+    mention_links = [{'user_id': users[name], 'post_id': post_id}
+                     for post_id, names in mentions for name in names if name in users]
+    if tag_links:
+        db.session.execute(post_tag.insert(), tag_links)
+    if mention_links:
+        db.session.execute(post_mention.insert(), mention_links)
+    return len(tag_links), len(mention_links)
+
+def index_post(post):
+    """Record a new post's tags and mentions; call after it is flushed, before commit"""
+    return link_posts([(post.id, post.content)])
+
+def backfill(batch_size=1000):
+    """Rebuild tag and mention links for every post, committing batch by batch in id order.
+
+    Safe to rerun: each batch's existing links are replaced.
+    """
+    last_id, posts, tagged, mentioned = 0, 0, 0, 0
+    while True:
+        rows = db.session.query(Post.id, Post.content).filter(Post.id > last_id).order_by(
+            Post.id).limit(batch_size).all()
+        if not rows:
+            break
+        post_ids = [post_id for post_id, _ in rows]
+        db.session.execute(post_tag.delete().where(post_tag.c.post_id.in_(post_ids)))
+        db.session.execute(post_mention.delete().where(post_mention.c.post_id.in_(post_ids)))
+        tags, mentions = link_posts(rows)
+        db.session.commit()
+        last_id = post_ids[-1]
+        posts += len(rows)
+        tagged += tags
+        mentioned += mentions
+    return posts, tagged, mentioned
+
+def indexed():
+    """Whether new posts are indexed by tag and mention; sharded posts are not"""
+    return not sharding.enabled()
+
+def linkify(text):
+    """Escape post content and turn #tags and @mentions into links"""
+    if not indexed():
+        # The tag and mention pages would not list the post the link sits on
+        return escape(text)
+    parts, pos = [], 0
+    for match in TOKEN_RE.finditer(text):
+        tag, username = match.group(1), match.group(2)
+        if tag:
+            name = normalize_tag(tag)
+            if name is None:
+                continue
+            link = Markup('<a href="{}" class="text-decoration-none">#{}</a>').format(
+                url_for('main.tag_feed', tag=name), tag)
+            trailing = ''
+        else:
+            name = username.rstrip('.-')
+            link = Markup('<a href="{}" class="text-decoration-none">@{}</a>').format(
+                url_for('users.profile', username=name), name)
+            trailing = username[len(name):]
+        parts.append(escape(text[pos:match.start()]))
+        parts.append(link)
+        parts.append(escape(trailing))
+        pos = match.end()
+    parts.append(escape(text[pos:]))
+    return Markup('').join(parts)
+
+def init_app(app):
+    app.add_template_filter(linkify)
+    app.jinja_env.globals['tags_indexed'] = indexed
@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class BackgroundTasks:
+    """Small in-process executor for work that should not hold up a response,
+    such as removing upload files after the rows pointing at them are gone."""
+    
+    def __init__(self, app=None):
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        workers = app.config.get('BACKGROUND_WORKERS', 2)
+        if self._executor is None and workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background')
+        app.extensions['background_tasks'] = self
+    
+    def submit(self, fn, *args, **kwargs):
+        """Run fn in the background, or inline when no workers are configured"""
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+    
+    def periodic(self, app):
+        """Whether refresh jobs run in this process (never under test)"""
+        return app.config['PERIODIC_JOBS'] and not app.testing
+    
+    def every(self, app, seconds, fn):
+        """Call fn inside an app context every `seconds` on a daemon thread"""
+        def loop():
+            while not self._stop.wait(seconds):
+                with app.app_context():
+                    try:
+                        fn()
+                    except Exception:
+                        app.logger.exception('Periodic task %s failed', fn.__name__)
+        
+        thread = threading.Thread(target=loop, name=f'periodic-{fn.__name__}', daemon=True)
+        thread.start()
+        return thread
+    
+    def pending(self):
+        """Number of submitted tasks that have not finished yet"""
+        return self._pending
+    
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+tasks = BackgroundTasks()
+
+def remove_file(path):
+    """Delete a file if it is still there"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import Post, Comment, Like, PostScore
+
+def compute_scores(now=None):
+    """Score recent posts by time-decayed engagement.
+    
+    Likes and comments created inside the window are counted with one grouped
+    query each, weighted, and halved every TRENDING_HALF_LIFE_HOURS of post age.
+    Returns the top TRENDING_SIZE (post_id, score) pairs, best first.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=config['TRENDING_WINDOW_HOURS'])
+    
+    posts = dict(db.session.query(Post.id, Post.created_at).filter(Post.created_at >= cutoff))
+    if not posts:
+        return []
+    likes = dict(db.session.query(Like.post_id, db.func.count()).filter(
+        Like.created_at >= cutoff).group_by(Like.post_id))
+    comments = dict(db.session.query(Comment.post_id, db.func.count()).filter(
+        Comment.created_at >= cutoff).group_by(Comment.post_id))
+    
+    half_life = config['TRENDING_HALF_LIFE_HOURS'] * 3600.0
+    comment_weight = config['TRENDING_COMMENT_WEIGHT']
+    scores = []
+    for post_id, created_at in posts.items():
+        engagement = 1 + likes.get(post_id, 0) + comment_weight * comments.get(post_id, 0)
+        age = max((now - created_at).total_seconds(), 0.0)
+        scores.append((post_id, engagement * 0.5 ** (age / half_life)))
+    scores.sort(key=lambda item: item[1], reverse=True)
+    return scores[:config['TRENDING_SIZE']]
+
+def refresh_scores(now=None):
+    """Recompute scores and replace the ranked table in a single transaction"""
+    scores = compute_scores(now)
+    computed_at = now or datetime.utcnow()
+    db.session.execute(PostScore.__table__.delete())
+    if scores:
+        db.session.execute(PostScore.__table__.insert(), [
+            {'post_id': post_id, 'score': score, 'computed_at': computed_at}
+            for post_id, score in scores])
+    db.session.commit()
+    return len(scores)
+
+def trending_posts():
+    """Query for scored posts, highest score first"""
+    return Post.query.join(PostScore, PostScore.post_id == Post.id).order_by(
+        PostScore.score.desc(), Post.id.desc())
+
+def has_scores():
+    return db.session.query(PostScore.post_id).limit(1).first() is not None
@@ -0,0 +1 @@
+# Benchmark harness: synthetic data generation and request scenarios
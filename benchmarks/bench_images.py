@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Peak RSS per image upload.
+
+Writes a large JPEG and PNG, then processes each in a fresh child process,
+once alone and as several simultaneous uploads, with three strategies, and
+reports how far the child's peak RSS rose above its post-import baseline:
+
+  full       Image.open + load() + thumbnail, i.e. a complete decode
+  thumbnail  the previous save_picture path (Image.open + thumbnail)
+  bounded    app.images.save_thumbnail (pixel cap, draft decode, budget)
+
+    python -m benchmarks.bench_images --width 8000 --height 6000 --concurrency 4
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+SIZE = (800, 800)
+
+def make_image(path, width, height):
+    """A gradient with some texture, so the encoders do real work"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 64)
+    Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).save(
+        path, quality=95)
+
+def peak_kib():
+    # ru_maxrss survives exec on Linux (the child would inherit the parent's peak); VmHWM does not
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def process(strategy, source, target):
+    from app.images import save_thumbnail
+    with open(source, 'rb') as upload:
+        if strategy == 'full':
+            img = Image.open(upload)
+            img.load()
+            img.thumbnail(SIZE)
+            img.save(target)
+        elif strategy == 'thumbnail':
+            img = Image.open(upload)
+            img.thumbnail(SIZE)
+            img.save(target)
+        else:
+            save_thumbnail(upload, target, SIZE, max_pixels=100_000_000, timeout=None)
+
+def run(strategy, source, concurrency, queue):
+    import app.images  # import cost belongs to the baseline
+    baseline = peak_kib()
+    ext = os.path.splitext(source)[1]
+    threads = [threading.Thread(target=process, args=(strategy, source, f'{source}.{i}{ext}'))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(concurrency):
+        os.unlink(f'{source}.{i}{ext}')
+    queue.put(peak_kib() - baseline)
+
+def measure(strategy, source, concurrency):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    child = ctx.Process(target=run, args=(strategy, source, concurrency, queue))
+    child.start()
+    rise = queue.get()
+    child.join()
+    return rise
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Peak RSS per image upload')
+    parser.add_argument('--width', type=int, default=8000)
+    parser.add_argument('--height', type=int, default=6000)
+    parser.add_argument('--concurrency', type=int, default=4, help='simultaneous uploads per worker')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    print(f'Peak RSS rise, {args.width}x{args.height} source, {SIZE[0]}px thumbnail, '
+          f'default IMAGE_MEMORY_BUDGET')
+    print(f'  {"format":<8}{"uploads":>8}{"full":>12}{"thumbnail":>12}{"bounded":>12}')
+    for ext in ('jpg', 'png'):
+        source = os.path.join(directory, f'source.{ext}')
+        make_image(source, args.width, args.height)
+        for concurrency in sorted({1, args.concurrency}):
+            rises = [measure(strategy, source, concurrency) / 1024
+                     for strategy in ('full', 'thumbnail', 'bounded')]
+            print(f'  {ext:<8}{concurrency:>8}' + ''.join(f'{rise:>8.1f} MiB' for rise in rises))
+        os.unlink(source)
+    os.rmdir(directory)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
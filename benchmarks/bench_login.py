@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark.
+
+Reports raw KDF verifications per second on one core for a few werkzeug
+methods, then logins per second through the app with hashing inline versus
+on the PASSWORD_HASH_WORKERS process pool, divided by the cores in use.
+
+    python -m benchmarks.bench_login --threads 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import create_app, db
+from app.models import User
+
+METHODS = ('pbkdf2:sha256:600000', 'pbkdf2:sha256:260000', 'scrypt:32768:8:1')
+
+def kdf_rate(method, seconds):
+    pwhash = generate_password_hash('benchmark', method=method)
+    count, end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        check_password_hash(pwhash, 'benchmark')
+        count += 1
+    return count / seconds
+
+def login_rate(method, workers, threads, seconds):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': method,
+        'PASSWORD_HASH_WORKERS': workers,
+    })
+    with app.app_context():
+        user = User(username='benchuser', email='bench@example.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.commit()
+    
+    counts = [0] * threads
+    end = time.perf_counter() + seconds
+    
+    def worker(index):
+        client = app.test_client()
+        while time.perf_counter() < end:
+            client.post('/auth/login', data={'username': 'benchuser', 'password': 'benchmark'})
+            client.get('/auth/logout')
+            counts[index] += 1
+    
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    os.unlink(path)
+    return sum(counts) / seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Login throughput benchmark')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing pool size')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--method', default=METHODS[0])
+    args = parser.parse_args(argv)
+    
+    print('KDF verifications per second (one core)')
+    for method in METHODS:
+        print(f'  {method:<24}{kdf_rate(method, args.seconds / 2):>10.1f}')
+    
+    inline = login_rate(args.method, 0, args.threads, args.seconds)
+    pooled = login_rate(args.method, args.workers, args.threads, args.seconds)
+    print(f'\nLogins per second with {args.method}, {args.threads} request threads')
+    print(f'  inline (1 core, GIL-bound)   {inline:>10.1f}')
+    print(f'  pool ({args.workers} workers)            {pooled:>10.1f}  ({pooled / args.workers:.1f} per core)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
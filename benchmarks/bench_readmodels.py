@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Feed hydration benchmark: ORM entities versus read-model DTOs.
+
+Builds one page of the home feed, explore and a profile the old way (Post
+entities, lazy author loads, per-post count and has-liked queries) and
+through app.readmodels, touching the same fields the _post.html card reads.
+Reports tracemalloc peak and retained allocations per page, CPU time per
+page and SQL statements per page.
+
+    python -m benchmarks.bench_readmodels --users 2000 --pages 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Post
+from app.readmodels import paginate_views, feed_rows, recent_rows, user_rows
+from benchmarks import datagen
+
+def touch(posts, viewer):
+    """Read every field a feed card renders"""
+    for post in posts.items:
+        post.id, post.content, post.image, post.created_at
+        post.author.id, post.author.username, post.author.avatar
+        post.like_count(), post.comment_count()
+        viewer.has_liked_post(post) if isinstance(post, Post) else post.liked
+
+def orm_pages(viewer, per_page):
+    return [
+        viewer.followed_posts().paginate(page=1, per_page=per_page, error_out=False),
+        Post.query.order_by(Post.created_at.desc()).paginate(page=1, per_page=per_page, error_out=False),
+        viewer.posts.order_by(Post.created_at.desc()).paginate(page=1, per_page=per_page, error_out=False),
+    ]
+
+def dto_pages(viewer, per_page):
+    return [
+        paginate_views(feed_rows(viewer.id), 1, per_page, viewer.id),
+        paginate_views(recent_rows(), 1, per_page, viewer.id),
+        paginate_views(user_rows(viewer.id), 1, per_page, viewer.id),
+    ]
+
+def measure(build, viewer_id, per_page, pages):
+    """Average per-page peak bytes, retained bytes, CPU ms and statements"""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    peak = retained = cpu = 0
+    try:
+        for _ in range(pages):
+            db.session.expunge_all()
+            viewer = db.session.get(User, viewer_id)
+            tracemalloc.start()
+            start = time.process_time()
+            results = build(viewer, per_page)
+            for posts in results:
+                touch(posts, viewer)
+            cpu += time.process_time() - start
+            current, page_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peak += page_peak
+            retained += current
+            del results
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    # Three feeds are built per iteration
+    n = pages * 3
+    return peak / n, retained / n, cpu * 1000 / n, statements[0] / n
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Feed hydration benchmark')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--pages', type=int, default=30, help='iterations per strategy')
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    try:
+        with app.app_context():
+            datagen.generate(users=args.users, seed=args.seed)
+            # The most-followed account has the busiest feed and profile
+            viewer_id = 1
+            rows = {}
+            for name, build in (('orm', orm_pages), ('dto', dto_pages)):
+                rows[name] = measure(build, viewer_id, args.per_page, args.pages)
+        print(f'Per feed page ({args.per_page} posts, {args.users} users)')
+        print(f'  {"":<6}{"peak KiB":>10}{"retained KiB":>14}{"CPU ms":>10}{"queries":>10}')
+        for name, (peak, retained, cpu, queries) in rows.items():
+            print(f'  {name:<6}{peak / 1024:>10.1f}{retained / 1024:>14.1f}{cpu:>10.2f}{queries:>10.1f}')
+        orm, dto = rows['orm'], rows['dto']
+        print(f'  saved {100 * (1 - dto[0] / orm[0]):.0f}% peak memory, '
+              f'{100 * (1 - dto[2] / orm[2]):.0f}% CPU per page')
+    finally:
+        os.unlink(path)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
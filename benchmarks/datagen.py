@@ -0,0 +1,122 @@
+"""
+Seeded synthetic social-graph generator for benchmarks.
+
+Rows are written with chunked executemany inserts and explicit primary keys,
+so memory stays flat and a million users with tens of millions of posts,
+likes and comments load in minutes rather than hours.
+"""
+import itertools
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import User, Post, Comment, Like, followers
+
+BENCH_PASSWORD = 'benchmark'
+CHUNK_SIZE = 10000
+
+def power_law_weights(n, alpha):
+    """Cumulative weights where item i is picked proportionally to 1 / (i + 1) ** alpha"""
+    return list(itertools.accumulate(1.0 / (i + 1) ** alpha for i in range(n)))
+
+def power_law_count(rng, mean, cap):
+    """Draw a heavy-tailed non-negative count with roughly the given mean"""
+    if mean <= 0:
+        return 0
+    # Pareto with shape 2 has mean 2 * scale
+    return min(int(rng.paretovariate(2.0) * mean / 2.0), cap)
+
+def pick_distinct(rng, cum_weights, k, exclude=None):
+    """Pick up to k distinct ids (1-based) following the cumulative weights"""
+    if k <= 0:
+        return set()
+    population = range(1, len(cum_weights) + 1)
+    picked = set(rng.choices(population, cum_weights=cum_weights, k=k))
+    picked.discard(exclude)
+    return picked
+
+def insert_chunks(connection, table, rows):
+    """Insert an iterable of row dicts in CHUNK_SIZE executemany batches"""
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            connection.execute(table.insert(), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        connection.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+def generate(users=1000, posts_per_user=10, follows_per_user=20, likes_per_post=5,
+             comments_per_post=2, days=30, alpha=1.1, seed=42, progress=None):
+    """Populate the current app's database and return row counts per table.
+    
+    Follow targets and like/comment authors are drawn from a power-law
+    popularity distribution, so a few accounts are followed by a large share
+    of users while most have a handful of followers. Every user's password is
+    BENCH_PASSWORD.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    popularity = power_law_weights(users, alpha)
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    report = progress or (lambda message: None)
+    counts = {}
+    
+    engine = db.engine
+    with engine.begin() as connection:
+        if engine.dialect.name == 'sqlite':
+            connection.exec_driver_sql('PRAGMA synchronous=OFF')
+        
+        report(f'users: {users}')
+        counts['user'] = insert_chunks(connection, User.__table__, (
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@bench.example',
+             'password_hash': password_hash, 'bio': f'Benchmark user {i}',
+             'avatar': 'default_avatar.png',
+             'created_at': now - timedelta(days=days, seconds=rng.randrange(86400)),
+             'last_seen': now}
+            for i in range(1, users + 1)))
+        
+        report('followers')
+        counts['followers'] = insert_chunks(connection, followers, (
+            {'follower_id': follower_id, 'followed_id': followed_id}
+            for follower_id in range(1, users + 1)
+            for followed_id in pick_distinct(
+                rng, popularity, power_law_count(rng, follows_per_user, users - 1), exclude=follower_id)))
+        
+        report('posts, comments and likes')
+        post_rows, comment_rows, like_rows = [], [], []
+        comment_id = 0
+        counts.update({'post': 0, 'comment': 0, 'like': 0})
+        span = days * 86400
+        post_ids = itertools.count(1)
+        for user_id in range(1, users + 1):
+            for _ in range(power_law_count(rng, posts_per_user, posts_per_user * 50)):
+                post_id = next(post_ids)
+                created_at = now - timedelta(seconds=rng.randrange(span))
+                age = max(int((now - created_at).total_seconds()), 1)
+                commenters = rng.choices(range(1, users + 1), cum_weights=popularity,
+                                         k=power_law_count(rng, comments_per_post, users))
+                post_rows.append({'id': post_id, 'content': f'Post {post_id} by user{user_id} #bench',
+                                  'user_id': user_id, 'created_at': created_at,
+                                  'comments_count': len(commenters)})
+                for commenter in commenters:
+                    comment_id += 1
+                    comment_rows.append({'id': comment_id, 'content': f'Comment {comment_id}',
+                                         'user_id': commenter, 'post_id': post_id,
+                                         'created_at': created_at + timedelta(seconds=rng.randrange(age))})
+                for liker in pick_distinct(rng, popularity, power_law_count(rng, likes_per_post, users)):
+                    like_rows.append({'user_id': liker, 'post_id': post_id,
+                                      'created_at': created_at + timedelta(seconds=rng.randrange(age))})
+            if len(post_rows) + len(comment_rows) + len(like_rows) >= CHUNK_SIZE:
+                counts['post'] += insert_chunks(connection, Post.__table__, post_rows)
+                counts['comment'] += insert_chunks(connection, Comment.__table__, comment_rows)
+                counts['like'] += insert_chunks(connection, Like.__table__, like_rows)
+                post_rows, comment_rows, like_rows = [], [], []
+        counts['post'] += insert_chunks(connection, Post.__table__, post_rows)
+        counts['comment'] += insert_chunks(connection, Comment.__table__, comment_rows)
+        counts['like'] += insert_chunks(connection, Like.__table__, like_rows)
+    return counts
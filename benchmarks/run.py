@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark runner for the Flask Social Media application.
+
+Builds (or reuses) a seeded SQLite database, replays request scenarios
+through the Flask test client and reports p50/p95/p99 latency plus SQL
+queries per request. Results can be saved as a baseline and later runs
+compared against it. Latencies are only compared on the machine the
+baseline was recorded on; elsewhere only query counts are checked.
+
+    python -m benchmarks.run --users 2000 --requests 200
+    python -m benchmarks.run --users 1000000 --posts-per-user 20 --db /data/bench.db
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import User, Post
+from benchmarks import datagen
+from benchmarks.scenarios import SCENARIOS
+
+class Context:
+    """Shared state handed to scenarios: a logged-in client and id ranges"""
+    
+    def __init__(self, app, seed):
+        self.app = app
+        self.rng = random.Random(seed)
+        self.client = app.test_client()
+        self.queries = 0
+        with app.app_context():
+            self.max_user_id = db.session.query(db.func.max(User.id)).scalar() or 0
+            self.max_post_id = db.session.query(db.func.max(Post.id)).scalar() or 0
+        self.client.post('/auth/login', data={'username': 'user1', 'password': datagen.BENCH_PASSWORD})
+    
+    def get(self, url, **kwargs):
+        # Buffered: streamed pages render (and query) while their body is read
+        return self.client.get(url, buffered=True, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self.client.post(url, buffered=True, **kwargs)
+    
+    def random_post_id(self):
+        return self.rng.randint(1, max(self.max_post_id, 1))
+    
+    def popular_username(self):
+        # Low ids are the most followed accounts in the generated graph
+        return f'user{min(int(self.rng.paretovariate(1.2)), max(self.max_user_id, 1))}'
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def run_scenarios(app, names, requests, warmup, seed):
+    ctx = Context(app, seed)
+    
+    def count_query(*args):
+        ctx.queries += 1
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_query)
+    results = {}
+    try:
+        for name in names:
+            scenario = SCENARIOS[name]
+            for _ in range(warmup):
+                scenario(ctx)
+            latencies, queries, errors = [], [], 0
+            for _ in range(requests):
+                ctx.queries = 0
+                start = time.perf_counter()
+                response = scenario(ctx)
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                queries.append(ctx.queries)
+                # Every scenario expects success; a 404 or a 429 is as wrong as a 500
+                if response.status_code >= 400:
+                    errors += 1
+            results[name] = {
+                'requests': requests,
+                'errors': errors,
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'queries_per_request': round(sum(queries) / max(len(queries), 1), 2),
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    return results
+
+def machine():
+    """What the latencies were measured on; they mean nothing on other hardware"""
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table and return the scenarios that regressed.
+    
+    A tolerance of None compares query counts only.
+    """
+    regressions = []
+    print(f"{'scenario':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>10}{'base p95':>10}{'delta':>9}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        delta = ''
+        if base and base['p95_ms']:
+            change = result['p95_ms'] / base['p95_ms'] - 1.0
+            delta = f'{change:+.0%}'
+            if ((tolerance is not None and change > tolerance)
+                    or result['queries_per_request'] > base['queries_per_request']):
+                regressions.append(name)
+        print(f"{name:<14}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['queries_per_request']:>10.1f}"
+              f"{(base or {}).get('p95_ms', 0):>10.2f}{delta:>9}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='SQLite file to build or reuse (default: temporary file)')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts-per-user', type=int, default=10)
+    parser.add_argument('--follows-per-user', type=int, default=20)
+    parser.add_argument('--likes-per-post', type=int, default=5)
+    parser.add_argument('--comments-per-post', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='run only these scenarios (repeatable)')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(__file__), 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='overwrite the baseline with this run')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown before failing')
+    args = parser.parse_args(argv)
+    
+    db_path = args.db or tempfile.mkstemp(suffix='.db')[1]
+    fresh = not args.db or not os.path.exists(args.db) or os.path.getsize(args.db) == 0
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_path)}',
+        'WTF_CSRF_ENABLED': False,
+        # One client replays every request, so write budgets would turn toggle_like into 429s
+        'RATELIMIT_ENABLED': False,
+    })
+    
+    if fresh:
+        with app.app_context():
+            start = time.perf_counter()
+            counts = datagen.generate(
+                users=args.users, posts_per_user=args.posts_per_user,
+                follows_per_user=args.follows_per_user, likes_per_post=args.likes_per_post,
+                comments_per_post=args.comments_per_post, seed=args.seed,
+                progress=lambda message: print(f'  generating {message}', file=sys.stderr))
+            print(f'Generated {counts} in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+    
+    names = args.scenario or list(SCENARIOS)
+    results = run_scenarios(app, names, args.requests, args.warmup, args.seed)
+    
+    baseline = {}
+    tolerance = args.tolerance
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored['scenarios']
+        if stored.get('machine') != machine():
+            print('Baseline latencies come from another machine; checking query counts only', file=sys.stderr)
+            tolerance = None
+    regressions = compare(results, baseline, tolerance)
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'note': 'Latencies are a snapshot from "machine" and only gate runs on it; '
+                               'query counts apply everywhere.',
+                       'machine': machine(),
+                       'params': {k: v for k, v in vars(args).items()
+                                  if k not in ('db', 'baseline', 'save_baseline')},
+                       'scenarios': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline to {args.baseline}')
+    
+    if not args.db:
+        os.unlink(db_path)
+    if regressions:
+        print(f"Regressed against baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
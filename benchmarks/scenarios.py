@@ -0,0 +1,34 @@
+"""
+Request scenarios replayed by benchmarks.run.
+
+Each scenario takes the harness context, makes one request and returns the
+response; the runner times the call and checks the status code, so latencies,
+query counts and errors are attributed per scenario.
+"""
+
+def index(ctx):
+    return ctx.get('/')
+
+def explore(ctx):
+    return ctx.get(f'/explore?page={ctx.rng.randint(1, 5)}')
+
+def profile(ctx):
+    return ctx.get(f'/users/{ctx.popular_username()}')
+
+def post_detail(ctx):
+    return ctx.get(f'/posts/{ctx.random_post_id()}')
+
+def search(ctx):
+    return ctx.get(f'/search?query=user{ctx.rng.randint(1, 99)}')
+
+def toggle_like(ctx):
+    return ctx.post(f'/posts/{ctx.random_post_id()}/like', headers={'Content-Type': 'application/json'})
+
+SCENARIOS = {
+    'index': index,
+    'explore': explore,
+    'profile': profile,
+    'post_detail': post_detail,
+    'search': search,
+    'toggle_like': toggle_like,
+}
@@ -8,15 +8,143 @@ class Config:
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///socialconnect.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Cold tier: old posts with their comments and likes (`flask archive run`); bound as 'archive'
+    ARCHIVE_DATABASE_URL = os.environ.get('ARCHIVE_DATABASE_URL') or 'sqlite:///archive.db'
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 0))  # 0 leaves archiving to the CLI
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_REFRESH_SECONDS = 24 * 3600
+    # Sharding: posts, comments and likes split by author across SHARD_COUNT databases (0 keeps them
+    # in the main one); {} in the URL is the shard number. The count cannot change once posts exist.
+    SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 0))
+    SHARD_DATABASE_URL = os.environ.get('SHARD_DATABASE_URL') or 'sqlite:///shard{}.db'
+    # 0-15 and distinct for each writing process; unset, each process leases one from the main database
+    # (set it for every process or for none)
+    SNOWFLAKE_NODE_ID = os.environ.get('SNOWFLAKE_NODE_ID')
+    SNOWFLAKE_LEASE_SECONDS = 60
     
     # File upload configuration
     UPLOAD_FOLDER = 'app/static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    IMAGE_MAX_PIXELS = 50_000_000  # rejected from the header, before any decoding
+    IMAGE_MEMORY_BUDGET = 256 * 1024 * 1024  # decoded pixel bytes in flight per worker
+    # How /media/ serves uploads: 'direct' (sendfile via wsgi.file_wrapper), 'x-sendfile' or 'x-accel' (nginx)
+    MEDIA_SEND_MODE = os.environ.get('MEDIA_SEND_MODE') or 'direct'
+    # x-accel needs e.g. `location /protected-media/ { internal; alias /app/app/static/uploads/; }`
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX') or '/protected-media/'
+    MEDIA_MAX_AGE = 30 * 24 * 3600  # upload filenames are random, so they rarely change
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
+    # Background executor for deferred work (0 runs tasks inline)
+    BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 2))
+    # Refresh jobs (trending, archiving, index reloads) on threads in the web process;
+    # gunicorn.conf.py turns them off and cron runs the `flask` commands instead
+    PERIODIC_JOBS = os.environ.get('PERIODIC_JOBS', '1') == '1'
+    
+    # Live count stream (Server-Sent Events); each open stream holds a connection, so serve with
+    # the gevent worker in gunicorn.conf.py and keep this below its worker_connections
+    SSE_MAX_CONNECTIONS = int(os.environ.get('SSE_MAX_CONNECTIONS', 800))
+    SSE_MAX_POSTS = 50
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_SECONDS = 300
+    
+    # Request instrumentation (Server-Timing header, structured log, and a debug panel shown
+    # in debug mode or to ADMINS)
+    INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.01))
+    INSTRUMENTATION_DEBUG_PANEL = os.environ.get('INSTRUMENTATION_DEBUG_PANEL') == '1'
+    
+    # Prometheus-style /metrics (METRICS_DIR shares totals across pre-fork workers); scrapes need
+    # METRICS_TOKEN as a bearer token, or come from a private address when no token is set
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_FLUSH_SECONDS = 5
+    
+    # Usernames allowed to use admin-only tooling such as ?profile=1
+    ADMINS = set(filter(None, os.environ.get('ADMINS', '').split(',')))
+    
+    # Sampling profiler (writes collapsed stacks; see `flask profile flamegraph`)
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED') == '1'
+    PROFILER_ENDPOINTS = set(filter(None, os.environ.get('PROFILER_ENDPOINTS', '').split(',')))
+    PROFILER_SAMPLE_EVERY = int(os.environ.get('PROFILER_SAMPLE_EVERY', 0))
+    PROFILER_INTERVAL = 0.005
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or 'profiles'
+    
+    # Password hashing (werkzeug method string; hashes are upgraded on login when it changes)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_QUEUE = 64
+    
+    # Write throttling: token buckets per user (or IP) and endpoint, plus load shedding
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND') or 'memory'  # or 'sqlite' to share across workers
+    RATELIMIT_STORAGE_PATH = os.environ.get('RATELIMIT_STORAGE_PATH') or 'instance/ratelimit.db'
+    RATELIMITS = {
+        'posts.toggle_like': '60/minute',
+        'posts.add_comment': '10/minute',
+        'posts.create_post': '5/minute',
+        'users.follow': '30/minute',
+        'auth.register': '5/hour',
+    }
+    # Reads that reveal whether an account exists are budgeted per IP, logged in or not
+    READ_RATELIMITS = {
+        'auth.available': '30/minute',
+    }
+    SHED_LATENCY_MS = 2000
+    SHED_MAX_QUEUE = 64
+    SHED_RETRY_AFTER = 2
+    SHED_EXEMPT = {'auth.login', 'auth.logout', 'auth.register'}  # never lock people out while shedding
+    
+    # Static assets (`flask assets build` writes fingerprinted, precompressed copies to static/dist)
+    ASSETS_VENDOR = os.environ.get('ASSETS_VENDOR') or 'cdn'  # or 'local' after `flask assets vendor`
+    ASSETS_MAX_AGE = 365 * 24 * 3600
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIMETYPES = {'text/html', 'application/json', 'text/plain'}
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    
+    # In-memory CSR follower index for is_following and follower counts (rebuilt from the DB periodically)
+    GRAPH_INDEX = os.environ.get('GRAPH_INDEX') == '1'
+    GRAPH_REFRESH_SECONDS = 300  # also bounds staleness from other workers' follows
+    
+    # Bloom filters over usernames/emails so availability checks skip the DB for unused names
+    NAME_FILTER_ENABLED = os.environ.get('NAME_FILTER_ENABLED', '1') == '1'
+    NAME_FILTER_MIN_CAPACITY = 10000
+    NAME_FILTER_ERROR_RATE = 0.01
+    NAME_FILTER_REFRESH_SECONDS = 600  # resizes the filters and picks up other workers' signups
+    
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
+    # Serve current_user from a signed cookie claim instead of a per-request DB lookup
+    SESSION_CLAIMS = os.environ.get('SESSION_CLAIMS') == '1'
+    SESSION_CLAIM_MAX_AGE = 300  # seconds before a claim is revalidated against the DB
+    
+    # Progressive HTML for post detail, profile and search (<head> flushes before the queries run)
+    STREAM_TEMPLATES = os.environ.get('STREAM_TEMPLATES', '1') == '1'
+    STREAM_CHUNK_SIZE = 8192
+    
+    # Single-flight: concurrent identical post/profile reads share one in-flight result
+    SINGLEFLIGHT_ENABLED = os.environ.get('SINGLEFLIGHT_ENABLED', '1') == '1'
+    SINGLEFLIGHT_MAX_AGE = 1.0  # seconds; no shared result is older than this
+    SINGLEFLIGHT_LEASE_SECONDS = 5.0  # how long others wait on a leader before computing themselves
+    SINGLEFLIGHT_SHARED_PATH = os.environ.get('SINGLEFLIGHT_SHARED_PATH')  # e.g. instance/flights.db to coalesce across workers
+    
+    # "N new posts" banner on the home feed
+    FEED_POLL_SECONDS = 15  # how often main.js asks /feed/new
+    FEED_NEW_MAX = 50  # count at most this many; past it the banner reloads the page
     
     # Pagination
     POSTS_PER_PAGE = 10
     USERS_PER_PAGE = 20
+    COMMENTS_PER_PAGE = 20
+    
+    # Trending explore ranking
+    TRENDING_WINDOW_HOURS = 72
+    TRENDING_HALF_LIFE_HOURS = 12
+    TRENDING_COMMENT_WEIGHT = 2
+    TRENDING_SIZE = 500
+    TRENDING_REFRESH_SECONDS = int(os.environ.get('TRENDING_REFRESH_SECONDS', 300))
+    
+    # "Who to follow" suggestions, refreshed by `flask suggestions refresh` from cron
+    SUGGESTIONS_PER_USER = 10
+    SUGGESTIONS_MAX_FANOUT = 1000
+    SUGGESTIONS_BATCH_SIZE = 500
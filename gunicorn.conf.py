@@ -0,0 +1,28 @@
+# Production server settings: gunicorn -c gunicorn.conf.py run:app
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# gevent parks each idle live-count stream (posts.stream_counts, up to SSE_MAX_SECONDS) as a
+# greenlet; a sync or threaded worker would tie up a whole thread per open browser tab
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+# The count stream's event bus is per process: with more workers a tab only sees the likes
+# and comments its own worker handled until the stream reconnects.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Periodic refresh jobs would run on the worker's hub and stall every open request while they
+# compute, so they are off here; run them from cron on the same database instead:
+#   */5 * * * *  flask --app run trending refresh
+#   0 * * * *    flask --app run suggestions refresh
+#   30 3 * * *   flask --app run archive run
+# The in-memory follower index and name filters are kept current by the worker's own writes,
+# which is every write with one worker; with more, leave GRAPH_INDEX off.
+raw_env = [f"PERIODIC_JOBS={os.environ.get('PERIODIC_JOBS', '0')}"]
+
+# Do not preload: the app must be imported after the worker has monkey-patched the stdlib
+preload_app = False
+timeout = 30
+graceful_timeout = 30
+accesslog = '-'
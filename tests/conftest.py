@@ -1,24 +1,37 @@
 import pytest
 import tempfile
 import os
+from flask.testing import FlaskClient
 from app import create_app, db
 from app.models import User, Post, Comment, Like
 
+class BufferedClient(FlaskClient):
+    """Test client that drains streamed responses, as a WSGI server would."""
+    
+    def open(self, *args, buffered=True, **kwargs):
+        return super().open(*args, buffered=buffered, **kwargs)
+
 @pytest.fixture
 def app():
     """Create application for testing."""
     # Create a temporary file for the test database
     db_fd, db_path = tempfile.mkstemp()
+    archive_fd, archive_path = tempfile.mkstemp()
     
-    app = create_app()
-    app.config.update({
+    # Pass overrides to create_app so the engine is bound to the temporary database
+    app = create_app({
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'ARCHIVE_DATABASE_URL': f'sqlite:///{archive_path}',
         'SECRET_KEY': 'test-secret-key',
         'WTF_CSRF_ENABLED': False,  # Disable CSRF for testing
-        'UPLOAD_FOLDER': tempfile.mkdtemp()
+        'UPLOAD_FOLDER': tempfile.mkdtemp(),
+        'PASSWORD_HASH_WORKERS': 0,  # Hash inline instead of on a process pool
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'  # Cheap KDF keeps the suite fast
     })
     
+    app.test_client_class = BufferedClient
+    
     with app.app_context():
         db.create_all()
         yield app
@@ -26,6 +39,8 @@ def app():
     
     os.close(db_fd)
     os.unlink(db_path)
+    os.close(archive_fd)
+    os.unlink(archive_path)
 
 @pytest.fixture
 def client(app):
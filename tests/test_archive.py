@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+from app import db
+from app.archive import archive_posts, archived_posts, archived_comments, archived_likes, execute
+from app.models import User, Post, Comment, Like
+
+def add_post(app, user_id, content, days_old=0):
+    with app.app_context():
+        post = Post(content=content, user_id=user_id, created_at=datetime.utcnow() - timedelta(days=days_old))
+        db.session.add(post)
+        db.session.commit()
+        return post.id
+
+def archive_older_than(app, days):
+    with app.app_context():
+        return archive_posts(datetime.utcnow() - timedelta(days=days), batch_size=2)
+
+def archive_count(table):
+    return execute(db.select(db.func.count()).select_from(table)).scalar()
+
+class TestArchive:
+    """Test moving old posts to the archive database and reading them back."""
+
+    def test_moves_old_posts_with_comments_and_likes(self, app, sample_user, second_user):
+        """Test old posts leave the hot tables together with their comments and likes."""
+        old = add_post(app, sample_user, 'Old post', days_old=400)
+        recent = add_post(app, sample_user, 'Recent post')
+        with app.app_context():
+            db.session.add_all([Comment(content='Old comment', user_id=second_user, post_id=old),
+                                Like(user_id=second_user, post_id=old)])
+            db.session.commit()
+
+        assert archive_older_than(app, 365) == 1
+        with app.app_context():
+            assert db.session.get(Post, old) is None
+            assert db.session.get(Post, recent) is not None
+            assert Comment.query.count() == 0 and Like.query.count() == 0
+            assert archive_count(archived_posts) == 1
+            assert archive_count(archived_comments) == 1
+            assert archive_count(archived_likes) == 1
+
+    def test_rerun_after_interruption(self, app, sample_user):
+        """Test a batch copied to the archive but not yet deleted is moved again cleanly."""
+        post_id = add_post(app, sample_user, 'Half moved', days_old=400)
+        with app.app_context():
+            row = dict(db.session.execute(db.select(Post.__table__)).one()._mapping)
+            execute(archived_posts.insert(), [row])
+            db.session.commit()
+        assert archive_older_than(app, 365) == 1
+        with app.app_context():
+            assert archive_count(archived_posts) == 1
+            assert db.session.get(Post, post_id) is None
+
+    def test_archived_ids_not_reused(self, app, client, sample_user, second_user):
+        """Test a post written after archiving gets a new id and never displaces the archived one."""
+        old = add_post(app, sample_user, 'Archived first', days_old=400)
+        with app.app_context():
+            db.session.add(Comment(content='Old thread', user_id=second_user, post_id=old))
+            db.session.commit()
+        archive_older_than(app, 365)
+
+        new = add_post(app, sample_user, 'Written later', days_old=400)
+        assert new > old
+        assert b'Archived first' in client.get(f'/posts/{old}').data
+        assert archive_older_than(app, 365) == 1
+        with app.app_context():
+            assert archive_count(archived_posts) == 2
+            assert archive_count(archived_comments) == 1
+
+    def test_id_taken_in_archive(self, app, sample_user):
+        """Test a hot post whose id belongs to another archived post stays hot."""
+        post_id = add_post(app, sample_user, 'Hot post', days_old=400)
+        with app.app_context():
+            execute(archived_posts.insert(), [{'id': post_id, 'content': 'Someone else', 'user_id': sample_user,
+                                               'created_at': datetime(2000, 1, 1), 'comments_count': 0}])
+            db.session.commit()
+        assert archive_older_than(app, 365) == 0
+        with app.app_context():
+            assert db.session.get(Post, post_id) is not None
+            assert execute(db.select(archived_posts.c.content)).scalar() == 'Someone else'
+
+    def test_post_detail_falls_back(self, app, logged_in_user, sample_user, second_user):
+        """Test an archived post still renders, read-only, at its old URL."""
+        post_id = add_post(app, sample_user, 'Archived content', days_old=400)
+        with app.app_context():
+            db.session.add_all([Comment(content='Archived comment', user_id=second_user, post_id=post_id),
+                                Like(user_id=second_user, post_id=post_id)])
+            db.session.commit()
+        archive_older_than(app, 365)
+
+        response = logged_in_user.get(f'/posts/{post_id}')
+        assert response.status_code == 200
+        assert b'Archived content' in response.data
+        assert b'Archived comment' in response.data
+        assert b'This post is archived' in response.data
+        assert b'like-btn' not in response.data
+        assert logged_in_user.post(f'/posts/{post_id}/like').status_code == 404
+
+        data = logged_in_user.get(f'/posts/{post_id}/comments').get_json()
+        assert 'Archived comment' in data['html']
+
+    def test_profile_pages_into_archive(self, app, client, sample_user):
+        """Test profile pagination continues from hot posts into archived ones."""
+        app.config['POSTS_PER_PAGE'] = 2
+        for i in range(3):
+            add_post(app, sample_user, f'Ancient {i}', days_old=400 + i)
+        for i in range(3):
+            add_post(app, sample_user, f'Fresh {i}')
+        archive_older_than(app, 365)
+
+        first = client.get('/users/testuser')
+        assert b'6 posts' in first.data
+        second = client.get('/users/testuser?page=2')
+        assert b'Fresh 0' in second.data and b'Ancient 0' in second.data
+        third = client.get('/users/testuser?page=3')
+        assert b'Ancient 1' in third.data and b'Ancient 2' in third.data
+
+    def test_owner_can_delete_archived_post(self, app, logged_in_user, sample_user):
+        """Test deleting an archived post removes it from the archive."""
+        post_id = add_post(app, sample_user, 'Delete me later', days_old=400)
+        archive_older_than(app, 365)
+        logged_in_user.post(f'/posts/{post_id}/delete')
+        with app.app_context():
+            assert archive_count(archived_posts) == 0
+        assert logged_in_user.get(f'/posts/{post_id}').status_code == 404
+
+    def test_user_delete_purges_archive(self, app, sample_user, second_user):
+        """Test a deleted user's archived posts, comments and likes go too."""
+        add_post(app, second_user, 'Their old post', days_old=400)
+        mine = add_post(app, sample_user, 'My old post', days_old=400)
+        with app.app_context():
+            db.session.add_all([Comment(content='Their comment', user_id=second_user, post_id=mine),
+                                Like(user_id=second_user, post_id=mine)])
+            db.session.commit()
+        archive_older_than(app, 365)
+        with app.app_context():
+            db.session.delete(db.session.get(User, second_user))
+            db.session.commit()
+            assert archive_count(archived_posts) == 1
+            assert archive_count(archived_comments) == 0
+            assert archive_count(archived_likes) == 0
+            assert execute(db.select(archived_posts.c.comments_count).where(
+                archived_posts.c.id == mine)).scalar() == 0
+
+    def test_cli(self, app, runner, sample_user):
+        """Test the archive command moves old posts."""
+        add_post(app, sample_user, 'Old post', days_old=40)
+        result = runner.invoke(args=['archive', 'run', '--days', '30', '--vacuum'])
+        assert result.exit_code == 0
+        assert 'Archived 1 posts older than 30 days.' in result.output
+        assert runner.invoke(args=['archive', 'run']).exit_code != 0
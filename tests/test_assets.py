@@ -0,0 +1,74 @@
+import pytest
+import gzip
+import os
+import shutil
+from app.assets import build, minify_css, minify_js, load_manifest, DIST_DIR
+
+@pytest.fixture
+def built(app):
+    """Build the real static folder and clean the output afterwards."""
+    manifest = build(app.static_folder)
+    yield manifest
+    shutil.rmtree(os.path.join(app.static_folder, DIST_DIR), ignore_errors=True)
+
+class TestAssets:
+    """Test the static asset pipeline and response compression."""
+    
+    def test_minify_css(self):
+        """Test comments and whitespace are stripped from CSS."""
+        assert minify_css('/* c */\n.a > .b {\n  color: red;\n}\n') == '.a > .b{color:red}'
+    
+    def test_minify_css_keeps_selector_spaces(self):
+        """Test a descendant pseudo-class selector and quoted values survive minification."""
+        source = 'div :first-child ,  p a:hover {\n  content: "a ;  b" ;\n}\n@media (max-width: 600px) {\n  .x :last-child { margin : 0 }\n}\n'
+        assert minify_css(source) == ('div :first-child,p a:hover{content:"a ;  b"}'
+                                      '@media (max-width:600px){.x :last-child{margin:0}}')
+    
+    def test_minify_js_keeps_template_literals(self):
+        """Test indentation inside multi-line template literals survives."""
+        source = "// comment\nfunction f() {\n    return `\n    <div>\n    `;\n}\n"
+        assert minify_js(source) == "function f() {\nreturn `\n    <div>\n    `;\n}\n"
+    
+    def test_build_fingerprints_and_precompresses(self, app, built):
+        """Test the build writes hashed files, gzip variants and a manifest."""
+        assert built == load_manifest(app.static_folder)
+        target = built['css/style.css']
+        assert target.startswith('css/style.') and target.endswith('.css')
+        path = os.path.join(app.static_folder, DIST_DIR, target)
+        with open(path, 'rb') as f, gzip.open(path + '.gz') as gz:
+            assert gz.read() == f.read()
+    
+    def test_precompressed_asset_served_with_far_future_cache(self, app, client, built):
+        """Test dist files are served precompressed and cached forever."""
+        url = f"/static/{DIST_DIR}/{built['js/main.js']}"
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.mimetype == 'text/javascript'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert b'EventSource' in gzip.decompress(response.data)
+        
+        plain = client.get(url)
+        assert 'Content-Encoding' not in plain.headers
+        assert b'EventSource' in plain.data
+    
+    def test_html_compressed_on_the_fly(self, client):
+        """Test HTML pages are gzipped when the client accepts it."""
+        response = client.get('/explore', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert b'Explore' in gzip.decompress(response.data)
+        assert 'Content-Encoding' not in client.get('/explore').headers
+    
+    def test_streamed_responses_not_compressed(self, app, client, sample_post):
+        """Test the SSE stream is never buffered for compression."""
+        app.config['SSE_MAX_SECONDS'] = 0
+        response = client.get(f'/posts/stream?ids={sample_post}', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+    
+    def test_vendor_local(self, app, client):
+        """Test ASSETS_VENDOR=local points templates at self-hosted copies."""
+        app.config['ASSETS_VENDOR'] = 'local'
+        response = client.get('/explore')
+        assert b'/static/vendor/jquery-3.6.0/jquery.min.js' in response.data
+        assert b'code.jquery.com' not in response.data
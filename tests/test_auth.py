@@ -144,3 +144,40 @@ class TestAuth:
             })
             
             assert response.status_code == 302
+    
+    def test_login_upgrades_password_hash(self, app, client, sample_user):
+        """Test a hash made with old KDF parameters is replaced on login."""
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            assert not user.password_needs_rehash()
+            stamp = user.security_stamp
+            app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+            assert user.password_needs_rehash()
+        
+        response = client.post('/auth/login', data={'username': 'testuser', 'password': 'testpassword'})
+        assert response.status_code == 302
+        
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+            assert user.check_password('testpassword')
+            # Same password, so sessions on other devices are not signed out
+            assert user.security_stamp == stamp
+    
+    def test_short_method_names_match_their_hashes(self, app):
+        """Test configured shorthands like 'scrypt' do not force a rehash on every login."""
+        for method in ('scrypt', 'pbkdf2', 'pbkdf2:sha256', 'pbkdf2:sha256:1000'):
+            app.config['PASSWORD_HASH_METHOD'] = method
+            with app.app_context():
+                user = User(username='hashuser', email='hash@example.com')
+                user.set_password('secret123')
+                assert not user.password_needs_rehash(), method
+    
+    def test_hashing_on_process_pool(self, app):
+        """Test hashing and verification through the worker pool."""
+        app.config['PASSWORD_HASH_WORKERS'] = 1
+        with app.app_context():
+            user = User(username='pooluser', email='pool@example.com')
+            user.set_password('secret123')
+            assert user.check_password('secret123')
+            assert not user.check_password('wrong')
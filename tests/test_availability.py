@@ -0,0 +1,75 @@
+import pytest
+from app import db
+from app.availability import BloomFilter, current_filters, is_taken
+from app.models import User
+
+class TestBloomFilter:
+    """Test the probabilistic membership filter."""
+    
+    def test_no_false_negatives(self):
+        """Test every added item is reported present."""
+        bloom = BloomFilter(1000)
+        names = [f'user{i}' for i in range(1000)]
+        for name in names:
+            bloom.add(name)
+        assert all(name in bloom for name in names)
+    
+    def test_false_positive_rate(self):
+        """Test the miss rate stays near the configured error rate at capacity."""
+        bloom = BloomFilter(2000, error_rate=0.01)
+        for i in range(2000):
+            bloom.add(f'taken{i}')
+        false_positives = sum(f'free{i}' in bloom for i in range(10000))
+        assert false_positives < 300
+
+class TestAvailability:
+    """Test availability checks backed by the filters."""
+    
+    def test_new_users_enter_the_filter(self, app, sample_user):
+        """Test inserts and renames are added without a rebuild."""
+        with app.app_context():
+            filters = current_filters()
+            assert filters.might_exist('username', 'testuser')
+            assert filters.might_exist('email', 'test@example.com')
+            user = db.session.get(User, sample_user)
+            user.username = 'renamed'
+            db.session.commit()
+            assert filters.might_exist('username', 'renamed')
+    
+    def test_definitely_free_skips_database(self, app, sample_user, monkeypatch):
+        """Test a filter miss answers without a query."""
+        with app.app_context():
+            statements = []
+            monkeypatch.setattr(db.session, 'query', lambda *a: statements.append(a))
+            assert not is_taken('username', 'nobody-has-this')
+            assert statements == []
+    
+    def test_available_endpoint(self, client, sample_user):
+        """Test the JSON endpoint for taken, free and missing values."""
+        assert client.get('/auth/available?username=testuser').get_json()['available'] is False
+        data = client.get('/auth/available?email=fresh@example.com').get_json()
+        assert data == {'field': 'email', 'value': 'fresh@example.com', 'available': True}
+        assert client.get('/auth/available').status_code == 400
+    
+    def test_available_endpoint_throttled_per_ip(self, app, client, logged_in_user):
+        """Test lookups share one budget per address, signed in or not."""
+        capacity = int(app.config['READ_RATELIMITS']['auth.available'].split('/')[0])
+        for i in range(capacity):
+            assert client.get(f'/auth/available?email=probe{i}@example.com').status_code == 200
+        response = logged_in_user.get('/auth/available?email=probe@example.com')
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+    
+    def test_register_race_reports_field(self, app, client, sample_user):
+        """Test a unique violation the filter missed becomes a form error."""
+        with app.app_context():
+            # Simulate a filter that has not seen the existing user (e.g. another worker's signup)
+            filters = current_filters()
+            filters.filters['username'].bits[:] = bytes(len(filters.filters['username'].bits))
+        response = client.post('/auth/register', data={
+            'username': 'testuser', 'email': 'other@example.com',
+            'password': 'password123', 'password2': 'password123'})
+        assert response.status_code == 200
+        assert b'Username already taken' in response.data
+        with app.app_context():
+            assert User.query.count() == 1
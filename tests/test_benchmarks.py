@@ -0,0 +1,34 @@
+import pytest
+from app import db
+from app.models import User, Post, Comment, Like, followers
+from benchmarks import datagen
+
+class TestDatagen:
+    """Test the synthetic data generator used by the benchmarks."""
+    
+    def test_generate_small_graph(self, app):
+        """Test generated rows are consistent with the reported counts."""
+        with app.app_context():
+            counts = datagen.generate(users=60, posts_per_user=3, follows_per_user=5, seed=7)
+            
+            assert User.query.count() == counts['user'] == 60
+            assert Post.query.count() == counts['post']
+            assert Comment.query.count() == counts['comment']
+            assert Like.query.count() == counts['like']
+            stored = db.session.query(db.func.sum(Post.comments_count)).scalar() or 0
+            assert stored == counts['comment']
+            
+            self_follows = db.session.execute(db.select(db.func.count()).select_from(followers).where(
+                followers.c.follower_id == followers.c.followed_id)).scalar()
+            assert self_follows == 0
+            assert User.query.get(1).check_password(datagen.BENCH_PASSWORD)
+    
+    def test_popularity_is_skewed(self, app):
+        """Test the most popular account collects far more followers than the median."""
+        with app.app_context():
+            datagen.generate(users=300, posts_per_user=0, follows_per_user=10, seed=1)
+            degrees = sorted(
+                (count for _, count in db.session.query(
+                    followers.c.followed_id, db.func.count()).group_by(followers.c.followed_id)),
+                reverse=True)
+            assert degrees[0] > 10 * degrees[len(degrees) // 2]
@@ -0,0 +1,58 @@
+import pytest
+import json
+from app import db
+from app.models import Post, Like
+from app.events import EventBus, bus
+
+class TestEvents:
+    """Test the count event bus and the SSE stream."""
+    
+    def test_bus_coalesces_updates(self):
+        """Test a subscriber only keeps the latest payload per post."""
+        events = EventBus()
+        subscription = events.subscribe([1, 2])
+        events.publish(1, {'post_id': 1, 'like_count': 1})
+        events.publish(1, {'post_id': 1, 'like_count': 2})
+        events.publish(3, {'post_id': 3, 'like_count': 9})
+        assert subscription.wait(0) == [{'post_id': 1, 'like_count': 2}]
+        assert subscription.wait(0) == []
+        
+        subscription.close()
+        subscription.close()
+        assert events.subscriber_count() == 0
+    
+    def test_bus_connection_limit(self):
+        """Test subscribe refuses new listeners past the limit."""
+        events = EventBus()
+        assert events.subscribe([1], limit=1) is not None
+        assert events.subscribe([1], limit=1) is None
+    
+    def test_like_publishes_counts(self, app, logged_in_user, sample_post):
+        """Test toggling a like pushes new counts to subscribers."""
+        subscription = bus.subscribe([sample_post])
+        try:
+            logged_in_user.post(f'/posts/{sample_post}/like', headers={'Content-Type': 'application/json'})
+            assert subscription.wait(0) == [{'post_id': sample_post, 'like_count': 1, 'comment_count': 0}]
+        finally:
+            subscription.close()
+    
+    def test_stream_sends_snapshot(self, app, client, sample_post, sample_user):
+        """Test the stream starts with the current counts."""
+        with app.app_context():
+            db.session.add(Like(user_id=sample_user, post_id=sample_post))
+            db.session.commit()
+        app.config['SSE_MAX_SECONDS'] = 0
+        
+        response = client.get(f'/posts/stream?ids={sample_post},99999')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = [chunk for chunk in response.get_data(as_text=True).split('\n\n') if chunk.startswith('event:')]
+        assert len(events) == 1
+        payload = json.loads(events[0].split('data: ', 1)[1])
+        assert payload == {'post_id': sample_post, 'like_count': 1, 'comment_count': 0}
+        assert bus.subscriber_count() == 0
+    
+    def test_stream_rejects_bad_ids(self, client):
+        """Test the stream validates the id list."""
+        assert client.get('/posts/stream').status_code == 400
+        assert client.get('/posts/stream?ids=a,b').status_code == 400
@@ -0,0 +1,133 @@
+import pytest
+from array import array
+from app import db, graph as graph_module
+from app.graph import CSR, FollowGraph, GraphSnapshot, load_csr
+from app.models import User, followers
+
+@pytest.fixture
+def indexed(app):
+    """Enable the follower index on the test app."""
+    app.config['GRAPH_INDEX'] = True
+    graph_module.init_app(app)
+    yield app.extensions['follow_graph']
+    app.extensions.pop('follow_graph')
+
+def make_users(n):
+    users = [User(username=f'g{i}', email=f'g{i}@example.com', password_hash='x') for i in range(n)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+class TestCSR:
+    """Test the compressed sparse row arrays."""
+    
+    def test_membership_degree_and_transpose(self):
+        """Test lookups and the reversed graph on a small hand-built CSR."""
+        # 0 -> 1, 2; 1 -> 2; 2 -> (none)
+        csr = CSR(array('q', [0, 2, 3, 3]), array('i', [1, 2, 2]))
+        assert csr.contains(0, 2) and not csr.contains(1, 0)
+        assert not csr.contains(7, 1)
+        assert csr.degree(0) == 2 and csr.degree(2) == 0 and csr.degree(99) == 0
+        reverse = csr.transpose()
+        assert list(reverse.neighbors(2)) == [0, 1]
+        assert list(reverse.neighbors(0)) == []
+        assert csr.nbytes() == 8 * 4 + 4 * 3
+
+class TestFollowGraph:
+    """Test the index against the followers table."""
+    
+    def test_loads_existing_edges(self, app):
+        """Test the startup load matches the database."""
+        with app.app_context():
+            a, b, c = make_users(3)
+            a.follow(b)
+            a.follow(c)
+            c.follow(b)
+            db.session.commit()
+            graph = FollowGraph()
+            graph.reload()
+            assert graph.is_following(a.id, b.id) and not graph.is_following(b.id, a.id)
+            assert graph.follower_count(b.id) == 2
+            assert graph.following_count(a.id) == 2
+            assert graph.followers(b.id) == [a.id, c.id]
+            assert graph.edge_count() == 3
+    
+    def test_load_sizes_from_the_scan(self, app):
+        """Test edges of users above any earlier max(id) still fit in the arrays."""
+        with app.app_context():
+            with db.engine.connect() as connection:
+                # Stand-in for users created while the scan runs: edges with no user rows yet
+                connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+                connection.execute(followers.insert(), [{'follower_id': 40, 'followed_id': 41},
+                                                        {'follower_id': 2, 'followed_id': 40}])
+                out = load_csr(connection)
+                connection.rollback()
+                connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+        assert out.contains(40, 41) and out.contains(2, 40)
+        assert list(out.transpose().neighbors(41)) == [40]
+    
+    def test_readers_keep_their_snapshot(self):
+        """Test a snapshot taken before a change is not modified by it."""
+        graph = FollowGraph()
+        graph.apply([('follow', 1, 2)])
+        before = graph.snapshot()
+        graph.apply([('follow', 1, 3), ('unfollow', 1, 2)])
+        assert before.following(1) == [2] and before.following_count(1) == 1
+        assert graph.following(1) == [3]
+    
+    def test_overlay_is_idempotent(self):
+        """Test repeated and replayed changes do not skew counts."""
+        graph = FollowGraph()
+        graph.apply([('follow', 1, 2), ('follow', 1, 2), ('follow', 3, 2)])
+        assert graph.follower_count(2) == 2
+        graph.apply([('unfollow', 1, 2), ('unfollow', 1, 2)])
+        assert graph.follower_count(2) == 1 and graph.following_count(1) == 0
+        graph.apply([('drop', 2, None)])
+        assert graph.follower_count(2) == 0 and graph.following_count(3) == 0
+    
+    def test_committed_changes_update_index(self, app, indexed):
+        """Test follow/unfollow reach the index only once committed."""
+        with app.app_context():
+            a, b = make_users(2)
+            a.follow(b)
+            db.session.flush()
+            assert not indexed.is_following(a.id, b.id)
+            db.session.commit()
+            assert a.is_following(b) and b.follower_count() == 1
+            
+            a.unfollow(b)
+            db.session.rollback()
+            assert a.is_following(b)
+            
+            a.unfollow(b)
+            db.session.commit()
+            assert not a.is_following(b) and b.follower_count() == 0
+    
+    def test_user_delete_drops_edges(self, app, indexed):
+        """Test deleting a user clears the edges ON DELETE CASCADE removed."""
+        with app.app_context():
+            a, b, c = make_users(3)
+            a.follow(b)
+            b.follow(c)
+            db.session.commit()
+            db.session.delete(b)
+            db.session.commit()
+            assert a.following_count() == 0 and c.follower_count() == 0
+    
+    def test_reload_replays_concurrent_changes(self, app, indexed):
+        """Test changes journaled during a reload survive the swap."""
+        with app.app_context():
+            a, b = make_users(2)
+            with db.engine.connect() as connection:
+                out = load_csr(connection)
+            indexed._journal = []
+            indexed.apply([('follow', a.id, b.id)])
+            journal, indexed._journal = indexed._journal, None
+            indexed._snapshot = GraphSnapshot(out, out.transpose()).with_changes(journal)
+            assert indexed.is_following(a.id, b.id)
+    
+    def test_follow_route_uses_index(self, app, indexed, logged_in_user, sample_user, second_user):
+        """Test the follow endpoint reports the indexed follower count."""
+        response = logged_in_user.post('/users/follow/seconduser', headers={'Content-Type': 'application/json'})
+        assert response.get_json() == {'following': True, 'follower_count': 1}
+        assert indexed.is_following(sample_user, second_user)
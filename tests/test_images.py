@@ -0,0 +1,64 @@
+import pytest
+import io
+import threading
+from PIL import Image
+from app.images import MemoryBudget, ImageRejected, save_thumbnail
+
+def image_bytes(size, fmt='JPEG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+class TestImages:
+    """Test bounded decoding of uploaded images."""
+    
+    def test_thumbnail_written(self, tmp_path):
+        """Test a large JPEG is shrunk to fit the box."""
+        path = str(tmp_path / 'out.jpg')
+        save_thumbnail(image_bytes((3000, 2000)), path, (800, 800), max_pixels=10_000_000)
+        with Image.open(path) as img:
+            assert img.size == (800, 533)
+        assert not (tmp_path / 'out.jpg.part').exists()
+    
+    def test_rgba_saved_as_jpeg(self, tmp_path):
+        """Test images with alpha are flattened for JPEG output."""
+        path = str(tmp_path / 'out.jpg')
+        save_thumbnail(image_bytes((400, 400), 'PNG', 'RGBA'), path, (200, 200), max_pixels=10_000_000)
+        with Image.open(path) as img:
+            assert img.mode == 'RGB'
+    
+    def test_pixel_cap(self, tmp_path):
+        """Test oversized dimensions are refused before decoding."""
+        with pytest.raises(ImageRejected, match='megapixels'):
+            save_thumbnail(image_bytes((3000, 2000)), str(tmp_path / 'out.jpg'), (800, 800),
+                           max_pixels=5_000_000)
+    
+    def test_not_an_image(self, tmp_path):
+        """Test arbitrary bytes are rejected."""
+        with pytest.raises(ImageRejected):
+            save_thumbnail(io.BytesIO(b'not an image'), str(tmp_path / 'out.jpg'), (800, 800),
+                           max_pixels=5_000_000)
+    
+    def test_budget_blocks_until_released(self):
+        """Test reservations wait for room and time out when none frees up."""
+        budget = MemoryBudget(100)
+        first = budget.acquire(80)
+        assert budget.acquire(30, timeout=0.01) is None
+        assert budget.acquire(500, timeout=0.01) is None
+        
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(budget.acquire(30, timeout=5)))
+        waiter.start()
+        budget.release(first)
+        waiter.join()
+        assert acquired == [30] and budget.in_use == 30
+    
+    def test_create_post_rejects_bad_image(self, app, logged_in_user):
+        """Test an unreadable upload re-renders the form with a message."""
+        response = logged_in_user.post('/posts/create', data={
+            'content': 'With a broken image',
+            'image': (io.BytesIO(b'definitely not a jpeg'), 'broken.jpg'),
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert b'not an image we can read' in response.data
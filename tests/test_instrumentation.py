@@ -0,0 +1,54 @@
+import pytest
+import json
+import logging
+
+class TestInstrumentation:
+    """Test per-request query and template instrumentation."""
+    
+    def test_server_timing_when_sampled(self, app, client, sample_post):
+        """Test sampled requests carry a Server-Timing header."""
+        app.config.update(INSTRUMENTATION_SAMPLE_RATE=1.0, STREAM_TEMPLATES=False)
+        response = client.get(f'/posts/{sample_post}')
+        timing = response.headers['Server-Timing']
+        assert timing.startswith('db;dur=')
+        assert 'tpl;dur=' in timing and 'total;dur=' in timing
+        queries = int(timing.split('desc="')[1].split(' ')[0])
+        assert queries > 0
+    
+    def test_streamed_page_logged_after_body(self, app, client, sample_post, caplog):
+        """Test a streamed page is logged once sent, counting the queries its body ran."""
+        app.config['INSTRUMENTATION_SAMPLE_RATE'] = 1.0
+        with caplog.at_level(logging.INFO, logger='app.instrumentation'):
+            response = client.get(f'/posts/{sample_post}', buffered=False)
+            assert response.is_streamed and 'Server-Timing' not in response.headers
+            assert not caplog.records
+            response.get_data()
+            response.close()
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record['endpoint'] == 'posts.post_detail'
+        assert record['queries'] >= 1 and record['template_ms'] > 0
+    
+    def test_unsampled_requests_are_untouched(self, app, client):
+        """Test a zero sample rate adds nothing."""
+        app.config['INSTRUMENTATION_SAMPLE_RATE'] = 0.0
+        response = client.get('/explore')
+        assert 'Server-Timing' not in response.headers
+    
+    def test_structured_log_line(self, app, client, caplog):
+        """Test each sampled request logs one JSON line."""
+        app.config['INSTRUMENTATION_SAMPLE_RATE'] = 1.0
+        with caplog.at_level(logging.INFO, logger='app.instrumentation'):
+            client.get('/explore')
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record['endpoint'] == 'main.explore'
+        assert record['status'] == 200
+        assert record['queries'] >= 1
+        assert record['slowest_sql']
+    
+    def test_debug_panel(self, app, logged_in_user):
+        """Test the debug panel is injected into HTML pages for ADMINS only."""
+        app.config.update(INSTRUMENTATION_SAMPLE_RATE=1.0, INSTRUMENTATION_DEBUG_PANEL=True, ADMINS=set())
+        assert b'id="request-stats"' not in logged_in_user.get('/explore').data
+        
+        app.config['ADMINS'] = {'testuser'}
+        assert b'id="request-stats"' in logged_in_user.get('/explore').data
@@ -162,3 +162,60 @@ class TestMain:
         """Test 404 error handling."""
         response = client.get('/nonexistent-page')
         assert response.status_code == 404
+
+class TestNewPosts:
+    """Test the "new posts since" polling endpoints."""
+    
+    def add_post(self, app, user_id, content):
+        with app.app_context():
+            post = Post(content=content, user_id=user_id)
+            db.session.add(post)
+            db.session.commit()
+            return post.id
+    
+    def test_index_renders_cursor(self, logged_in_user, sample_post):
+        """Test the first feed page carries the newest post id for polling."""
+        response = logged_in_user.get('/')
+        assert f'data-since="{sample_post}"'.encode() in response.data
+        response = logged_in_user.get('/?page=2')
+        assert b'new-posts-banner' not in response.data
+    
+    def test_count_only_followed(self, app, logged_in_user, sample_post, second_user):
+        """Test only posts that would appear in the viewer's feed are counted."""
+        self.add_post(app, second_user, 'Not followed')
+        response = logged_in_user.get(f'/feed/new?since={sample_post}')
+        assert response.get_json() == {'count': 0, 'more': False}
+        
+        with app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            user.follow(db.session.get(User, second_user))
+            db.session.commit()
+        self.add_post(app, second_user, 'Followed')
+        response = logged_in_user.get(f'/feed/new?since={sample_post}')
+        assert response.get_json()['count'] == 2
+        assert response.headers['Cache-Control'] == 'no-store'
+    
+    def test_count_capped(self, app, client, sample_user):
+        """Test the count stops at FEED_NEW_MAX and reports there are more."""
+        app.config['FEED_NEW_MAX'] = 3
+        for i in range(5):
+            self.add_post(app, sample_user, f'Post {i}')
+        data = client.get('/feed/new?since=0').get_json()
+        assert data == {'count': 3, 'more': True}
+    
+    def test_delta_returns_only_new_posts(self, app, logged_in_user, sample_user, sample_post):
+        """Test the delta endpoint renders just the posts after the cursor."""
+        newer = self.add_post(app, sample_user, 'A brand new post')
+        data = logged_in_user.get(f'/feed/since?since={sample_post}').get_json()
+        assert 'A brand new post' in data['html']
+        assert 'This is a test post' not in data['html']
+        assert data['since'] == newer
+        
+        data = logged_in_user.get(f'/feed/since?since={newer}').get_json()
+        assert data['html'].strip() == ''
+        assert data['since'] == newer
+    
+    def test_cursor_required(self, client):
+        """Test both endpoints reject a missing or malformed cursor."""
+        assert client.get('/feed/new').status_code == 400
+        assert client.get('/feed/since?since=abc').status_code == 400
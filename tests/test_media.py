@@ -0,0 +1,62 @@
+import pytest
+import os
+from app.media import media_root
+
+AVATAR = '/media/avatars/default_avatar.png'
+
+class TestMedia:
+    """Test serving uploaded images through the media route."""
+    
+    def test_serves_file_with_cache_headers(self, app, client):
+        """Test direct mode returns the file with validators and caching."""
+        with open(os.path.join(media_root(app), 'avatars', 'default_avatar.png'), 'rb') as f:
+            expected = f.read()
+        response = client.get(AVATAR)
+        assert response.status_code == 200
+        assert response.mimetype == 'image/png'
+        assert response.data == expected
+        assert response.headers['ETag']
+        assert 'public' in response.headers['Cache-Control']
+    
+    def test_range_request(self, client):
+        """Test a byte range returns 206 with only the requested bytes."""
+        full = client.get(AVATAR).data
+        response = client.get(AVATAR, headers={'Range': 'bytes=0-7'})
+        assert response.status_code == 206
+        assert response.data == full[:8]
+        assert response.headers['Content-Range'] == f'bytes 0-7/{len(full)}'
+    
+    def test_conditional_request(self, client):
+        """Test a matching If-None-Match returns 304."""
+        etag = client.get(AVATAR).headers['ETag']
+        response = client.get(AVATAR, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+    
+    def test_missing_and_traversal(self, client):
+        """Test unknown kinds, missing files and traversal are 404s."""
+        assert client.get('/media/other/default_avatar.png').status_code == 404
+        assert client.get('/media/avatars/missing.png').status_code == 404
+        assert client.get('/media/avatars/../../__init__.py').status_code == 404
+    
+    def test_x_accel_mode(self, app, client):
+        """Test x-accel mode hands the file to the proxy without a body."""
+        app.config['MEDIA_SEND_MODE'] = 'x-accel'
+        response = client.get(AVATAR)
+        assert response.status_code == 200
+        assert response.headers['X-Accel-Redirect'] == '/protected-media/avatars/default_avatar.png'
+        assert response.mimetype == 'image/png'
+        assert response.data == b''
+        assert client.get('/media/avatars/missing.png').status_code == 404
+    
+    def test_x_sendfile_mode(self, app, client):
+        """Test x-sendfile mode emits the absolute path for the web server."""
+        app.config['USE_X_SENDFILE'] = True
+        response = client.get(AVATAR)
+        assert response.headers['X-Sendfile'] == os.path.join(media_root(app), 'avatars', 'default_avatar.png')
+    
+    def test_templates_use_media_url(self, app, client, sample_user):
+        """Test rendered pages link avatars through the media route."""
+        response = client.get('/users/testuser')
+        assert b'/media/avatars/' in response.data
+        assert b'/static/uploads/' not in response.data
@@ -0,0 +1,86 @@
+import pytest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from app.metrics import MetricsRegistry, render, metrics
+
+def sample_line(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+class TestMetrics:
+    """Test the /metrics endpoint and the file-backed registry."""
+    
+    def test_metrics_endpoint(self, app, client):
+        """Test requests are counted and timed per endpoint and status."""
+        client.get('/explore')
+        client.get('/explore')
+        client.get('/posts/99999')
+        
+        text = client.get('/metrics').get_data(as_text=True)
+        assert '# TYPE http_requests_total counter' in text
+        assert sample_line(text, 'http_requests_total{endpoint="main.explore",method="GET",status="200"}')
+        assert sample_line(text, 'http_request_duration_seconds_bucket{endpoint="posts.post_detail",status="404",le="+Inf"}')
+        assert sample_line(text, 'background_tasks_pending{pid=')
+        assert 'endpoint="metrics"' not in text
+    
+    def test_scrape_restricted(self, app, client):
+        """Test /metrics needs a private address, or the bearer token once one is set."""
+        public = {'REMOTE_ADDR': '93.184.216.34'}
+        assert client.get('/metrics', environ_base=public).status_code == 403
+        
+        app.config['METRICS_TOKEN'] = 'secret'
+        assert client.get('/metrics').status_code == 403
+        response = client.get('/metrics', environ_base=public, headers={'Authorization': 'Bearer secret'})
+        assert response.status_code == 200
+    
+    def test_streamed_response_timed_until_closed(self, client, sample_post):
+        """Test a streamed page is counted once its body has been sent."""
+        key = ('http_requests_total', (('endpoint', 'posts.post_detail'), ('method', 'GET'), ('status', 200)))
+        before = metrics.counters.get(key, 0)
+        response = client.get(f'/posts/{sample_post}', buffered=False)
+        assert metrics.counters.get(key, 0) == before
+        response.get_data()
+        response.close()
+        assert metrics.counters[key] == before + 1
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket counts render cumulatively with sum and count."""
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            registry.observe('latency_seconds', value, endpoint='x')
+        text = render([registry.snapshot()])
+        assert 'latency_seconds_bucket{endpoint="x",le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="1.0"} 3' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="+Inf"} 4' in text
+        assert 'latency_seconds_count{endpoint="x"} 4' in text
+    
+    def test_workers_are_merged_through_files(self):
+        """Test snapshots written by several workers are summed on scrape."""
+        directory = tempfile.mkdtemp()
+        first, second = MetricsRegistry(), MetricsRegistry()
+        first.inc('jobs_total', 2, kind='a')
+        second.inc('jobs_total', 3, kind='a')
+        second.flush(directory)
+        # Pretend the second snapshot came from another process
+        os.rename(os.path.join(directory, f'metrics-{os.getpid()}.json'),
+                  os.path.join(directory, 'metrics-1.json'))
+        
+        text = render(first.collect(directory))
+        assert 'jobs_total{kind="a"} 5' in text
+    
+    def test_dead_worker_files_removed(self):
+        """Test a snapshot left by an exited worker is dropped and deleted."""
+        directory = tempfile.mkdtemp()
+        registry = MetricsRegistry()
+        registry.inc('jobs_total', 2, kind='a')
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        dead = os.path.join(directory, f'metrics-{child.pid}.json')
+        with open(dead, 'w') as f:
+            json.dump({**registry.snapshot(), 'pid': child.pid}, f)
+        
+        text = render(MetricsRegistry().collect(directory))
+        assert 'jobs_total' not in text
+        assert not os.path.exists(dead)
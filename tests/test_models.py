@@ -0,0 +1,36 @@
+import pytest
+from app import db
+from app.models import User, Post, Comment, Like, followers
+
+class TestModels:
+    """Test model behaviour that spans several tables."""
+    
+    def test_delete_user_cascades(self, app, sample_user, second_user, sample_post):
+        """Test deleting a user removes their rows and settles comment counters."""
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            other = db.session.get(User, second_user)
+            other_post = Post(content='Other post', author=other)
+            db.session.add(other_post)
+            other.follow(user)
+            db.session.flush()
+            db.session.add_all([
+                Comment(content='On other post', user_id=sample_user, post_id=other_post.id),
+                Comment(content='Reply', user_id=second_user, post_id=other_post.id),
+                Like(user_id=sample_user, post_id=other_post.id),
+            ])
+            db.session.commit()
+            other_post_id = other_post.id
+            assert other_post.comment_count() == 2
+            
+            db.session.delete(user)
+            db.session.commit()
+            db.session.expunge_all()
+            
+            assert db.session.get(Post, sample_post) is None
+            assert Comment.query.filter_by(user_id=sample_user).count() == 0
+            assert Like.query.filter_by(user_id=sample_user).count() == 0
+            assert db.session.execute(
+                db.select(db.func.count()).select_from(followers).where(
+                    followers.c.followed_id == sample_user)).scalar() == 0
+            assert db.session.get(Post, other_post_id).comment_count() == 1
@@ -193,3 +193,67 @@ class TestPosts:
         """Test deleting nonexistent post."""
         response = logged_in_user.post('/posts/99999/delete')
         assert response.status_code == 404
+    
+    def test_comment_count_is_stored(self, app, sample_post, sample_user):
+        """Test the stored comment counter follows inserts and deletes."""
+        with app.app_context():
+            post = db.session.get(Post, sample_post)
+            comments = [Comment(content=f'Comment {i}', user_id=sample_user, post=post) for i in range(3)]
+            db.session.add_all(comments)
+            db.session.commit()
+            assert db.session.get(Post, sample_post).comments_count == 3
+            
+            db.session.delete(comments[0])
+            db.session.commit()
+            assert db.session.get(Post, sample_post).comment_count() == 2
+    
+    def test_post_detail_paginates_comments(self, app, client, sample_post, sample_user):
+        """Test post detail only renders the first page of comments."""
+        with app.app_context():
+            app.config['COMMENTS_PER_PAGE'] = 5
+            for i in range(12):
+                db.session.add(Comment(content=f'Paged comment {i:02d}', user_id=sample_user, post_id=sample_post))
+            db.session.commit()
+        
+        response = client.get(f'/posts/{sample_post}')
+        assert response.status_code == 200
+        assert b'Paged comment 11' in response.data
+        assert b'Paged comment 06' not in response.data
+        assert b'Load more comments' in response.data
+    
+    def test_more_comments_keyset_pages(self, app, client, sample_post, sample_user):
+        """Test the comments endpoint walks every comment exactly once."""
+        with app.app_context():
+            app.config['COMMENTS_PER_PAGE'] = 5
+            for i in range(12):
+                db.session.add(Comment(content=f'Paged comment {i:02d}', user_id=sample_user, post_id=sample_post))
+            db.session.commit()
+        
+        seen = []
+        cursor = None
+        while True:
+            query = f'?before={cursor}' if cursor else ''
+            data = json.loads(client.get(f'/posts/{sample_post}/comments{query}').data)
+            seen.extend(i for i in range(12) if f'Paged comment {i:02d}' in data['html'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        
+        assert sorted(seen) == list(range(12))
+        assert len(seen) == 12
+    
+    def test_delete_post_cascades_in_database(self, logged_in_user, app, sample_post, sample_user, second_user):
+        """Test deleting a post removes its comments and likes via ON DELETE CASCADE."""
+        with app.app_context():
+            db.session.add_all([
+                Comment(content='Soon gone', user_id=second_user, post_id=sample_post),
+                Like(user_id=second_user, post_id=sample_post),
+            ])
+            db.session.commit()
+            
+            response = logged_in_user.post(f'/posts/{sample_post}/delete')
+            assert response.status_code == 302
+            
+            db.session.expunge_all()
+            assert Comment.query.filter_by(post_id=sample_post).count() == 0
+            assert Like.query.filter_by(post_id=sample_post).count() == 0
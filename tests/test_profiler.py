@@ -0,0 +1,91 @@
+import pytest
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from collections import Counter
+from app.profiler import StackSampler, read_collapsed, render_flamegraph, profile_files
+import threading
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class TestProfiler:
+    """Test the sampling profiler and flame graph tooling."""
+    
+    def test_sampler_captures_current_thread(self):
+        """Test stacks of the sampled thread are recorded root first."""
+        sampler = StackSampler(threading.get_ident(), interval=0.001).start()
+        busy(0.05)
+        stacks = sampler.stop()
+        assert sum(stacks.values()) > 0
+        assert any(stack.split(';')[-1].startswith('busy ') for stack in stacks)
+    
+    def test_sampler_follows_greenlet_under_gevent(self):
+        """Test a monkey-patched worker still gets samples of the profiled greenlet."""
+        pytest.importorskip('gevent')
+        script = textwrap.dedent('''
+            from gevent import monkey; monkey.patch_all()
+            import gevent, time
+            from app.profiler import StackSampler, current_target
+            def busy(seconds):
+                end = time.perf_counter() + seconds
+                while time.perf_counter() < end:
+                    pass
+            def request():
+                thread_id, greenlet = current_target()
+                sampler = StackSampler(thread_id, 0.001, greenlet).start()
+                busy(0.03)
+                gevent.sleep(0.02)
+                stacks = sampler.stop()
+                print(sum(stacks.values()), any(s.split(';')[-1].startswith('busy ') for s in stacks))
+            gevent.joinall([gevent.spawn(request), gevent.spawn(busy, 0.01)])
+        ''')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+        samples, saw_busy = output.stdout.split()
+        assert int(samples) > 0 and saw_busy == 'True'
+    
+    def test_endpoint_profiling_writes_collapsed_file(self, app, client, runner):
+        """Test a configured endpoint is profiled and aggregated by the CLI."""
+        directory = tempfile.mkdtemp()
+        app.config.update(PROFILER_ENABLED=True, PROFILER_ENDPOINTS={'main.explore'},
+                          PROFILER_DIR=directory, PROFILER_INTERVAL=0.0005)
+        for _ in range(3):
+            client.get('/explore')
+        client.get('/search')
+        
+        paths = profile_files(directory)
+        assert paths and all(os.path.basename(p).startswith('main.explore-') for p in paths)
+        
+        output = os.path.join(directory, 'out.svg')
+        result = runner.invoke(args=['profile', 'flamegraph', '--endpoint', 'main.explore', '-o', output])
+        assert result.exit_code == 0, result.output
+        with open(output) as f:
+            assert f.read().startswith('<svg')
+    
+    def test_profile_param_requires_admin(self, app, logged_in_user):
+        """Test ?profile=1 is ignored for users outside ADMINS."""
+        directory = tempfile.mkdtemp()
+        app.config.update(PROFILER_ENABLED=True, PROFILER_DIR=directory, PROFILER_INTERVAL=0.0001, ADMINS=set())
+        for _ in range(3):
+            logged_in_user.get('/explore?profile=1')
+        assert profile_files(directory) == []
+        
+        app.config['ADMINS'] = {'testuser'}
+        # A fast request can finish before the sampler's first tick, so allow a few tries
+        for _ in range(20):
+            logged_in_user.get('/explore?profile=1')
+            if profile_files(directory):
+                break
+        assert profile_files(directory)
+    
+    def test_render_flamegraph(self):
+        """Test merged stacks become one rectangle per frame."""
+        svg = render_flamegraph(Counter({'a;b': 3, 'a;c': 1}))
+        assert svg.count('<rect') == 3
+        assert '4 samples' in svg
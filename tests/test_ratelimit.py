@@ -0,0 +1,77 @@
+import pytest
+import os
+import tempfile
+from app.ratelimit import MemoryBackend, SQLiteBackend, LoadShedder, parse_budget
+
+class TestRateLimit:
+    """Test write throttling and load shedding."""
+    
+    def test_parse_budget(self):
+        """Test budgets are turned into capacity and refill rate."""
+        assert parse_budget('30/minute') == (30, 0.5)
+        assert parse_budget('5/hours') == (5, 5 / 3600)
+    
+    @pytest.mark.parametrize('make_backend', [
+        MemoryBackend,
+        lambda: SQLiteBackend(os.path.join(tempfile.mkdtemp(), 'buckets.db')),
+    ])
+    def test_token_bucket(self, make_backend):
+        """Test a bucket empties, reports the wait and refills over time."""
+        backend = make_backend()
+        assert backend.consume('k', 2, 1.0, now=100.0) == 0
+        assert backend.consume('k', 2, 1.0, now=100.0) == 0
+        assert backend.consume('k', 2, 1.0, now=100.0) == pytest.approx(1.0)
+        assert backend.consume('k', 2, 1.0, now=101.0) == 0
+        assert backend.consume('other', 2, 1.0, now=101.0) == 0
+    
+    def test_full_buckets_are_swept(self):
+        """Test buckets that have refilled are dropped instead of kept forever."""
+        backend = MemoryBackend(sweep_interval=10.0)
+        for i in range(100):
+            backend.consume(f'ip:{i}', 2, 1.0, now=100.0)
+        backend.consume('busy', 2, 0.1, now=100.0)
+        backend.consume('busy', 2, 0.1, now=100.0)
+        assert len(backend) == 101
+        assert backend.consume('late', 2, 1.0, now=110.0) == 0
+        assert len(backend) == 2
+    
+    def test_like_endpoint_is_throttled(self, app, logged_in_user, sample_post):
+        """Test the per-user budget returns 429 with Retry-After once spent."""
+        budget = app.config['RATELIMITS']['posts.toggle_like']
+        capacity = int(budget.split('/')[0])
+        for _ in range(capacity):
+            response = logged_in_user.post(f'/posts/{sample_post}/like', headers={'Content-Type': 'application/json'})
+            assert response.status_code == 200
+        response = logged_in_user.post(f'/posts/{sample_post}/like', headers={'Content-Type': 'application/json'})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert response.get_json()['error']
+        
+        # Reads are never throttled
+        assert logged_in_user.get(f'/posts/{sample_post}').status_code == 200
+    
+    def test_shedder_rejects_writes_when_slow(self, app, logged_in_user, sample_post):
+        """Test writes get 503 while write latency is over the threshold."""
+        shedder = app.extensions['load_shedder']
+        shedder.end(app.config['SHED_LATENCY_MS'] * 10)
+        shedder.inflight += 1  # balance the end() above
+        response = logged_in_user.post(f'/posts/{sample_post}/like')
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+        assert logged_in_user.get('/explore').status_code == 200
+    
+    def test_shedder_lets_people_log_in(self, app, client, sample_user):
+        """Test logging in still works while writes are being shed."""
+        shedder = app.extensions['load_shedder']
+        shedder.end(app.config['SHED_LATENCY_MS'] * 10)
+        shedder.inflight += 1
+        response = client.post('/auth/login', data={'username': 'testuser', 'password': 'testpassword'})
+        assert response.status_code == 302
+    
+    def test_shedder_recovers(self):
+        """Test the latency average decays while nothing completes."""
+        shedder = LoadShedder(latency_ms=100, max_queue=10, half_life=1.0)
+        shedder.begin()
+        shedder.end(1000)
+        assert shedder.current_latency() > 100
+        assert shedder.current_latency(shedder._updated + 10) < 100
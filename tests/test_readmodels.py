@@ -0,0 +1,68 @@
+import pytest
+from app import db
+from app.models import User, Post, Like
+from app.readmodels import PostView, build_views, feed_rows, recent_rows, user_rows, paginate_views
+
+class TestReadModels:
+    """Test the DTO read path used by the feed pages."""
+    
+    def test_feed_rows_match_followed_posts(self, app, sample_user, second_user, sample_post):
+        """Test the feed holds the same posts as User.followed_posts."""
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            other = db.session.get(User, second_user)
+            third = User(username='third', email='third@example.com')
+            third.set_password('password')
+            db.session.add_all([third, Post(content='Followed', author=other),
+                                Post(content='Not followed', author=third)])
+            user.follow(other)
+            db.session.commit()
+            
+            expected = [post.id for post in user.followed_posts()]
+            assert [row[0] for row in feed_rows(user.id)] == expected
+            assert len(expected) == 2
+    
+    def test_views_carry_counts_and_liked(self, app, sample_user, second_user, sample_post):
+        """Test counts and the viewer's like come from batched queries."""
+        with app.app_context():
+            other = db.session.get(User, second_user)
+            db.session.add_all([Post(content='Second', author=other),
+                                Like(user_id=second_user, post_id=sample_post)])
+            db.session.commit()
+            
+            views = {view.id: view for view in build_views(recent_rows().all(), viewer_id=second_user)}
+            post = views[sample_post]
+            assert isinstance(post, PostView)
+            assert post.like_count() == 1 and post.liked
+            assert post.comment_count() == 0
+            assert post.author.username == 'testuser'
+            assert not any(view.liked for view in views.values() if view.id != sample_post)
+            assert not hasattr(post, '__dict__')
+    
+    def test_authors_shared_across_posts(self, app, sample_user, sample_post):
+        """Test one AuthorView is reused for every post by the same user."""
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            db.session.add(Post(content='Another', author=user))
+            db.session.commit()
+            db.session.expunge_all()
+            first, second = build_views(user_rows(sample_user).all())
+            assert first.author is second.author
+            assert not db.session.identity_map
+    
+    def test_pagination_metadata(self, app, sample_user):
+        """Test paginate_views keeps the Pagination interface templates use."""
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            db.session.add_all([Post(content=f'Post {i}', author=user) for i in range(15)])
+            db.session.commit()
+            posts = paginate_views(user_rows(sample_user), 2, 10)
+            assert posts.total == 15 and posts.pages == 2
+            assert posts.has_prev and not posts.has_next
+            assert len(posts.items) == 5
+            assert all(isinstance(view, PostView) for view in posts.items)
+    
+    def test_feed_shows_delete_for_owner(self, app, logged_in_user, sample_post):
+        """Test the shared card still offers delete on the owner's own feed."""
+        response = logged_in_user.get('/')
+        assert f'/posts/{sample_post}/delete'.encode() in response.data
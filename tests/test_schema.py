@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+import pytest
+from app import create_app, db
+from app.models import User, Post, Comment, followers
+
+# The tables as the first release created them: no ON DELETE actions, AUTOINCREMENT,
+# comment counter or security stamp
+BASELINE = '''
+CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+    password_hash VARCHAR(120) NOT NULL, bio TEXT, avatar VARCHAR(200), created_at DATETIME, last_seen DATETIME,
+    PRIMARY KEY (id));
+CREATE UNIQUE INDEX ix_user_email ON user (email);
+CREATE UNIQUE INDEX ix_user_username ON user (username);
+CREATE TABLE followers (follower_id INTEGER NOT NULL, followed_id INTEGER NOT NULL,
+    PRIMARY KEY (follower_id, followed_id), FOREIGN KEY(follower_id) REFERENCES user (id),
+    FOREIGN KEY(followed_id) REFERENCES user (id));
+CREATE TABLE post (id INTEGER NOT NULL, content TEXT NOT NULL, image VARCHAR(200), created_at DATETIME,
+    user_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id));
+CREATE INDEX ix_post_created_at ON post (created_at);
+CREATE TABLE comment (id INTEGER NOT NULL, content TEXT NOT NULL, created_at DATETIME, user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id),
+    FOREIGN KEY(post_id) REFERENCES post (id));
+CREATE TABLE "like" (id INTEGER NOT NULL, user_id INTEGER NOT NULL, post_id INTEGER NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id), CONSTRAINT unique_user_post_like UNIQUE (user_id, post_id),
+    FOREIGN KEY(user_id) REFERENCES user (id), FOREIGN KEY(post_id) REFERENCES post (id));
+INSERT INTO user (id, username, email, password_hash) VALUES (1, 'olduser', 'old@example.com', 'x'),
+    (2, 'otheruser', 'other@example.com', 'x');
+INSERT INTO followers VALUES (2, 1);
+INSERT INTO post (id, content, user_id, created_at) VALUES (1, 'Old post', 1, '2020-01-01 00:00:00');
+INSERT INTO comment (id, content, user_id, post_id) VALUES (1, 'First', 2, 1), (2, 'Second', 2, 1);
+INSERT INTO "like" (id, user_id, post_id) VALUES (1, 2, 1);
+'''
+
+@pytest.fixture
+def old_app():
+    """An application started on a database created by the first release."""
+    db_fd, db_path = tempfile.mkstemp()
+    connection = sqlite3.connect(db_path)
+    connection.executescript(BASELINE)
+    connection.close()
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+                      'ARCHIVE_DATABASE_URL': 'sqlite://', 'PASSWORD_HASH_WORKERS': 0})
+    yield app
+    os.close(db_fd)
+    os.unlink(db_path)
+
+class TestSchemaUpgrade:
+    """Test upgrading a database created before the current models."""
+
+    def test_upgrade_from_first_release(self, old_app):
+        """Test the upgrade adds columns, recounts comments and enables cascades."""
+        runner = old_app.test_cli_runner()
+        result = runner.invoke(args=['db', 'upgrade'])
+        assert result.exit_code == 0, result.output
+        assert 'Rebuilt' in result.output and 'post' in result.output
+        with old_app.app_context():
+            post = db.session.get(Post, 1)
+            assert post.comment_count() == 2
+            assert len(db.session.get(User, 1).security_stamp) == 16
+            sql = db.session.execute(db.text("SELECT sql FROM sqlite_master WHERE name = 'post'")).scalar()
+            assert 'AUTOINCREMENT' in sql
+
+            db.session.delete(db.session.get(User, 2))
+            db.session.commit()
+            assert Comment.query.count() == 0
+            assert db.session.query(followers).count() == 0
+            assert db.session.get(Post, 1).comment_count() == 0
+
+        assert 'Schema is up to date.' in runner.invoke(args=['db', 'upgrade']).output
+
+    def test_current_schema_untouched(self, app, runner):
+        """Test a database created from the current models needs no rebuild."""
+        assert 'Schema is up to date.' in runner.invoke(args=['db', 'upgrade']).output
@@ -0,0 +1,128 @@
+import pytest
+from flask import g
+from sqlalchemy import event
+from app import db
+from app.models import User, Post
+from app.session_claims import ClaimUser
+
+def forget_current_user():
+    # Test requests share the test's app context, so drop Flask-Login's cached
+    # user to make the next request go through the user loader like a real one
+    g.pop('_login_user', None)
+
+@pytest.fixture
+def claims_client(app, client, sample_user):
+    """Client logged in with stateless session claims enabled."""
+    app.config['SESSION_CLAIMS'] = True
+    client.post('/auth/login', data={'username': 'testuser', 'password': 'testpassword'})
+    forget_current_user()
+    return client
+
+@pytest.fixture
+def statements(app):
+    """Collect SQL statements issued while the test runs."""
+    seen = []
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield seen
+    event.remove(engine, 'before_cursor_execute', record)
+
+class TestSessionClaims:
+    """Test the stateless signed session mode."""
+    
+    def test_login_issues_claim(self, app, claims_client, sample_user):
+        """Test logging in stores a versioned claim in the session."""
+        with claims_client.session_transaction() as session:
+            version, user_id, username, avatar, stamp, issued_at = session['_claim']
+        assert (version, user_id, username) == (1, sample_user, 'testuser')
+    
+    def test_explore_skips_user_lookup(self, app, claims_client, statements):
+        """Test pages that only need the claim do not load the user row."""
+        response = claims_client.get('/explore')
+        assert response.status_code == 200
+        assert b'testuser' in response.data
+        assert not any('FROM user' in statement for statement in statements)
+        
+        app.config['SESSION_CLAIMS'] = False
+        forget_current_user()
+        claims_client.get('/explore')
+        assert any('FROM user' in statement for statement in statements)
+    
+    def test_entity_loaded_on_demand(self, app, claims_client, sample_user):
+        """Test views needing the full user still work through the claim."""
+        response = claims_client.get('/users/edit_profile')
+        assert response.status_code == 200
+        assert b'test@example.com' in response.data
+    
+    def test_deleted_user_signed_out(self, app, claims_client, sample_user):
+        """Test a claim for a deleted account ends the session instead of failing."""
+        with app.app_context():
+            db.session.delete(db.session.get(User, sample_user))
+            db.session.commit()
+        
+        response = claims_client.get('/users/edit_profile')
+        assert response.status_code == 302
+        assert response.location.endswith('/users/edit_profile')
+        with claims_client.session_transaction() as session:
+            assert '_claim' not in session and '_user_id' not in session
+        forget_current_user()
+        assert '/auth/login' in claims_client.get('/users/edit_profile').location
+    
+    def test_deleted_user_on_streamed_page(self, app, claims_client, sample_user, second_user):
+        """Test a streamed page resolves the claim before its headers go out."""
+        app.config['STREAM_TEMPLATES'] = True
+        with app.app_context():
+            db.session.delete(db.session.get(User, sample_user))
+            db.session.commit()
+        
+        response = claims_client.get('/users/seconduser')
+        assert response.status_code == 302
+        assert response.location.endswith('/users/seconduser')
+        with claims_client.session_transaction() as session:
+            assert '_claim' not in session
+    
+    def test_deleted_user_cannot_write(self, app, claims_client, sample_user):
+        """Test writes check the account still exists rather than trusting the claim."""
+        with app.app_context():
+            db.session.delete(db.session.get(User, sample_user))
+            db.session.commit()
+        
+        response = claims_client.post('/posts/create', data={'content': 'Ghost post'})
+        assert '/auth/login' in response.location
+        with app.app_context():
+            assert Post.query.count() == 0
+        with claims_client.session_transaction() as session:
+            assert '_claim' not in session
+    
+    def test_profile_change_refreshes_claim(self, app, claims_client):
+        """Test editing the profile reissues the claim with the new username."""
+        response = claims_client.post('/users/edit_profile', data={
+            'username': 'renamed', 'email': 'test@example.com', 'bio': 'New bio'})
+        assert response.status_code == 302
+        assert '/users/renamed' in response.location
+        with claims_client.session_transaction() as session:
+            assert session['_claim'][2] == 'renamed'
+    
+    def test_stale_claim_is_revalidated(self, app, claims_client, sample_user):
+        """Test expired claims are rebuilt from the row and its bumped stamp."""
+        with app.app_context():
+            user = db.session.get(User, sample_user)
+            user.username = 'changedelsewhere'
+            user.bump_security_stamp()
+            db.session.commit()
+            stamp = user.security_stamp
+        
+        app.config['SESSION_CLAIM_MAX_AGE'] = -1
+        forget_current_user()
+        response = claims_client.get('/explore')
+        assert b'changedelsewhere' in response.data
+        with claims_client.session_transaction() as session:
+            assert session['_claim'][4] == stamp
+    
+    def test_logout_drops_claim(self, claims_client):
+        """Test logging out removes the claim."""
+        claims_client.get('/auth/logout')
+        with claims_client.session_transaction() as session:
+            assert '_claim' not in session
@@ -0,0 +1,218 @@
+import pytest
+import threading
+import time
+from app import create_app, db, sharding
+from app.models import User
+from app.sharding import NodeLease, Snowflake, shard_of, MAX_SHARDS
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    """An application with posts, comments and likes split over three shard files."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/main.db',
+        'ARCHIVE_DATABASE_URL': 'sqlite://',
+        'SHARD_COUNT': 3,
+        'SHARD_DATABASE_URL': f'sqlite:///{tmp_path}/shard{{}}.db',
+        'SNOWFLAKE_NODE_ID': 1,
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'
+    })
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+        for engine in app.extensions['sharding'].engines:
+            engine.dispose()
+
+def add_users(app, *names):
+    with app.app_context():
+        users = [User(username=name, email=f'{name}@example.com') for name in names]
+        for user in users:
+            user.set_password('password')
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+def login(client, username):
+    client.post('/auth/login', data={'username': username, 'password': 'password'})
+    return client
+
+def add_post(app, user_id, content):
+    with app.app_context():
+        post_id = sharding.create_post(user_id, content)
+        db.session.commit()
+        return post_id
+
+class TestSnowflake:
+    """Test the coordination-free id generator."""
+
+    def test_ids_unique_ordered_and_routable(self):
+        """Test ids from many threads are unique, increase over time and carry their shard."""
+        ids = Snowflake(node=3)
+        results = []
+        def worker(shard):
+            results.extend((shard, ids.next_id(shard)) for _ in range(500))
+        threads = [threading.Thread(target=worker, args=(shard,)) for shard in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id for _, id in results}) == 2000
+        assert all(shard_of(id) == shard for shard, id in results)
+        assert all(id < 2 ** 53 for _, id in results)
+
+    def test_sequence_exhaustion_waits(self):
+        """Test a full millisecond rolls into the next one instead of reusing ids."""
+        ticks = iter([1800000000.0] * 9 + [1800000000.25])
+        ids = Snowflake(node=0, clock=lambda: next(ticks))
+        generated = [ids.next_id(0) for _ in range(9)]
+        assert generated == sorted(set(generated))
+        assert generated[8] - generated[0] == 250 << 12
+
+    def test_clock_step_back(self):
+        """Test a clock moving backwards never produces a smaller id."""
+        ticks = iter([1800000000.5, 1800000000.0, 1800000000.0])
+        ids = Snowflake(node=0, clock=lambda: next(ticks))
+        first, second, third = (ids.next_id(1) for _ in range(3))
+        assert first < second < third
+
+    def test_invalid_config(self, tmp_path):
+        """Test node ids and shard counts outside the id layout are rejected."""
+        with pytest.raises(ValueError):
+            Snowflake(node=16)
+        with pytest.raises(ValueError):
+            create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/main.db',
+                        'ARCHIVE_DATABASE_URL': 'sqlite://', 'SHARD_COUNT': MAX_SHARDS + 1,
+                        'SHARD_DATABASE_URL': 'sqlite://'})
+
+    def test_workers_lease_distinct_nodes(self, tmp_path):
+        """Test processes without SNOWFLAKE_NODE_ID lease different node ids from the main database."""
+        config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/main.db',
+                  'ARCHIVE_DATABASE_URL': 'sqlite://', 'SHARD_COUNT': 2,
+                  'SHARD_DATABASE_URL': f'sqlite:///{tmp_path}/shard{{}}.db'}
+        first, second = create_app(config), create_app(config)
+        nodes = {app.extensions['sharding'].ids.node for app in (first, second)}
+        assert len(nodes) == 2
+        
+        lease = first.extensions['snowflake_lease']
+        assert lease.renew()
+        lease.release()
+        third = create_app(config)
+        assert third.extensions['sharding'].ids.node == lease.node
+        
+        # A lapsed lease goes to the next process and the stalled owner is told on renewal
+        stalled = third.extensions['snowflake_lease']
+        with third.app_context():
+            taken = NodeLease(db.engine, 60).acquire(now=time.time() + 120)
+        assert taken == stalled.node
+        assert not stalled.renew()
+    
+class TestSharding:
+    """Test posts, comments and likes stored on their author's shard."""
+
+    def test_posts_routed_by_author(self, sharded_app):
+        """Test each author's posts land on one shard and their ids say which."""
+        user_ids = add_users(sharded_app, 'alice', 'bobby', 'carol')
+        router = sharded_app.extensions['sharding']
+        for user_id in user_ids:
+            post_id = add_post(sharded_app, user_id, f'Hello from {user_id}')
+            assert shard_of(post_id) == router.for_user(user_id)
+            with sharded_app.app_context():
+                assert sharding.get_post(post_id).user_id == user_id
+        with sharded_app.app_context():
+            assert sharding.count_posts() == 3
+
+    def test_home_feed_merges_shards(self, sharded_app):
+        """Test the home feed interleaves followed users' posts from different shards by time."""
+        alice, bob, carol = add_users(sharded_app, 'alice', 'bobby', 'carol')
+        with sharded_app.app_context():
+            user = db.session.get(User, alice)
+            user.follow(db.session.get(User, bob))
+            db.session.commit()
+        for i in range(3):
+            add_post(sharded_app, alice, f'Alice {i}')
+            add_post(sharded_app, bob, f'Bob {i}')
+            add_post(sharded_app, carol, f'Carol {i}')
+        sharded_app.config['POSTS_PER_PAGE'] = 4
+        client = login(sharded_app.test_client(), 'alice')
+
+        html = client.get('/').get_data(as_text=True)
+        assert [html.index(text) < html.index(later) for text, later in
+                [('Bob 2', 'Alice 2'), ('Alice 2', 'Bob 1'), ('Bob 1', 'Alice 1')]] == [True] * 3
+        assert 'Alice 0' not in html and 'Carol' not in html
+        page = client.get('/?page=2').get_data(as_text=True)
+        assert 'Bob 0' in page and 'Alice 0' in page
+
+    def test_new_posts_poll(self, sharded_app):
+        """Test the new-posts banner counts and renders posts written after the cursor."""
+        alice, bob = add_users(sharded_app, 'alice', 'bobby')
+        since = add_post(sharded_app, alice, 'Before')
+        add_post(sharded_app, bob, 'Stranger')
+        add_post(sharded_app, alice, 'After')
+        client = login(sharded_app.test_client(), 'alice')
+        assert client.get(f'/feed/new?since={since}').get_json() == {'count': 1, 'more': False}
+        data = client.get(f'/feed/since?since={since}').get_json()
+        assert 'After' in data['html'] and 'Before' not in data['html']
+
+    def test_comments_and_likes(self, sharded_app):
+        """Test commenting on and liking another shard's post, then reading it back."""
+        alice, bob = add_users(sharded_app, 'alice', 'bobby')
+        post_id = add_post(sharded_app, alice, 'Sharded post')
+        client = login(sharded_app.test_client(), 'bobby')
+
+        client.post(f'/posts/{post_id}/comment', data={'content': 'Cross-shard comment'})
+        response = client.post(f'/posts/{post_id}/like', headers={'Content-Type': 'application/json'})
+        assert response.get_json() == {'liked': True, 'like_count': 1}
+        page = client.get(f'/posts/{post_id}').get_data(as_text=True)
+        assert 'Sharded post' in page and 'Cross-shard comment' in page
+        assert 'data-liked="True"' in page
+        assert 'Cross-shard comment' in client.get(f'/posts/{post_id}/comments').get_json()['html']
+        assert client.post(f'/posts/{post_id}/like', headers={'Content-Type': 'application/json'}).get_json()['liked'] is False
+        assert client.get('/posts/12345').status_code == 404
+
+    def test_create_and_delete(self, sharded_app):
+        """Test the create and delete routes write to the author's shard."""
+        add_users(sharded_app, 'alice')
+        client = login(sharded_app.test_client(), 'alice')
+        client.post('/posts/create', data={'content': 'Created on a shard'})
+        with sharded_app.app_context():
+            post_id = sharding.newest_post_id()
+            assert sharding.get_post(post_id).content == 'Created on a shard'
+        profile = client.get('/users/alice').data
+        assert b'Created on a shard' in profile and b'1 posts' in profile
+        client.post(f'/posts/{post_id}/delete')
+        with sharded_app.app_context():
+            assert sharding.get_post(post_id) is None
+
+    def test_post_counts_include_shards(self, sharded_app):
+        """Test the home sidebar and search results count a user's sharded posts."""
+        alice, = add_users(sharded_app, 'alice')
+        add_post(sharded_app, alice, 'One')
+        add_post(sharded_app, alice, 'Two')
+        client = login(sharded_app.test_client(), 'alice')
+        assert '<strong>2</strong><br>' in client.get('/').get_data(as_text=True)
+        assert '2 posts' in client.get('/search?query=ali').get_data(as_text=True)
+
+    def test_sharded_posts_not_linkified(self, sharded_app):
+        """Test #tags and @mentions stay plain text, since sharded posts are not indexed."""
+        add_users(sharded_app, 'alice')
+        client = login(sharded_app.test_client(), 'alice')
+        client.post('/posts/create', data={'content': 'Hello #python @alice'})
+        page = client.get('/users/alice').get_data(as_text=True)
+        assert 'Hello #python @alice' in page
+        assert '/tags/python' not in page and 'Posts mentioning' not in page
+    
+    def test_user_delete_purges_shards(self, sharded_app):
+        """Test a deleted user's posts, comments and likes leave every shard."""
+        alice, bob = add_users(sharded_app, 'alice', 'bobby')
+        alice_post = add_post(sharded_app, alice, 'Stays')
+        add_post(sharded_app, bob, 'Goes')
+        with sharded_app.app_context():
+            sharding.add_comment(alice_post, bob, 'Bye')
+            sharding.toggle_like(alice_post, bob)
+            db.session.commit()
+            db.session.delete(db.session.get(User, bob))
+            db.session.commit()
+            assert sharding.count_posts() == 1
+            assert sharding.post_counts([alice_post]) == ({}, {alice_post: 0})
@@ -0,0 +1,135 @@
+import pytest
+import sqlite3
+import threading
+import time
+from app.singleflight import SingleFlight, SharedFlights
+
+def run_concurrently(n, target):
+    results = [None] * n
+    def worker(i):
+        results[i] = target()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical reads."""
+
+    def test_concurrent_calls_share_one_result(self):
+        """Test only one of many simultaneous callers runs the computation."""
+        flights = SingleFlight(max_age=5)
+        calls = []
+        release = threading.Event()
+        def compute():
+            calls.append(1)
+            release.wait(1)
+            return {'value': 42}
+        threading.Timer(0.1, release.set).start()
+        results = run_concurrently(8, lambda: flights.do('post:1', compute))
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert flights._calls == {}
+
+    def test_old_flights_not_joined(self):
+        """Test a caller does not join a call started more than max_age ago."""
+        flights = SingleFlight(max_age=0)
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return len(calls)
+        run_concurrently(3, lambda: flights.do('post:1', compute))
+        assert len(calls) == 3
+
+    def test_errors_reach_followers(self):
+        """Test every waiting caller sees the leader's exception."""
+        flights = SingleFlight(max_age=5)
+        def compute():
+            time.sleep(0.05)
+            raise LookupError('boom')
+        errors = []
+        def call():
+            try:
+                flights.do('post:1', compute)
+            except LookupError as e:
+                errors.append(e)
+        run_concurrently(4, call)
+        assert len(errors) == 4
+
+    def test_shared_store_across_workers(self, tmp_path):
+        """Test a second worker waits for the first worker's published result."""
+        path = str(tmp_path / 'flights.db')
+        first = SingleFlight(max_age=5, shared=SharedFlights(path))
+        second = SingleFlight(max_age=5, shared=SharedFlights(path))
+        started = threading.Event()
+        def slow():
+            started.set()
+            time.sleep(0.1)
+            return 'from first'
+        leader = threading.Thread(target=lambda: first.do('profile:a', slow))
+        leader.start()
+        started.wait(1)
+        assert second.do('profile:a', lambda: pytest.fail('second worker recomputed')) == 'from first'
+        leader.join()
+
+        second.forget('profile:a')
+        assert first.do('profile:a', lambda: 'fresh') == 'fresh'
+
+    def test_expired_lease_taken_over(self, tmp_path):
+        """Test a lease left by a dead worker does not block others past its expiry."""
+        store = SharedFlights(str(tmp_path / 'flights.db'))
+        assert store.claim('post:1', 'dead', lease=5, now=100.0)[0]
+        assert not store.claim('post:1', 'other', lease=5, now=101.0)[0]
+        assert store.claim('post:1', 'other', lease=5, now=106.0)[0]
+
+    def test_claim_after_publish_gets_value(self, tmp_path):
+        """Test a follower whose fetch just missed the publish gets the value rather than a new lease."""
+        store = SharedFlights(str(tmp_path / 'flights.db'))
+        assert store.claim('post:1', 'leader', lease=5, now=100.0)[0]
+        store.publish('post:1', 'leader', 'result', max_age=5, now=100.5)
+        assert store.claim('post:1', 'follower', lease=5, newer_than=100.0, now=100.6) == (False, 'result')
+        assert store.claim('post:1', 'follower', lease=5, newer_than=101.0, now=102.0)[0]
+
+    def test_publish_prunes_stale_rows(self, tmp_path):
+        """Test results past max_age and released leases are deleted, live leases kept."""
+        path = str(tmp_path / 'flights.db')
+        store = SharedFlights(path)
+        for key in ('post:1', 'post:2', 'post:3'):
+            store.claim(key, 'worker', lease=5, now=100.0)
+        store.publish('post:1', 'worker', 'old', max_age=5, now=100.0)
+        store.release('post:2', 'worker')
+        store.claim('post:4', 'worker', lease=5, now=108.0)
+        store.claim('post:3', 'worker', lease=5, now=110.0)
+        store.publish('post:3', 'worker', 'new', max_age=5, now=110.0)
+        keys = {key for key, in sqlite3.connect(path).execute('SELECT key FROM flight')}
+        assert keys == {'post:3', 'post:4'}
+
+class TestSingleFlightRoutes:
+    """Test the coalesced post and profile pages."""
+
+    def test_missing_post_404(self, client):
+        """Test a missing post still returns 404."""
+        assert client.get('/posts/999').status_code == 404
+
+    def test_missing_profile_404(self, client):
+        """Test a missing user still returns 404."""
+        assert client.get('/users/nobody').status_code == 404
+
+    def test_writes_visible_immediately(self, app, logged_in_user, sample_post):
+        """Test a new comment shows on the next read despite a long max_age."""
+        flights = app.extensions['singleflight']
+        flights.max_age = 60
+        with app.app_context():
+            logged_in_user.get(f'/posts/{sample_post}')
+            logged_in_user.post(f'/posts/{sample_post}/comment', data={'content': 'Fresh comment'})
+            response = logged_in_user.get(f'/posts/{sample_post}')
+        assert b'Fresh comment' in response.data
+
+    def test_own_profile_shows_edit(self, logged_in_user):
+        """Test the owner still gets the edit button on a profile snapshot."""
+        response = logged_in_user.get('/users/testuser')
+        assert b'Edit Profile' in response.data
+        assert b'Unfollow' not in response.data
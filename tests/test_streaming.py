@@ -0,0 +1,70 @@
+import gzip
+import zlib
+from app import db
+from app.models import Comment
+from app.streaming import Deferred
+
+def add_comments(app, post_id, user_id, n):
+    with app.app_context():
+        for i in range(n):
+            db.session.add(Comment(content=f'Comment {i}', post_id=post_id, user_id=user_id))
+        db.session.commit()
+
+class TestStreaming:
+    """Test progressive rendering of long pages."""
+
+    def test_post_detail_streamed(self, client, sample_post):
+        """Test the head is flushed as its own chunk ahead of the body."""
+        response = client.get(f'/posts/{sample_post}', buffered=False)
+        chunks = list(response.response)
+        response.close()
+        chunks = [c if isinstance(c, bytes) else c.encode() for c in chunks]
+        assert 'Content-Length' not in response.headers
+        assert b'</head>' in chunks[0]
+        assert b'This is a test post' not in chunks[0]
+        assert b'This is a test post' in b''.join(chunks)
+
+    def test_streamed_pages_compressed_per_chunk(self, app, client, sample_user):
+        """Test streamed pages are gzipped chunk by chunk when the client accepts it."""
+        app.config['STREAM_CHUNK_SIZE'] = 256
+        response = client.get('/users/testuser', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        chunks = list(response.response)
+        assert len(chunks) > 1
+        # Every chunk is flushed, so the start of the page decodes before the rest arrives
+        assert zlib.decompressobj(31).decompress(chunks[0]).startswith(b'<!DOCTYPE html>')
+        assert b'testuser' in gzip.decompress(b''.join(chunks))
+        assert 'Content-Encoding' not in client.get('/users/testuser').headers
+
+    def test_flashes_shown_once(self, app, logged_in_user, sample_post):
+        """Test flashed messages are consumed before the stream starts."""
+        logged_in_user.post(f'/posts/{sample_post}/comment', data={'content': 'Hi there'})
+        first = logged_in_user.get(f'/posts/{sample_post}')
+        second = logged_in_user.get(f'/posts/{sample_post}')
+        assert b'Your comment has been added!' in first.data
+        assert b'Your comment has been added!' not in second.data
+
+    def test_load_more_rendered(self, app, client, sample_post, sample_user):
+        """Test the cursor for older comments is rendered after a full page."""
+        app.config['COMMENTS_PER_PAGE'] = 5
+        add_comments(app, sample_post, sample_user, 7)
+        response = client.get(f'/posts/{sample_post}')
+        assert response.data.count(b'Comment ') >= 5
+        assert b'load-more-comments' in response.data
+
+    def test_streaming_disabled(self, app, client, sample_post):
+        """Test pages render in one piece when streaming is off."""
+        app.config['STREAM_TEMPLATES'] = False
+        response = client.get(f'/posts/{sample_post}')
+        assert response.headers['Content-Length'] == str(len(response.data))
+        assert b'This is a test post' in response.data
+
+    def test_deferred_runs_once(self):
+        """Test Deferred evaluates lazily and caches the result."""
+        calls = []
+        value = Deferred(lambda: calls.append(1) or [1, 2, 3])
+        assert calls == []
+        assert len(value) == 3
+        assert list(value) == [1, 2, 3]
+        assert calls == [1]
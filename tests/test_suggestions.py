@@ -0,0 +1,96 @@
+import pytest
+from app import db
+from app.models import User, FollowSuggestion, followers
+from app.suggestions import compute_suggestions, refresh_suggestions, suggestions_for
+
+def make_users(names):
+    users = []
+    for name in names:
+        user = User(username=name, email=f'{name}@example.com')
+        user.set_password('password')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+def add_follows(following):
+    """Insert bare users for every id in a follower -> followed ids mapping, then the follows"""
+    ids = set(following).union(*following.values())
+    db.session.execute(User.__table__.insert(), [
+        {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+         'password_hash': '-', 'security_stamp': f'{user_id:032x}'} for user_id in sorted(ids)])
+    db.session.execute(followers.insert(), [
+        {'follower_id': follower_id, 'followed_id': followed_id}
+        for follower_id, followed in following.items() for followed_id in followed])
+    db.session.commit()
+
+class TestSuggestions:
+    """Test friends-of-friends follow suggestions."""
+    
+    def test_compute_ranks_by_shared_follows(self, app):
+        """Test candidates are scored by how many followed users follow them."""
+        with app.app_context():
+            add_follows({1: {2, 3}, 2: {4, 5}, 3: {4, 1}})
+            suggestions = compute_suggestions(1, 3, per_user=5, max_fanout=100, salt=7)
+        assert (1, 4, 2) in suggestions
+        assert (1, 5, 1) in suggestions
+        # Never suggest yourself or someone already followed
+        assert all(s[1] != s[0] for s in suggestions)
+        assert (3, 1, 1) not in suggestions
+        assert [s[1] for s in suggestions if s[0] == 1] == [4, 5]
+    
+    def test_fanout_sample_is_not_biased_to_low_ids(self, app):
+        """Test a capped account contributes a shuffled sample, not its oldest follows."""
+        following = {user_id: {1} for user_id in range(2, 102)}
+        following[1] = set(range(1000, 1200))
+        with app.app_context():
+            add_follows(following)
+            suggestions = compute_suggestions(2, 101, per_user=200, max_fanout=20, salt=987654321)
+        suggested = {s[1] for s in suggestions if s[0] == 2}
+        assert len(suggested) == 20
+        assert max(suggested) > 1020
+        # Everyone following the capped account gets the same sample
+        assert {s[1] for s in suggestions if s[0] == 3} == suggested
+    
+    def test_refresh_in_batches(self, app):
+        """Test every batch is written and users who stopped following lose their rows."""
+        app.config['SUGGESTIONS_BATCH_SIZE'] = 2
+        with app.app_context():
+            add_follows({1: {5}, 2: {5}, 3: {5}, 4: {5}, 5: {6}})
+            assert refresh_suggestions() == 4
+            db.session.execute(followers.delete().where(followers.c.follower_id == 4))
+            db.session.commit()
+            assert refresh_suggestions() == 3
+            assert {row.user_id for row in FollowSuggestion.query} == {1, 2, 3}
+    
+    def test_refresh_and_lookup(self, app, sample_user):
+        """Test stored suggestions are read back and filtered by later follows."""
+        with app.app_context():
+            me = db.session.get(User, sample_user)
+            alice, bob, carol = make_users(['alice', 'bobby', 'carol'])
+            me.follow(alice)
+            alice.follow(bob)
+            alice.follow(carol)
+            db.session.commit()
+            
+            assert refresh_suggestions() > 0
+            assert FollowSuggestion.query.filter_by(user_id=me.id).count() == 2
+            assert {u.username for u in suggestions_for(me)} == {'bobby', 'carol'}
+            
+            me.follow(bob)
+            db.session.commit()
+            assert [u.username for u in suggestions_for(me)] == ['carol']
+    
+    def test_sidebar_shows_suggestions(self, app, logged_in_user, sample_user):
+        """Test the home sidebar lists stored suggestions."""
+        with app.app_context():
+            me = db.session.get(User, sample_user)
+            alice, bob = make_users(['alice', 'bobby'])
+            me.follow(alice)
+            alice.follow(bob)
+            db.session.commit()
+            refresh_suggestions()
+        
+        response = logged_in_user.get('/')
+        assert b'Who to follow' in response.data
+        assert b'bobby' in response.data
@@ -0,0 +1,90 @@
+from app import db
+from app.models import Post, Tag, User, post_tag, post_mention
+from app.readmodels import tag_rows
+from app.tags import extract_tags, extract_mentions, linkify, index_post
+
+def add_post(app, user_id, content, index=True):
+    with app.app_context():
+        post = Post(content=content, user_id=user_id)
+        db.session.add(post)
+        db.session.flush()
+        if index:
+            index_post(post)
+        db.session.commit()
+        return post.id
+
+class TestTags:
+    """Test hashtag and mention parsing and the indexed tag feeds."""
+
+    def test_extract(self):
+        """Test tags are casefolded and deduplicated and emails/anchors are ignored."""
+        text = 'Loving #Flask and #flask! Mail me@example.com, see page#top, #2024 @seconduser. @testuser'
+        assert extract_tags(text) == ['flask']
+        assert extract_mentions(text) == ['seconduser', 'testuser']
+
+    def test_create_post_indexes(self, app, logged_in_user, second_user):
+        """Test a new post is linked to its tags and mentioned users."""
+        logged_in_user.post('/posts/create', data={'content': 'Hello #Python world, hi @seconduser'})
+        with app.app_context():
+            post = Post.query.filter(Post.content.contains('#Python')).one()
+            tag = Tag.query.filter_by(name='python').one()
+            assert db.session.query(post_tag).filter_by(tag_id=tag.id, post_id=post.id).count() == 1
+            assert db.session.query(post_mention.c.user_id).filter_by(post_id=post.id).scalar() == second_user
+
+    def test_tag_feed_keyset_pages(self, app, client, sample_user):
+        """Test the tag page pages through tagged posts with a post id cursor."""
+        app.config['POSTS_PER_PAGE'] = 2
+        ids = [add_post(app, sample_user, f'Post {i} #paging') for i in range(5)]
+        add_post(app, sample_user, 'Untagged post')
+
+        response = client.get('/tags/Paging')
+        assert b'Post 4' in response.data and b'Post 3' in response.data
+        assert b'Post 2' not in response.data
+        assert f'/tags/paging?before={ids[3]}'.encode() in response.data
+
+        response = client.get(f'/tags/paging?before={ids[1]}')
+        assert b'Post 0' in response.data
+        assert b'Older' not in response.data
+        assert b'Untagged post' not in response.data
+
+    def test_unknown_and_invalid_tags(self, client):
+        """Test an unused tag renders an empty page and a malformed one is a 404."""
+        assert client.get('/tags/nothing').status_code == 200
+        assert client.get('/tags/123').status_code == 404
+
+    def test_mentions_page(self, app, client, sample_user, second_user):
+        """Test posts mentioning a user are listed on their mentions page."""
+        add_post(app, sample_user, 'Thanks @seconduser!')
+        add_post(app, sample_user, 'No mention here')
+        response = client.get('/users/seconduser/mentions')
+        assert b'Thanks' in response.data
+        assert b'No mention here' not in response.data
+
+    def test_linkify(self, app):
+        """Test content is escaped and tags and mentions become links."""
+        with app.test_request_context():
+            html = str(linkify('<b>hi</b> #Flask @someone.'))
+        assert '&lt;b&gt;hi&lt;/b&gt;' in html
+        assert '<a href="/tags/flask" class="text-decoration-none">#Flask</a>' in html
+        assert '<a href="/users/someone" class="text-decoration-none">@someone</a>.' in html
+
+    def test_tag_page_uses_covering_index(self, app):
+        """Test a tag page is a range scan of the post_tag key, not a sort over all tagged posts."""
+        with app.app_context():
+            query = tag_rows(1).filter(post_tag.c.post_id < 100).order_by(post_tag.c.post_id.desc()).limit(11)
+            sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            plan = ' '.join(row[3] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+        assert 'COVERING INDEX' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_backfill_command(self, app, runner, sample_user, second_user):
+        """Test the backfill indexes existing posts and is safe to rerun."""
+        add_post(app, sample_user, '#old post for @seconduser', index=False)
+        add_post(app, sample_user, 'another #old one', index=False)
+        for _ in range(2):
+            result = runner.invoke(args=['tags', 'backfill', '--batch-size', '1'])
+            assert result.exit_code == 0
+            assert 'Indexed 2 posts: 2 tag and 1 mention links.' in result.output
+        with app.app_context():
+            assert db.session.query(post_tag).count() == 2
+            assert db.session.query(post_mention).count() == 1
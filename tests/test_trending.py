@@ -0,0 +1,67 @@
+import pytest
+from datetime import datetime, timedelta
+from app import db
+from app.models import Post, Like, Comment, PostScore
+from app.trending import compute_scores, refresh_scores
+
+class TestTrending:
+    """Test the precomputed explore ranking."""
+    
+    def test_engagement_outranks_recency(self, app, sample_user, second_user):
+        """Test a liked and commented post ranks above a newer quiet one."""
+        with app.app_context():
+            now = datetime.utcnow()
+            popular = Post(content='Popular', user_id=sample_user, created_at=now - timedelta(hours=2))
+            quiet = Post(content='Quiet', user_id=sample_user, created_at=now - timedelta(hours=1))
+            db.session.add_all([popular, quiet])
+            db.session.flush()
+            db.session.add_all([
+                Like(user_id=sample_user, post_id=popular.id),
+                Like(user_id=second_user, post_id=popular.id),
+                Comment(content='Nice', user_id=second_user, post_id=popular.id),
+            ])
+            db.session.commit()
+            
+            ranked = [post_id for post_id, _ in compute_scores(now)]
+            assert ranked == [popular.id, quiet.id]
+    
+    def test_old_posts_fall_out_of_window(self, app, sample_user):
+        """Test posts older than the window are not scored."""
+        with app.app_context():
+            now = datetime.utcnow()
+            old = Post(content='Old', user_id=sample_user,
+                       created_at=now - timedelta(hours=app.config['TRENDING_WINDOW_HOURS'] + 1))
+            db.session.add(old)
+            db.session.commit()
+            assert compute_scores(now) == []
+    
+    def test_refresh_replaces_ranking(self, app, sample_post):
+        """Test refreshing writes the ranked table from scratch."""
+        with app.app_context():
+            assert refresh_scores() == 1
+            assert refresh_scores() == 1
+            assert PostScore.query.count() == 1
+            assert PostScore.query.first().post_id == sample_post
+    
+    def test_explore_uses_ranking(self, app, client, sample_user, second_user):
+        """Test explore lists posts by score once the ranking exists."""
+        with app.app_context():
+            older = Post(content='Older but liked', user_id=sample_user,
+                         created_at=datetime.utcnow() - timedelta(hours=1))
+            newer = Post(content='Newer and quiet', user_id=sample_user)
+            db.session.add_all([older, newer])
+            db.session.flush()
+            db.session.add_all([Like(user_id=u, post_id=older.id) for u in (sample_user, second_user)])
+            db.session.commit()
+            refresh_scores()
+        
+        data = client.get('/explore').data
+        assert data.index(b'Older but liked') < data.index(b'Newer and quiet')
+        
+        data = client.get('/explore?sort=recent').data
+        assert data.index(b'Newer and quiet') < data.index(b'Older but liked')
+    
+    def test_refresh_command(self, app, runner, sample_post):
+        """Test the CLI refresh command."""
+        result = runner.invoke(args=['trending', 'refresh'])
+        assert 'Scored 1 posts.' in result.output